@@ -0,0 +1,462 @@
+# -- coding: latin-1
+""" asyncfetch.py - Module providing an event-loop based
+    fetch engine for HarvestMan. This is part of the HarvestMan
+    program.
+
+    The regular fetchers download urls with blocking calls to
+    urllib2, one url per thread. The engine in this module keeps
+    many HTTP requests in flight on non-blocking sockets and
+    multiplexes them in a single asyncore loop. Completed responses
+    are saved by a connector which applies the same rules, cache
+    checks and file writing as the regular connector.
+
+    Only plain HTTP urls are fetched by the engine. Urls of other
+    protocols, requests through proxies and files which are too
+    large to be fetched in one piece are downloaded by the
+    regular connector.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import sys
+import time
+import socket
+import asyncore
+import urlparse
+import base64
+
+from common.common import *
+from connector import HarvestManUrlConnector, URL_SOCKET_ERROR
+
+# Status codes for which the location is followed
+REDIRECT_CODES = (301, 302, 303, 307)
+# Maximum number of redirections for a url,
+# same as urllib2.HTTPRedirectHandler
+MAX_REDIRECTIONS = 10
+
+class HarvestManAsyncResponse(object):
+    """ Response to a request made by the fetch engine """
+
+    def __init__(self, url):
+        # Url of the response, this differs from the
+        # requested url if the request was redirected
+        self.url = url
+        # HTTP status code and reason, status is
+        # 0 if there was no response
+        self.status = 0
+        self.reason = ''
+        self.headers = CaselessDict()
+        self.data = ''
+        # (number, message) of a network error
+        self.error = None
+        # Flag which is set if the data was not read
+        # since it exceeds the maximum file size
+        self.oversize = False
+        # Number of attempts
+        self.tries = 0
+        # Time taken for the request
+        self.elapsed = 0.0
+
+class HarvestManHttpChannel(asyncore.dispatcher):
+    """ Channel making one HTTP request on a
+    non-blocking socket """
+
+    def __init__(self, engine, request, url, addr):
+        asyncore.dispatcher.__init__(self, map=engine.socketmap)
+        self._engine = engine
+        self.request = request
+        self.response = HarvestManAsyncResponse(url)
+        self.starttime = time.time()
+        self._outbuf = engine.make_request_data(request, url)
+        self._inbuf = []
+        self._header = True
+        self._length = -1
+        self._nread = 0
+        self._done = False
+
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(addr)
+
+    def handle_connect(self):
+        pass
+
+    def writable(self):
+        return len(self._outbuf) > 0
+
+    def handle_write(self):
+        sent = self.send(self._outbuf)
+        self._outbuf = self._outbuf[sent:]
+
+    def handle_read(self):
+        data = self.recv(65536)
+        if not data:
+            return
+
+        self._inbuf.append(data)
+        self._nread += len(data)
+
+        if self._header:
+            buf = ''.join(self._inbuf)
+            pos = buf.find('\r\n\r\n')
+            if pos == -1:
+                return
+            self._inbuf = [buf[pos+4:]]
+            self._nread = len(self._inbuf[0])
+            self._header = False
+            if not self.parse_header(buf[:pos]):
+                # Data is not needed
+                self.finish()
+                return
+
+        if self._length != -1 and self._nread >= self._length:
+            self.finish()
+
+    def parse_header(self, header):
+        """ Parse the status line and headers of the response.
+        Returns False if the body need not be read """
+
+        resp = self.response
+        lines = header.split('\r\n')
+        parts = lines[0].split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ValueError, 'Bad status line %s' % repr(lines[0])
+        resp.status = int(parts[1])
+        if len(parts)==3:
+            resp.reason = parts[2].strip()
+
+        key = None
+        for line in lines[1:]:
+            if line[:1] in (' ', '\t') and key:
+                # Continuation of previous header
+                resp.headers[key] = resp.headers[key] + ' ' + line.strip()
+                continue
+
+            pos = line.find(':')
+            if pos == -1: continue
+            key, val = line[:pos].strip(), line[pos+1:].strip()
+            # Repeated headers are joined, as done by httplib
+            if key in resp.headers:
+                resp.headers[key] = resp.headers[key] + ', ' + val
+            else:
+                resp.headers[key] = val
+
+        if resp.status in REDIRECT_CODES or resp.status == 304:
+            return False
+
+        try:
+            self._length = int(resp.headers.get('content-length', '-1').split(',')[0])
+        except ValueError:
+            self._length = -1
+
+        maxsize = self._engine.maxsize
+        if maxsize and self._length > maxsize and not self.request.range:
+            resp.oversize = True
+            return False
+
+        return True
+
+    def handle_close(self):
+        self.finish()
+
+    def handle_error(self):
+        t, v, tb = sys.exc_info()
+        del tb
+        self.response.error = (URL_SOCKET_ERROR, str(v))
+        self.finish()
+
+    def handle_expt(self):
+        self.response.error = (URL_SOCKET_ERROR, 'Socket exception')
+        self.finish()
+
+    def timeout(self):
+        """ Abort the request since it timed out """
+
+        self.response.error = (URL_SOCKET_ERROR, 'timed out')
+        self.finish()
+
+    def finish(self):
+        """ Close the channel and pass the response
+        to the engine """
+
+        if self._done: return
+        self._done = True
+        self.close()
+
+        resp = self.response
+        if self._header and resp.error is None:
+            if self._inbuf:
+                resp.error = (URL_SOCKET_ERROR, 'Bad response')
+            else:
+                resp.error = (URL_SOCKET_ERROR, 'Connection closed without response')
+        elif not resp.oversize:
+            resp.data = ''.join(self._inbuf)
+            if self._length != -1 and len(resp.data) < self._length and resp.error is None:
+                resp.error = (URL_SOCKET_ERROR, 'Connection closed before end of data')
+        self._inbuf = []
+
+        resp.elapsed = time.time() - self.starttime
+        self._engine.channel_done(self)
+
+class HarvestManAsyncRequest(object):
+    """ A url requested from the fetch engine """
+
+    def __init__(self, urlobj, lastmodified=-1):
+        self.urlobj = urlobj
+        self.url = urlobj.get_full_url()
+        self.lastmodified = lastmodified
+        self.range = urlobj.range
+        # Number of attempts and redirections
+        self.tries = 0
+        self.redirects = 0
+
+class HarvestManAsyncEngine(object):
+    """ Fetch engine which multiplexes many HTTP
+    requests in one asyncore loop """
+
+    def __init__(self, maxconns=100):
+        cfg = GetObject('config')
+        # Maximum number of requests in flight
+        self.maxconns = maxconns
+        # Socket map of the channels of this engine
+        self.socketmap = {}
+        # Timeout for a request
+        self.timeout = cfg.socktimeout
+        self.retries = cfg.retryfailed
+        self.maxsize = cfg.maxfilesize
+        self.compress = cfg.httpcompress
+        self._auth = ''
+        if cfg.username and cfg.passwd:
+            self._auth = base64.encodestring('%s:%s' % (cfg.username, cfg.passwd)).strip()
+        self._useragent = GetObject('USER_AGENT')
+        # Host names are resolved only once, since
+        # resolution blocks the loop
+        self._addrs = {}
+        # Completed requests
+        self._done = []
+
+    def __len__(self):
+        return len(self.socketmap)
+
+    def is_full(self):
+        """ Return whether the maximum number of requests
+        is in flight """
+
+        return len(self.socketmap) >= self.maxconns
+
+    def can_fetch(self, urlobj):
+        """ Return whether the url can be fetched by
+        the engine """
+
+        if urlobj.protocol != 'http://':
+            return False
+        network = GetObject('connector')
+        if network and network.get_useproxy():
+            return False
+        return True
+
+    def fetch(self, urlobj, lastmodified=-1):
+        """ Start a request for the url object. The url
+        object is returned by poll when it completes """
+
+        self._start(HarvestManAsyncRequest(urlobj, lastmodified), urlobj.get_full_url())
+
+    def _start(self, request, url):
+        request.tries += 1
+
+        try:
+            addr = self.resolve(url)
+            channel = HarvestManHttpChannel(self, request, url, addr)
+        except (socket.error, ValueError), e:
+            resp = HarvestManAsyncResponse(url)
+            resp.error = (URL_SOCKET_ERROR, str(e))
+            resp.tries = request.tries
+            self._done.append((request.urlobj, resp))
+
+    def resolve(self, url):
+        """ Return the socket address for the url """
+
+        scheme, netloc = urlparse.urlsplit(url)[:2]
+        if scheme != 'http':
+            raise ValueError, 'Cannot fetch %s url' % scheme
+
+        host, port = netloc, 80
+        if '@' in host:
+            host = host.split('@', 1)[1]
+        if ':' in host:
+            host, port = host.split(':', 1)
+            port = int(port or 80)
+
+        try:
+            ip = self._addrs[host]
+        except KeyError:
+            ip = self._addrs[host] = socket.gethostbyname(host)
+
+        return (ip, port)
+
+    def make_request_data(self, request, url):
+        """ Return the HTTP request for the url """
+
+        scheme, netloc, path, query, frag = urlparse.urlsplit(url)
+        if '@' in netloc:
+            netloc = netloc.split('@', 1)[1]
+        path = path or '/'
+        if query:
+            path = path + '?' + query
+
+        # HTTP/1.0 so that the response is not chunked
+        # and the end of data is signalled by a close
+        lines = ['GET %s HTTP/1.0' % path,
+                 'Host: %s' % netloc,
+                 'User-Agent: %s' % self._useragent,
+                 'Connection: close']
+        if self.compress:
+            lines.append('Accept-Encoding: gzip')
+        if self._auth:
+            lines.append('Authorization: Basic %s' % self._auth)
+        if request.lastmodified != -1:
+            ts = time.strftime("%a, %d %b %Y %H:%M:%S GMT",
+                               time.localtime(request.lastmodified))
+            lines.append('If-Modified-Since: %s' % ts)
+        if request.range:
+            lines.append('Range: bytes=%d-%d' % (request.range[0], request.range[-1]))
+
+        return '\r\n'.join(lines) + '\r\n\r\n'
+
+    def channel_done(self, channel):
+        """ Called by a channel when its request
+        is complete """
+
+        request, resp = channel.request, channel.response
+        resp.tries = request.tries
+
+        if resp.status in REDIRECT_CODES and request.redirects < MAX_REDIRECTIONS:
+            location = resp.headers.get('location') or resp.headers.get('uri')
+            if location:
+                request.redirects += 1
+                url = urlparse.urljoin(resp.url, location)
+                debug('Redirecting', request.url, '=>', url)
+                self._start(request, url)
+                return
+
+        if resp.error and resp.status == 0 and request.tries <= self.retries:
+            extrainfo(resp.error[1], '=> ', resp.url, ', retrying...')
+            self._start(request, resp.url)
+            return
+
+        self._done.append((request.urlobj, resp))
+
+    def poll(self, timeout=0.1):
+        """ Run the loop once, waiting at most timeout seconds
+        for a socket to become ready. Returns a list of the
+        url objects completed, with their responses """
+
+        if self.socketmap:
+            asyncore.loop(timeout, False, self.socketmap, 1)
+        elif not self._done:
+            time.sleep(timeout)
+
+        # Abort requests which timed out
+        now = time.time()
+        for channel in self.socketmap.values():
+            if now - channel.starttime > self.timeout:
+                channel.timeout()
+
+        done, self._done = self._done, []
+        return done
+
+    def close(self):
+        """ Abort all requests """
+
+        for channel in self.socketmap.values():
+            channel.close()
+        self.socketmap.clear()
+        self._done = []
+
+class HarvestManAsyncUrlConnector(HarvestManUrlConnector):
+    """ Connector which saves a url fetched by the fetch
+    engine. The rules, cache checks and file writing of
+    save_url are the same as for the regular connector """
+
+    def __init__(self, response):
+        HarvestManUrlConnector.__init__(self)
+        self._response = response
+
+    def connect(self, urltofetch, url_obj = None, fetchdata=True, retries=1, lastmodified=-1):
+        """ Process the response from the fetch engine
+        like the regular connect method """
+
+        resp = self._response
+        if resp is None or resp.oversize:
+            # Multipart downloads are done by the regular
+            # connector
+            return HarvestManUrlConnector.connect(self, urltofetch, url_obj, fetchdata,
+                                                  retries, lastmodified)
+
+        data = ''
+        three_oh_four = False
+        self._numtries = resp.tries
+        self._headers.clear()
+        self._error = { 'number' : 0,
+                        'msg' : '',
+                        'fatal' : False }
+
+        if resp.error:
+            self._error['number'], self._error['msg'] = resp.error
+            extrainfo(self._error['msg'], '=> ', urltofetch)
+        elif resp.status == 304:
+            # Page not modified
+            three_oh_four = True
+            self.set_headers(resp.headers)
+            url_obj.manage_content_type(self.get_content_type())
+        elif resp.status >= 400:
+            self._error['number'] = resp.status
+            self._error['msg'] = resp.reason
+            extrainfo(resp.reason, '=> ', urltofetch)
+            self.handle_http_error(resp.status, urltofetch)
+        else:
+            self._status = 1
+            self.set_headers(resp.headers)
+            url_obj.clength = int(self.get_content_length() or 0)
+            self.check_actual_url(url_obj, urltofetch, resp.url)
+            url_obj.manage_content_type(self.get_content_type())
+            if self._numtries>1:
+                moreinfo("Reconnect succeeded => ", urltofetch)
+            self.set_content_info(url_obj)
+
+            if fetchdata:
+                data = resp.data
+                self._elapsed = resp.elapsed
+                GetObject('datamanager').update_bytes(len(data))
+                data = self.decode_data(data)
+
+            url_obj.status = 0
+
+        # Release the data of the response
+        self._response = None
+
+        if data: self._data = data
+
+        if url_obj and url_obj.status != 0:
+            url_obj.status = self._error['number']
+            url_obj.fatal = self._error['fatal']
+
+        if three_oh_four:
+            return 1
+
+        if data:
+            return 0
+        else:
+            return -1
+
+    def set_headers(self, headers):
+        """ Set http header dictionary from a response """
+
+        self._headers.clear()
+        for key,val in headers.iteritems():
+            self._headers[key] = val
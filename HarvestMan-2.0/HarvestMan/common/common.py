@@ -92,6 +92,8 @@ class Registry(object):
                               'HarvestManCrawlerQueue' : 'trackerqueue',
                               'HarvestMan' : 'crawler',
                               'HarvestManLogger'    : 'logger',
+                              'HarvestManJournal' : 'journal',
+                              'HarvestManParserPool' : 'parserpool',
                               }
             pass
         
@@ -197,7 +199,7 @@ def GetObject(objkey):
     registry object """
 
     try:
-        obj = eval('RegisterObj.' + str(objkey), globals())
+        obj = getattr(RegisterObj, str(objkey))
         if type(obj)=='instance':
             return weakref.proxy(obj)
         else:
@@ -78,6 +78,10 @@ class LRU(object):
             a.next = None
             del self.d[a.me[0]]
             del a
+    def get(self, obj, default=None):
+        if obj in self.d:
+            return self[obj]
+        return default
     def __delitem__(self, obj):
         nobj = self.d[obj]
         if nobj.prev:
@@ -151,12 +151,22 @@ class HarvestManStateObject(dict):
         # Time out for fetchers is a rather
         # small 4 minutes
         self.fetchertimeout = 240.0
+        # Switch threads between crawler and fetcher
+        # roles according to the queue depths
+        self.balancetrackers = 1
+        # Interval in seconds between checks of the
+        # balance of crawler and fetcher threads
+        self.balanceinterval = 2.0
         self.getimagelinks=1
         self.getstylesheets=1
         self.threadpoolsize=10
         self.renamefiles=0
         self.fetchlevel=0
         self.browsepage=0
+        # Html parser for web pages
+        # 0 => sgmllib based parser
+        # 1 => sgmlop based parser, if sgmlop is available
+        # 2 => regular expression based parser
         self.htmlparser=0
         self.checkfiles=1
         self.pagecache=1
@@ -196,6 +206,14 @@ class HarvestManStateObject(dict):
         self.junkfilter = True
         self.junkfilterdomains = True
         self.junkfilterpatterns = True
+        # Flag for skipping the links of web pages which
+        # are near-duplicates of pages already crawled
+        self.nearduplicates = False
+        # Maximum number of bits in which the SimHash
+        # fingerprints of near-duplicate pages differ
+        self.nearduplicatedistance = 3
+        # Maximum number of fingerprints kept
+        self.nearduplicatesize = 100000
         self.urltreefile = ''
         self.urlfile = ''
         self.maxfilesize=5242880
@@ -208,15 +226,60 @@ class HarvestManStateObject(dict):
         self.runfile = None
         # Control var for session-saver feature.
         self.savesessions = True
+        # Interval in seconds at which changes to the
+        # run-state are written to the session journal.
+        # If zero, the run-state is saved only at exit.
+        self.checkpointinterval = 30.0
+        # Number of journal records after which the
+        # journal is compacted
+        self.checkpointcompact = 50000
         # List of enabled plugins
         self.plugins = []
         # Control var for simulation feature
         self.simulate = False
-        # Time to sleep between requests
+        # Time gap between requests to the same host
         self.sleeptime = 2.0
         self.randomsleep = True
-        # Internal flag for asyncore
-        self.useasyncore = True
+        # Adapt time gap of a host to its response time
+        self.adaptivedelay = True
+        # Time gap is at least this times the response time
+        self.delayfactor = 2.0
+        # Maximum adaptive time gap
+        self.maxdelay = 30.0
+        # Time gaps for specific hosts, string of the
+        # form host1=gap1,host2=gap2...
+        self.hostdelay = ''
+        # Maximum number of items kept in memory by the
+        # url and data queues, the rest are spilled to disk.
+        # Zero means no limit.
+        self.frontiermemory = 0
+        # Maximum number of url objects kept in memory
+        # by the data manager, the rest are kept in the
+        # url database of the project. Zero means no limit.
+        self.urlmemory = 0
+        # Maximum memory in megabytes used by the set
+        # of urls seen in a crawl
+        self.seenmemory = 64
+        # Flag for fetching urls with the asynchronous
+        # fetch engine instead of blocking fetcher threads
+        self.useasyncore = False
+        # Maximum number of requests in flight for
+        # each asynchronous fetcher
+        self.asyncconnections = 100
+        # Number of worker processes for parsing
+        # web pages, zero means pages are parsed
+        # by the fetcher threads
+        self.parseworkers = 0
+        # Maximum number of pages in flight for
+        # the parser processes, zero means twice
+        # the number of workers
+        self.parsewindow = 0
+        # Flag for parsing web pages as they are
+        # downloaded, making url objects for their
+        # links before the download is complete.
+        # The links are pushed once the page is
+        # checked for duplicate content.
+        self.streamparse = False
         # For http compression
         self.httpcompress = True
         # Type of URLs which can be
@@ -338,16 +401,36 @@ class HarvestManStateObject(dict):
                          'serverfilter' : ('serverfilter','str'),
                          'wordfilter' : ('wordfilter','str'),
                          'junkfilter_value' : ('junkfilter','int'),
+                         'nearduplicates_value' : ('nearduplicates','int'),
+                         'nearduplicates_distance' : ('nearduplicatedistance','int'),
+                         'nearduplicates_size' : ('nearduplicatesize','int'),
                          'workers_status' : ('usethreads','int'),
                          'workers_size' : ('threadpoolsize','int'),
                          'workers_timeout' : ('timeout','float'),
                          'trackers_value' : ('maxtrackers','int'),
                          'trackers_timeout' : ('fetchertimeout','float'),                         
+                         'trackers_balance' : ('balancetrackers','int'),
+                         'trackers_interval' : ('balanceinterval','float'),
                          'locale' : ('locale','str'),
                          'fastmode_value': ('fastmode','int'),
                          'savesessions_value': ('savesessions','int'),
+                         'checkpoint_interval': ('checkpointinterval','float'),
+                         'checkpoint_compact': ('checkpointcompact','int'),
                          'timegap_value': ('sleeptime', 'float'),
                          'timegap_random': ('randomsleep', 'int'),
+                         'timegap_adaptive': ('adaptivedelay', 'int'),
+                         'timegap_factor': ('delayfactor', 'float'),
+                         'timegap_max': ('maxdelay', 'float'),
+                         'hostdelay': ('hostdelay', 'str'),
+                         'frontier_memory': ('frontiermemory', 'int'),
+                         'urlstore_memory': ('urlmemory', 'int'),
+                         'seenurls_memory': ('seenmemory', 'int'),
+                         'asyncore_status': ('useasyncore', 'int'),
+                         'asyncore_connections': ('asyncconnections', 'int'),
+                         'parser_workers': ('parseworkers', 'int'),
+                         'parser_window': ('parsewindow', 'int'),
+                         'parser_stream': ('streamparse', 'int'),
+                         'parser_engine': ('htmlparser', 'int'),
                          
                          'simulate_value': ('simulate', 'int'),
                          'localise_value' : ('localise','int'),
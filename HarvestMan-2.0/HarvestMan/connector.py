@@ -70,6 +70,7 @@ import threading as tg
 import urllib2 
 import urlparse
 import gzip
+import zlib
 import cStringIO
 import os
 import shutil
@@ -104,6 +105,10 @@ URL_GENERAL_ERROR = 91
 
 DATA_READER_EXCEPTION = 101
 
+# Size of blocks in which data of web pages is
+# read when it is parsed as it is downloaded
+STREAM_BLOCK_SIZE = 8192
+
 class DataReaderException(Exception):
     pass
 
@@ -631,6 +636,9 @@ class HarvestManUrlConnector(object):
         self._acquired = True
         # Url object
         self._urlobj = None
+        # Stream parser to which data of web pages
+        # is fed as it is downloaded
+        self._stream = None
         
     def __del__(self):
         del self._data
@@ -722,7 +730,6 @@ class HarvestManUrlConnector(object):
         data = '' 
 
         dmgr = GetObject('datamanager')
-        rulesmgr = GetObject('ruleschecker')
 
         if url_obj == None:
             try:
@@ -821,35 +828,7 @@ class HarvestManUrlConnector(object):
                 # The actual url information is used to
                 # differentiate between directory like urls
                 # and file like urls.
-                actual_url = self._freq.geturl()
-                
-                # Replace the urltofetch in actual_url with null
-                if actual_url:
-                    no_change = (actual_url == urltofetch)
-                    
-                    if not no_change:
-                        replacedurl = actual_url.replace(urltofetch, '')
-                        # If the difference is only as a directory url
-                        if replacedurl=='/':
-                            no_change = True
-                        else:
-                            no_change = False
-                            
-                        # Sometimes, there could be HTTP re-directions which
-                        # means the actual url may not be same as original one.
-                        if no_change:
-                            if (actual_url[-1] == '/' and urltofetch[-1] != '/'):
-                                extrainfo('Setting directory url=>',urltofetch)
-                                url_obj.set_directory_url()
-                                
-                        else:
-                            # There is considerable change in the URL.
-                            # So we need to re-resolve it, since otherwise
-                            # some child URLs which derive from this could
-                            # be otherwise invalid and will result in 404
-                            # errors.
-                            url_obj.url = actual_url
-                            url_obj.wrapper_resolveurl()
+                self.check_actual_url(url_obj, urltofetch, self._freq.geturl())
                     
                 # Find the actual type... if type was assumed
                 # as wrong, correct it.
@@ -866,30 +845,19 @@ class HarvestManUrlConnector(object):
 
                 if fetchdata:
                     try:
-                        # If gzip-encoded, need to deflate data
-                        encoding = self.get_content_encoding()
-
                         t1 = time.time()
                         debug("Reading data for",urltofetch,"...")
-                        data = self._freq.read()
+                        if self._stream and url_obj.is_webpage():
+                            data = self.read_stream()
+                        else:
+                            data = self._freq.read()
                         debug("Read data for",urltofetch,".")                        
 
                         self._elapsed = time.time() - t1
                         
-                        # Save a reference
-                        data0 = data
                         self._freq.close()                        
                         dmgr.update_bytes(len(data))
-                        
-                        if encoding.strip().find('gzip') != -1:
-                            try:
-                                gzfile = gzip.GzipFile(fileobj=cStringIO.StringIO(data))
-                                data = gzfile.read()
-                                gzfile.close()
-                            except (IOError, EOFError), e:
-                                data = data0
-                                #extrainfo('Error deflating HTTP compressed data:',str(e))
-                                pass
+                        data = self.decode_data(data)
                             
                     except MemoryError, e:
                         # Catch memory error for sockets
@@ -929,24 +897,9 @@ class HarvestManUrlConnector(object):
                     content_type = self.get_content_type()
                     url_obj.manage_content_type(content_type)                    
                     break
-                if errnum == 407: # Proxy authentication required
-                    self._proxy_query(1, 1)
-                elif errnum == 503: # Service unavailable
-                    rulesmgr.add_to_filter(urltofetch)
-                    self._error['fatal']=True                        
-                elif errnum == 504: # Gateway timeout
-                    rulesmgr.add_to_filter(urltofetch)
-                    self._error['fatal']=True                        
-                elif errnum in range(500, 505): # Server error
-                    self._error['fatal']=True
-                elif errnum == 404:
-                    # Link not found, this might
-                    # be a file wrongly fetched as directory
-                    # Add to filter
-                    rulesmgr.add_to_filter(urltofetch)
-                    self._error['fatal']=True
-                elif errnum == 401: # Site authentication required
-                    self._error['fatal']=True
+
+                self.handle_http_error(errnum, urltofetch)
+                if errnum == 401: # Site authentication required
                     break
 
             except urllib2.URLError, e:
@@ -1063,6 +1016,123 @@ class HarvestManUrlConnector(object):
         else:
             return -1
 
+    def check_actual_url(self, url_obj, urltofetch, actual_url):
+        """ Compare the url which was fetched with the actual
+        url of the response and update the url object if the
+        url was redirected """
+        
+        # Replace the urltofetch in actual_url with null
+        if actual_url:
+            no_change = (actual_url == urltofetch)
+
+            if not no_change:
+                replacedurl = actual_url.replace(urltofetch, '')
+                # If the difference is only as a directory url
+                if replacedurl=='/':
+                    no_change = True
+                else:
+                    no_change = False
+
+                # Sometimes, there could be HTTP re-directions which
+                # means the actual url may not be same as original one.
+                if no_change:
+                    if (actual_url[-1] == '/' and urltofetch[-1] != '/'):
+                        extrainfo('Setting directory url=>',urltofetch)
+                        url_obj.set_directory_url()
+
+                else:
+                    # There is considerable change in the URL.
+                    # So we need to re-resolve it, since otherwise
+                    # some child URLs which derive from this could
+                    # be otherwise invalid and will result in 404
+                    # errors.
+                    url_obj.url = actual_url
+                    url_obj.wrapper_resolveurl()
+
+    def decode_data(self, data):
+        """ Deflate the data if it is gzip-encoded """
+
+        encoding = self.get_content_encoding()
+        if encoding.strip().find('gzip') != -1:
+            try:
+                gzfile = gzip.GzipFile(fileobj=cStringIO.StringIO(data))
+                data2 = gzfile.read()
+                gzfile.close()
+                return data2
+            except (IOError, EOFError), e:
+                #extrainfo('Error deflating HTTP compressed data:',str(e))
+                pass
+
+        return data
+
+    def read_stream(self):
+        """ Read the data of the current connection in blocks,
+        feeding each block to the stream parser as it arrives """
+
+        stream = self._stream
+        stream.reset()
+
+        decomp = None
+        if self.get_content_encoding().strip().find('gzip') != -1:
+            decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        blocks = []
+        feeding = True
+        
+        while True:
+            block = self._freq.read(STREAM_BLOCK_SIZE)
+            if not block: break
+            blocks.append(block)
+
+            if not feeding: continue
+            if decomp is not None:
+                try:
+                    block = decomp.decompress(block)
+                except zlib.error, e:
+                    # The page will be parsed after
+                    # download, if at all
+                    extrainfo('Error deflating HTTP compressed data:',str(e))
+                    feeding = False
+                    continue
+                
+            stream.feed(block)
+
+        if feeding:
+            stream.close()
+            
+        return ''.join(blocks)
+    
+    def set_stream_parser(self, stream):
+        """ Set the stream parser to which the data of
+        web pages is fed as it is downloaded """
+
+        self._stream = stream
+        
+    def handle_http_error(self, errnum, urltofetch):
+        """ Update the error state and the filters for
+        an HTTP error other than 304 """
+
+        rulesmgr = GetObject('ruleschecker')
+        
+        if errnum == 407: # Proxy authentication required
+            self._proxy_query(1, 1)
+        elif errnum == 503: # Service unavailable
+            rulesmgr.add_to_filter(urltofetch)
+            self._error['fatal']=True                        
+        elif errnum == 504: # Gateway timeout
+            rulesmgr.add_to_filter(urltofetch)
+            self._error['fatal']=True                        
+        elif errnum in range(500, 505): # Server error
+            self._error['fatal']=True
+        elif errnum == 404:
+            # Link not found, this might
+            # be a file wrongly fetched as directory
+            # Add to filter
+            rulesmgr.add_to_filter(urltofetch)
+            self._error['fatal']=True
+        elif errnum == 401: # Site authentication required
+            self._error['fatal']=True
+        
     def set_progress_object(self, topic, n=0, subtopics=[], nolengthmode=False):
         """ Set the progress bar object with the given topic
         and sub-topics """
@@ -1620,7 +1690,11 @@ class HarvestManUrlConnector(object):
             # File exists - could be many reasons for it (redirected URL
             # duplicate download etc) - first check if this is a redirected
             # URL.
-            if urlobj.reresolved:
+            if self._cfg.resuming and not dmgr.is_file_downloaded(fname):
+                # Left by the crawl which was resumed while
+                # its url was being downloaded
+                return self._write_url_filename(fname)
+            elif urlobj.reresolved:
                 # Get old filename and save in it
                 urlobj.useoldfilename = True
                 directory = urlobj.get_local_directory_old()
@@ -2144,6 +2218,8 @@ class HarvestManUrlConnector(object):
         self._numtries = 0
         # Urlobject
         self._urlobj = None
+        # Stream parser
+        self._stream = None
 
         
 class HarvestManUrlConnectorFactory(object):
@@ -46,7 +46,6 @@ import os, sys
 import socket
 import time
 import threading
-import random
 import exceptions
 import sha
 
@@ -60,6 +59,9 @@ from common.methodwrapper import MethodWrapperMetaClass
 
 import urlparser
 import pageparser
+import asyncfetch
+import parsepool
+import simhash
 
 # Defining pluggable functions
 # Plugin name is the key and value is <class>:<function>
@@ -71,8 +73,6 @@ __plugins__ = { 'fetcher_process_url_plugin': 'HarvestManUrlFetcher:process_url'
 # Callback name is the key and value is <class>:<function>
 __callbacks__ = { 'fetcher_process_url_callback' : 'HarvestManUrlFetcher:process_url',
                   'crawler_crawl_url_callback' : 'HarvestManUrlCrawler:crawl_url',
-                  'fetcher_push_buffer_callback' : 'HarvestManUrlFetcher:push_buffer',
-                  'crawler_push_buffer_callback' : 'HarvestManUrlCrawler:push_buffer',
                   'fetcher_terminate_callback' : 'HarvestManUrlFetcher:terminate',
                   'crawler_terminate_callback' : 'HarvestManUrlCrawler:terminate' }
               
@@ -112,6 +112,9 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
 
         # End flag
         self._endflag = False
+        # Retire flag, set when the thread should exit
+        # after its current item
+        self._retire = False
         # Status of thread (This is different from the
         # thread alive status. This is a harvestman
         # crawler status )
@@ -133,13 +136,14 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
         self._configobj = GetObject('config')
         # Crawler queue object
         self._crawlerqueue = GetObject('trackerqueue')
-        # Local Buffer for Objects
-        # to be put in q.
-        self.buffer = MyDeque()
-        # Flag for pushing to buffer
-        self._pushflag = self._configobj.fastmode and (not self._configobj.blocking)
         # Resume flag - for resuming from a saved state
         self._resuming = False
+        # Item from the queue which was being processed when
+        # the thread died with a parse error, handed over to
+        # run() which restarts the thread with it or marks
+        # it as done
+        self._item = None
+        self._handover = False
         
     def __str__(self):
         return self.getName()
@@ -210,6 +214,7 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
                 # Now I am dead - so I need to tell the queue
                 # object to migrate my data and produce a new
                 # thread.
+                resumed = False
                 
                 # See class for last error. If it is same as
                 # this error, don't do anything since this could
@@ -219,11 +224,14 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
                     debug('Looks like a repeating error, not trying to restart thread %s' % (str(self)))
                 else:
                     self.__class__._lasterror = e
-                    self._crawlerqueue.dead_thread_callback(self)
+                    resumed = (self._crawlerqueue.dead_thread_callback(self) == 0)
                     extrainfo('Tracker thread %s has died due to error: %s' % (str(self), str(e)))
 
+                if self._handover and not resumed:
+                    # No thread takes over my item, so it is done
+                    self._crawlerqueue.work_done(self._item, self._role)
+                    
                 self._status = 0
-                self.buffer = []
 
     def terminate(self):
         """ Kill this crawler thread """
@@ -239,6 +247,17 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
         self._endflag = True
         self.set_download_flag(False)
         
+    def retire(self):
+        """ Ask this crawler thread to exit after it is done
+        with its current item """
+
+        self._retire = True
+
+    def is_retired(self):
+        """ Return whether this crawler thread is retired """
+
+        return self._retire
+    
     def get_status(self):
         """ Return the running status of this crawler """
         
@@ -258,10 +277,8 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
         """ Let others know whether I am working
         or idling """
 
-        # Fix: Check length of local buffer also
-        # before returning.
         # extrainfo('Status=>',self._status,self)
-        if self._status != 0 or len(self.buffer):
+        if self._status != 0:
             debug('My status is=>',self._status,self)
             return True
 
@@ -290,22 +307,6 @@ class HarvestManBaseUrlCrawler( threading.Thread ):
         manage its data """
 
         pass
-        
-    def push_buffer(self):
-        """ Try to push items in local buffer to queue """
-
-        debug('Pushing buffer',self)
-        self._status = 1
-
-        # Try to push the last item
-        stuff = self.buffer[-1]
-
-        if self._crawlerqueue.push(stuff, self._role):
-            debug('Pushed buffer',self)
-            # Remove item
-            self.buffer.remove(stuff)
-
-        self._status = 0
 
 class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
     """ The crawler class which crawls urls and fetches their links.
@@ -340,13 +341,6 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
         
         return HarvestManBaseUrlCrawler.set_url_object(self, url_obj)
 
-    def sleep(self):
-
-        if self._configobj.randomsleep:
-            time.sleep(random.random()*self._configobj.sleeptime)
-        else:
-            time.sleep(self._configobj.sleeptime)
-
     def action(self):
         
         if self._isThread:
@@ -354,49 +348,52 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
             if not self._resuming:
                 self._loops = 0
 
-            while not self._endflag:
+            # Item got from the queue
+            obj = None
+            
+            while not self._endflag and not self._retire:
 
                 if not self._resuming:
-                    if self.buffer and self._pushflag:
-                        self.push_buffer()
-
+                    # This waits for data, a None object
+                    # means the queue is shut down.
                     obj = self._crawlerqueue.get_url_data( "crawler" )
                     
                     if not obj:
-                        if self._endflag: break
-
-                        if self.buffer and self._pushflag:
-                            debug('Trying to push buffer...')
-                            self.push_buffer()
-
-                        debug('OBJECT IS NONE,CONTINUING...',self)
-                        continue
+                        debug('OBJECT IS NONE, EXITING...',self)
+                        break
 
                     self.set_url_object(obj)
                     if self._urlobject==None:
                         debug('NULL URLOBJECT',self)
+                        self._crawlerqueue.work_done(obj, self._role)
                         continue
 
                     # We needs to do violates check here also
-                    if self._urlobject.violates_rules(): continue
+                    if self._urlobject.violates_rules():
+                        self._crawlerqueue.work_done(obj, self._role)
+                        continue
                     
                     # Set status to one to denote busy state
                     self._status = 1
-
-                    self.sleep()
                     
-                # Do a crawl to generate new objects
-                # only after trying to push buffer
-                # objects.
-                self.crawl_url()
-
-                self._loops += 1
-
-                del self._urlobject
-                self._urlobject = None
-                
-                # Sleep for some time
-                self.sleep()
+                # Do a crawl to generate new objects. Once links
+                # are pushed, or if the crawl fails, this item is
+                # done, unless run() restarts the thread with it.
+                self._handover = False
+                try:
+                    try:
+                        self.crawl_url()
+                    except SGMLParseError:
+                        self._item, self._handover = obj, True
+                        raise
+
+                    self._loops += 1
+
+                    del self._urlobject
+                    self._urlobject = None
+                finally:
+                    if not self._handover:
+                        self._crawlerqueue.work_done(obj, self._role)
                 
                 # Set status to zero to denote idle state                
                 self._status = 0
@@ -412,8 +409,6 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
     def apply_url_priority(self, url_obj):
         """ Apply priority to url objects """
 
-        cfg = GetObject('config')
-
         # Set initial priority to previous url's generation
         url_obj.priority = self._urlobject.generation
 
@@ -424,28 +419,12 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
         if url_obj.is_webpage():
             curr_priority -= 1
 
-        # Apply any priorities specified based on file extensions in
-        # the config file.
-        pr_dict1, pr_dict2 = cfg.urlprioritydict, cfg.serverprioritydict
-        # Get file extension
-        extn = ((os.path.splitext(url_obj.get_filename()))[1]).lower()
-        # Skip the '.'
-        extn = extn[1:]
-
-        # Get domain (server)
-        domain = url_obj.get_domain()
-
-        # Apply url priority
-        if extn in pr_dict1:
-            curr_priority -= int(pr_dict1[extn])
-
-        # Apply server priority, this allows a a partial
-        # key match 
-        for key in pr_dict2:
-            # Apply the first match
-            if domain.find(key) != -1:
-                curr_priority -= int(pr_dict2[domain])
-                break
+        # Apply any priorities specified based on file extensions
+        # and servers in the config file. Server priorities allow
+        # a partial key match.
+        matcher = GetObject('ruleschecker').get_priority_matcher()
+        curr_priority -= matcher.get_priority(url_obj.get_filename(),
+                                              url_obj.get_domain())
             
         # Set priority again
         url_obj.priority = curr_priority
@@ -484,6 +463,10 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
         priority_indx = 0
 
         send_str = ''
+
+        # Links which pass the rules, these are
+        # pushed to the queue in one go.
+        objs = []
         
         for url_obj in self.links:
 
@@ -506,17 +489,15 @@ class HarvestManUrlCrawler(HarvestManBaseUrlCrawler):
             # Check for basic rules of download
             if url_obj.violates_rules(): continue
 
-            # Thread is going to push data, set status to locked...
-            self._status = 2
-            
             priority_indx += 1
             self.apply_url_priority( url_obj )
+            objs.append(url_obj)
 
-            # Fix for hanging threads - Use a local buffer
-            # to store url objects, if they could not be
-            # adde to queue.
-            if not self._crawlerqueue.push( url_obj, "crawler" ):
-                if self._pushflag: self.buffer.append(url_obj)
+        if objs:
+            # Thread is going to push data, set status to locked...
+            self._status = 2
+            
+            self._crawlerqueue.push_many( objs, "crawler" )
                 
             # Thread was able to push data, set status to busy...
             self._status = 1
@@ -530,11 +511,26 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
         HarvestManBaseUrlCrawler.__init__(self, index, url_obj, isThread)
         self._fetchtime = 0
         self._fetchstatus = 0
+        # Response for the current url, if it was
+        # fetched by the asynchronous fetch engine
+        self._response = None
+        # Stream parser for the current url, if it
+        # is parsed as it is downloaded
+        self._stream = None
+        # Parent of the links of the current url, and
+        # the links and child url objects found while
+        # it was downloaded
+        self._parent = None
+        self._streamed = {}
+        self._early = []
+        # (type, url, cgi) of links skipped without
+        # creating url objects, for localising
+        self._skipped = []
         
     def _initialize(self):
         HarvestManBaseUrlCrawler._initialize(self)
         self._role = "fetcher"
-        self.wp = pageparser.HarvestManSimpleParser()
+        self.wp = pageparser.make_html_parser()
         # For increasing ref count of url
         # objects so that they don't get
         # dereferenced!
@@ -549,6 +545,18 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
         """ Return the time stamp before fetching """
 
         return self._fetchtime
+
+    def get_response(self):
+        """ Return the response for the current url if it
+        was fetched by the asynchronous fetch engine """
+
+        return self._response
+
+    def get_stream_parser(self):
+        """ Return the stream parser for the current url if
+        it is parsed as it is downloaded """
+
+        return self._stream
     
     def set_url_object(self, obj):
 
@@ -562,14 +570,6 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
 
         return HarvestManBaseUrlCrawler.set_url_object(self, url_obj)
 
-    def sleep(self):
-
-        if self._configobj.randomsleep:
-            time.sleep(random.random()*self._configobj.sleeptime)
-        else:
-            time.sleep(self._configobj.sleeptime)
-
-            
     def action(self):
         
         if self._isThread:
@@ -577,53 +577,51 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
             if not self._resuming:
                 self._loops = 0            
 
-            while not self._endflag:
+            # Item got from the queue
+            obj = None
+            
+            while not self._endflag and not self._retire:
                     
                 if not self._resuming:
-                    if self.buffer and self._pushflag:
-                        debug('Trying to push buffer...')
-                        self.push_buffer()
-
-                    # If url server is disabled, get data
-                    # from Queue, else query url server for
-                    # new urls.
+                    # This waits for data, a None object
+                    # means the queue is shut down.
                     obj = self._crawlerqueue.get_url_data("fetcher" )
                     
                     if not obj:
-                        if self._endflag: break
-
-                        if self.buffer and self._pushflag:
-                            debug('Trying to push buffer...')
-                            self.push_buffer()
-
-                        continue
+                        break
 
                     if not self.set_url_object(obj):
                         debug('NULL URLOBJECT',self)
+                        self._crawlerqueue.work_done(obj, self._role)
                         if self._endflag: break
                         continue
 
                     # Set status to busy 
                     self._status = 1
-
-                    # Inserting a random sleep
-                    self.sleep()
                 
-                # Process to generate new objects
-                # only after trying to push buffer
-                # objects.
-                self.process_url()
-                self._loops += 1
-
-                del self._urlobject
-                self._urlobject = None
-
-                # Sleep for some random time
-                self.sleep()
-                debug("Setting status to zero",self)
-                self._status = 0
-                debug("Set status to zero",self)                
-                self._fetchstatus = 0
+                # Process to generate new objects. Once data is
+                # pushed, or if processing fails, this item is
+                # done, unless run() restarts the thread with it.
+                self._handover = False
+                try:
+                    try:
+                        self.process_url()
+                    except SGMLParseError:
+                        self._item, self._handover = obj, True
+                        raise
+                    
+                    self._loops += 1
+
+                    del self._urlobject
+                    self._urlobject = None
+
+                    debug("Setting status to zero",self)
+                    self._status = 0
+                    debug("Set status to zero",self)                
+                    self._fetchstatus = 0
+                finally:
+                    if not self._handover:
+                        self._crawlerqueue.work_done(obj, self._role)
                 
                 # Set resuming flag to False
                 self._resuming = False
@@ -659,6 +657,125 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
         else:
             return links[:offset_end]
         
+    def get_parent_url(self, base):
+        """ Return the url object against which the links of
+        the current web page are resolved, given the url of its
+        <base href="..."> tag, if any """
+
+        if base and not self._urlobject.is_equal(base):
+            extrainfo("Base url defined, replacing",self._url)
+            # Construct a url object
+            url_obj = urlparser.HarvestManUrlParser(base,
+                                                    TYPE_BASE,
+                                                    0,
+                                                    self._urlobject,
+                                                    self._configobj.projdir)
+            url_obj.set_index()
+            GetObject('datamanager').add_url(url_obj)
+
+            # Save a reference otherwise
+            # proxy might be deleted
+            self._tempobj = url_obj
+            return url_obj
+
+        return self._urlobject
+
+    def filter_links(self, links, images):
+        """ Return the links of a web page, including or
+        excluding its images as configured """
+        
+        # Some times image links are provided in webpages as regular <a href=".."> links.
+        # So in order to filer images fully, we need to check the wp.links list also.
+        # Sample site: http://www.sheppeyseacadets.co.uk/gallery_2.htm
+            
+        if self._configobj.images:
+            return links + images
+        else:
+            # Filter any links with image extensions out from links
+            return [(type, link) for type, link in links if link[link.rfind('.'):].lower() not in \
+                    urlparser.HarvestManUrlParser.image_extns] 
+
+    def make_children(self, url_obj, links, add=True):
+        """ Create url objects for the links of the
+        web page with the given parent url object. The
+        url objects are added to the data manager unless
+        add is False """
+
+        mgr = GetObject('datamanager')
+        ruleschecker = GetObject('ruleschecker')
+        cfg = self._configobj
+        children = []
+
+        # Links are first resolved on strings against the
+        # parent url, and those which are duplicates or are
+        # filtered out are skipped without creating url objects.
+        joinbase = url_obj.get_join_base()
+        skipped = 0
+        
+        for typ, url in links:
+            is_cgi, is_php = False, False
+
+            #if url.find('#') != -1:
+            #    extrainfo('URL: %s, type: %s' % (url, typ))
+
+            if url.find('php?') != -1: is_php = True
+            if typ == 'form' or is_php: is_cgi = True
+
+            if not url: continue
+
+            if (typ == 'javascript' and not cfg.javascript) or \
+               (typ == 'javaapplet' and not cfg.javaapplet):
+                skip = True
+            else:
+                fullurl = urlparser.join_url(joinbase, url)
+                skip = fullurl is not None and ruleschecker.is_filtered_url(fullurl, typ)
+
+            if skip:
+                skipped += 1
+                # Links of the page are still localised
+                if cfg.localise:
+                    self._skipped.append((typ, url, is_cgi))
+                continue
+            
+            try:
+                child_urlobj = urlparser.HarvestManUrlParser(url,
+                                                             typ,
+                                                             is_cgi,
+                                                             url_obj)
+
+                child_urlobj.set_index()
+                if add: mgr.add_url(child_urlobj)
+                children.append(child_urlobj)
+
+                # extrainfo('URL: %s FROMURL: %s' % (url, self._urlobject.get_full_url()))
+                # extrainfo('CONSTRUCTED URL: %s' % child_urlobj.get_full_url())
+
+            except urlparser.HarvestManUrlParserError, e:
+                debug('Error: ',e)
+                continue
+
+        if skipped:
+            debug('Skipped %d links of %s before creating url objects' % (skipped, url_obj.get_full_url()))
+            
+        return children
+
+    def collect_stream_links(self, links, images):
+        """ Create the url objects of the links found in the
+        current web page while it is being downloaded. They are
+        pushed with the rest of the links of the page once it
+        is downloaded and is not a duplicate """
+
+        if self._parent is None:
+            # The <head> of the page is parsed by now
+            self._parent = self.get_parent_url(self._stream.parser.get_base_url())
+
+        url_obj = self._parent
+        links = self.filter_links(links, images)
+        for link in links:
+            self._streamed[link] = 1
+            
+        self._early.extend(self.make_children(url_obj, links, False))
+        
     def process_url(self):
         """ This function downloads the data for a url and writes its files.
         It also posts the data for web pages to a data queue """
@@ -666,6 +783,23 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
         mgr = GetObject('datamanager')
         ruleschecker = GetObject('ruleschecker')
 
+        self._parent = None
+        self._streamed = {}
+        self._early = []
+        self._skipped = []
+        self._stream = None
+        
+        # Web pages can be parsed as they are downloaded, and
+        # url objects made for their links before the download
+        # is complete.
+        cfg = self._configobj
+        if cfg.streamparse and self._urlobject.is_webpage() and self._response is None:
+            callback = None
+            # Offsets apply to the full list of links
+            if cfg.linksoffsetstart == 0 and cfg.linksoffsetend == -1:
+                callback = self.collect_stream_links
+            self._stream = pageparser.HarvestManStreamParser(self.wp, callback)
+            
         data = ''
         if not mgr.is_downloaded(self._url):
             moreinfo('Downloading file for url', self._urlobject.get_full_url())
@@ -677,7 +811,9 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
             self._fetchstatus = 2
             
             debug('AFTER DOWNLOAD_URL',self)
-            
+
+        stream, self._stream = self._stream, None
+        
         # Rules checker object
         ruleschecker = GetObject('ruleschecker')
 
@@ -689,10 +825,23 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
 
             # Check if this page was already crawled
             url = self._urlobject.get_full_url()
-            sh = sha.new()
-            sh.update(data)
-            # Set this hash on the URL object itself
-            self._urlobject.pagehash = str(sh.hexdigest())
+
+            # If there is a parser pool, the page is hashed
+            # and parsed by a worker process, unless it was
+            # already parsed as it was downloaded
+            pool = GetObject('parserpool')
+            info = None
+            if pool and not (stream and stream.complete):
+                extrainfo("Parsing web page", self._url)
+                info = pool.parse(data, self._url)
+
+            if info:
+                self._urlobject.pagehash = info.pagehash
+            else:
+                sh = sha.new()
+                sh.update(data)
+                # Set this hash on the URL object itself
+                self._urlobject.pagehash = str(sh.hexdigest())
 
             # Duplicate content check is different from duplicate URL check...
             if ruleschecker.check_duplicate_content(self._urlobject):
@@ -703,110 +852,71 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
             # so add a NULL entry. (Nov 30 2004 - Refer header)
             # mgr.update_links(self._urlobject.get_full_filename(), [])            
             self._status = 2
-            
-            extrainfo("Parsing web page", self._url)
 
-            links = []
+            if not info:
+                extrainfo("Parsing web page", self._url)
+                info = parsepool.parse_page(data, self._url, self.wp, stream)
 
-            # Perform any Javascript based redirection etc
-            try:
-                parser = pageparser.HarvestManJSParser()
-                parser.feed(data)
-                if parser.redirectedurl:
-                    extrainfo("Javascript redirection to",parser.redirectedurl)
-                    links.append((urlparser.TYPE_WEBPAGE, parser.redirectedurl))
-            except Exception, e:
-                extrainfo("Error while parsing Javascript", e)
-                
-            try:
-                self.wp.reset()
-                self.wp.feed(data)
-                # Bug Fix: If the <base href="..."> tag was defined in the
-                # web page, relative urls must be constructed against
-                # the url provided in <base href="...">
-                
-                if self.wp.base_url_defined():
-                    url = self.wp.get_base_url()
-                    if not self._urlobject.is_equal(url):
-                        extrainfo("Base url defined, replacing",self._url)
-                        # Construct a url object
-                        url_obj = urlparser.HarvestManUrlParser(url,
-                                                                TYPE_BASE,
-                                                                0,
-                                                                self._urlobject,
-                                                                self._configobj.projdir)
-                        url_obj.set_index()
-                        mgr.add_url(url_obj)
-                        
-                        # Save a reference otherwise
-                        # proxy might be deleted
-                        self._tempobj = url_obj
-
-                self.wp.close()
-            except (SGMLParseError, IOError), e:
-                extrainfo('SGML parse error:',str(e))
-                extrainfo('Error in parsing web-page %s' % self._url)
-            except ValueError, e:
-                pass
+            # Bug Fix: If the <base href="..."> tag was defined in the
+            # web page, relative urls must be constructed against
+            # the url provided in <base href="...">
+            if self._parent is None:
+                self._parent = self.get_parent_url(info.base)
+            url_obj = self._parent
             
             if self._configobj.robots:
                 # Check for NOFOLLOW tag
-                if not self.wp.can_follow:
+                if not info.can_follow:
                     extrainfo('URL %s defines META Robots NOFOLLOW flag, not following its children...' % self._url)
                     return data
 
-            # print 'LINKS=>',self.wp.links
-            links.extend(self.wp.links)
-            
-            # Some times image links are provided in webpages as regular <a href=".."> links.
-            # So in order to filer images fully, we need to check the wp.links list also.
-            # Sample site: http://www.sheppeyseacadets.co.uk/gallery_2.htm
-            
-            if self._configobj.images:
-                links += self.wp.images
-            else:
-                # Filter any links with image extensions out from links
-                links = [(type, link) for type, link in links if link[link.rfind('.'):].lower() not in \
-                         urlparser.HarvestManUrlParser.image_extns] 
+            if self._configobj.nearduplicates:
+                # Links of pages which are near-duplicates of
+                # pages already crawled are skipped
+                fingerprint = info.simhash
+                if fingerprint is None:
+                    fingerprint = simhash.fingerprint(data)
+                if ruleschecker.check_near_duplicate(self._urlobject, fingerprint):
+                    extrainfo('Skipped links of URL %s => near duplicate content' % url)
+                    info.links, info.images = [], []
+                    self._early, self._skipped = [], []
+
+            # Links include any Javascript redirection
+            links = self.filter_links(info.links, info.images)
 
             # print 'Links=>',links
             links = self.offset_links(links)
             # print 'Links=>',links
-            
+
+            if self._streamed:
+                # Skip links found during download
+                links = [link for link in links if link not in self._streamed]
+                
+            children = self.make_children(url_obj, links)
+            if self._early:
+                # Url objects of the links found during download,
+                # which are added now that the page is not a
+                # duplicate
+                for child in self._early:
+                    mgr.add_url(child)
+                children = self._early + children
+                
             # Create collection object
             coll = HarvestManAutoUrlCollection(url_obj)
-            
-            for typ, url in links:
-                is_cgi, is_php = False, False
-
-                #if url.find('#') != -1:
-                #    extrainfo('URL: %s, type: %s' % (url, typ))
-                    
-                if url.find('php?') != -1: is_php = True
-                if typ == 'form' or is_php: is_cgi = True
-
-                if not url: continue
-
-                try:
-                    child_urlobj = urlparser.HarvestManUrlParser(url,
-                                                                 typ,
-                                                                 is_cgi,
-                                                                 url_obj)
-                    
-                    child_urlobj.set_index()
-                    mgr.add_url(child_urlobj)
-                    coll.addURL(child_urlobj)
-
-                    # extrainfo('URL: %s FROMURL: %s' % (url, self._urlobject.get_full_url()))
-                    # extrainfo('CONSTRUCTED URL: %s' % child_urlobj.get_full_url())
-                    
-                except urlparser.HarvestManUrlParserError, e:
-                    debug('Error: ',e)
-                    continue
+            for child in children:
+                coll.addURL(child)
+                
+            self._crawlerqueue.push((url_obj.priority, coll), 'fetcher')
+
+            if self._skipped:
+                # Links of the page are localised together
+                coll = HarvestManAutoUrlCollection(url_obj)
+                for child in children:
+                    coll.addURL(child)
+                for typ, url, is_cgi in self._skipped:
+                    coll.addSkippedURL(typ, url, is_cgi)
+                self._skipped = []
                 
-            if not self._crawlerqueue.push((url_obj.priority, coll), 'fetcher'):
-                if self._pushflag: self.buffer.append((url_obj.priority, coll))
-
             # Update links called here
             mgr.update_links(coll)
 
@@ -850,8 +960,7 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
                 except urlparser.HarvestManUrlParserError:
                     continue
 
-            if not self._crawlerqueue.push((self._urlobject.priority, coll), 'fetcher'):
-                if self._pushflag: self.buffer.append((self._urlobject.priority, coll))
+            self._crawlerqueue.push((self._urlobject.priority, coll), 'fetcher')
 
             # Update links called here
             mgr.update_links(coll)
@@ -862,6 +971,126 @@ class HarvestManUrlFetcher(HarvestManBaseUrlCrawler):
             # Dont do anything
             return None
 
+class HarvestManAsyncUrlFetcher(HarvestManUrlFetcher):
+    """ Fetcher which keeps many urls in flight using the
+    asynchronous fetch engine. When the request for a url
+    completes, the url is processed in the same way as by
+    the regular fetcher """
+
+    def __init__(self, index, url_obj = None, isThread=True):
+        HarvestManUrlFetcher.__init__(self, index, url_obj, isThread)
+        # Items whose requests are in flight,
+        # indexed on the url index
+        self._inflight = {}
+        self._engine = None
+        
+    def fetch_item(self, obj):
+        """ Start the request for an item got from the
+        url queue, or process it at once if it cannot be
+        fetched by the engine """
+
+        if not self.set_url_object(obj):
+            debug('NULL URLOBJECT',self)
+            self._crawlerqueue.work_done(obj, self._role)
+            return
+
+        urlobj = self._urlobject
+        self._urlobject = None
+        
+        mgr = GetObject('datamanager')
+        if urlobj.index in self._inflight:
+            # Duplicate, nothing to do
+            self._crawlerqueue.work_done(obj, self._role)
+        elif self._engine.can_fetch(urlobj) and not mgr.is_downloaded(self._url):
+            lmt, cache_data = mgr.get_last_modified_time_and_data(urlobj)
+            self._inflight[urlobj.index] = obj
+            self._engine.fetch(urlobj, lmt)
+        else:
+            self.process_item(obj)
+
+    def process_item(self, obj, response=None):
+        """ Process an item, with the response for its
+        url if it was fetched by the engine """
+
+        self.set_url_object(obj)
+        self._status = 1
+        self._response = response
+        # Once data is pushed, or if processing fails, this
+        # item is done, unless run() restarts the thread with it
+        self._handover = False
+        try:
+            try:
+                self.process_url()
+            except SGMLParseError:
+                self._item, self._handover = obj, True
+                raise
+            
+            self._loops += 1
+            self._urlobject = None
+            self._fetchstatus = 0
+        finally:
+            self._response = None
+            if not self._handover:
+                self._crawlerqueue.work_done(obj, self._role)
+        
+    def action(self):
+
+        if not self._isThread:
+            return HarvestManUrlFetcher.action(self)
+
+        if self._resuming:
+            # Finish the url of the thread which died
+            self._handover = False
+            try:
+                try:
+                    self.process_url()
+                except SGMLParseError:
+                    self._item, self._handover = None, True
+                    raise
+            finally:
+                if not self._handover:
+                    self._crawlerqueue.work_done()
+            self._resuming = False
+        
+        self._loops = 0
+        self._engine = asyncfetch.HarvestManAsyncEngine(self._configobj.asyncconnections)
+
+        try:
+            while not self._endflag:
+                # Fill up the free connections. Urls are waited
+                # for only when no request is in flight.
+                if not self._retire and not self._engine.is_full():
+                    obj = self._crawlerqueue.get_url_data("fetcher", not self._inflight, 0.0)
+                    if obj:
+                        self.fetch_item(obj)
+                        continue
+                    elif not self._inflight:
+                        # Queue is shut down or thread is retired
+                        break
+                elif not self._inflight:
+                    break
+
+                self._status = 1
+                for urlobj, response in self._engine.poll(0.1):
+                    obj = self._inflight.pop(urlobj.index)
+                    self.process_item(obj, response)
+
+                if not self._inflight:
+                    self._status = 0
+        finally:
+            self._engine.close()
+            # Requests still in flight if the thread is stopped
+            # or dies are put back in the queue for the other
+            # threads, or marked done if the queue is shut down
+            for obj in self._inflight.values():
+                if self._endflag or not self._crawlerqueue.push(obj[1], 'crawler'):
+                    self._crawlerqueue.work_done(obj, self._role)
+                else:
+                    # The url is queued again under its index, so
+                    # the pop of its old entry is not journalled
+                    self._crawlerqueue.work_done(None, self._role)
+            self._inflight.clear()
+            self._status = 0
 
 class HarvestManUrlDownloader(HarvestManUrlFetcher, HarvestManUrlCrawler):
     """ This is a mixin class which does both the jobs of crawling webpages
@@ -915,20 +1144,19 @@ class HarvestManUrlDownloader(HarvestManUrlFetcher, HarvestManUrlCrawler):
                 self.crawl_url()
 
                 self._loops += 1
-                self.sleep()
                 # Set status to zero to denote idle state                
                 self._status = 0
         else:
             while True:
                 self.process_url()
 
-                obj = self._crawlerqueue.get_url_data( "crawler" )
+                obj = self._crawlerqueue.get_url_data( "crawler", False )
                 if obj: self.set_url_object2(obj)
 
                 if self._urlobject.is_webpage():
                     self.crawl_url()
 
-                obj = self._crawlerqueue.get_url_data("fetcher" )
+                obj = self._crawlerqueue.get_url_data("fetcher", False )
                 self.set_url_object(obj)
                     
                 if self.is_exit_condition(): break
@@ -43,9 +43,13 @@ import threading as tg
 import utils
 import urlparser
 import mirrors
+import hosts
+import ledger
+import urlstore
 
 from urlthread import HarvestManUrlThreadPool
 from connector import *
+from asyncfetch import HarvestManAsyncUrlConnector
 from common.common import *
 from common.methodwrapper import MethodWrapperMetaClass
 
@@ -69,25 +73,14 @@ class HarvestManDataManager(object):
 
         self._numfailed = 0
         self._projectcache = {}
-        self._downloaddict = { '_savedfiles': MyDeque(),
-                               '_deletedfiles': MyDeque(),
-                               '_failedurls' : MyDeque(),
-                               '_doneurls': MyDeque(),
-                               '_collections': MyDeque(),
-                               '_reposfiles' : 0,
-                               '_cachefiles': 0
-                             }
+        # Ledger of the state of urls and of the
+        # files downloaded
+        self._ledger = ledger.HarvestManDownloadLedger()
         # Config object
         self._cfg = GetObject('config')
-        # Dictionary of servers crawled and
-        # their meta-data. Meta-data is
-        # a dictionary which currently
-        # has only one entry.
-        # i.e accept-ranges.
-        self._serversdict = {}
-        # Url dictionary, storing all url objects
+        # Url store, storing all url objects
         # w.r.t their index
-        self._urldict = {}
+        self._urlstore = urlstore.HarvestManUrlStore()
         # byte count
         self._bytes = 0L
         # Redownload flag
@@ -107,6 +100,10 @@ class HarvestManDataManager(object):
             self._urlThreadPool.spawn_threads()
         else:
             self._urlThreadPool = None
+
+        # Url objects beyond the memory limit are kept
+        # in the url database of the project
+        self._urlstore.open(self.get_url_db_file(), self._cfg.urlmemory)
         
     def get_state(self):
         """ Return a snapshot of the current state of this
@@ -117,9 +114,13 @@ class HarvestManDataManager(object):
         
         d = {}
         d['_numfailed'] = self._numfailed
-        d['_downloaddict'] = self._downloaddict
-        d['_urldict'] = self._urldict
-        d['_serversdict'] = self._serversdict
+        d['_ledger'] = self._ledger
+        d['_urldict'] = self._urlstore.get_dict()
+        d['_urlindex'] = urlparser.HarvestManUrlParser.IDX
+        # Meta-data of the servers crawled is
+        # kept in the host table, this is a
+        # dictionary of server => meta-data
+        d['_serversdict'] = self.get_server_dictionary()
         d['_bytes'] = self._bytes
 
         dcopy = copy.deepcopy(d)
@@ -131,22 +132,60 @@ class HarvestManDataManager(object):
         """ Set state to a previous saved state """
         
         self._numfailed = state.get('_numfailed', 0)
-        self._downloaddict = state.get('_downloaddict', self._downloaddict)
-        self._urldict = state.get('_urldict', self._urldict)
-        self._serversdict = state.get('_serversdict', self._serversdict)        
+        if '_ledger' in state:
+            self._ledger = state['_ledger']
+        elif '_downloaddict' in state:
+            # State saved by an earlier version
+            ddict = state['_downloaddict']
+            self._ledger.load(ddict['_doneurls'], ddict['_savedfiles'],
+                              ddict['_deletedfiles'], ddict['_failedurls'],
+                              ddict['_collections'], ddict['_reposfiles'],
+                              ddict['_cachefiles'])
+        if '_urlstore' in state:
+            # Url objects of a journal
+            self._urlstore.close()
+            self._urlstore = state['_urlstore']
+        else:
+            self._urlstore.update(state.get('_urldict', {}))
+        # Url objects are keyed by index in the url store and
+        # the journal, so new url objects should not reuse the
+        # indices of restored ones.
+        urlindex = state.get('_urlindex')
+        if urlindex is None:
+            # State saved by an earlier version
+            urlindex = max([0] + [int(key) for key in state.get('_urldict', {})])
+        urlparser.HarvestManUrlParser.IDX = max(urlparser.HarvestManUrlParser.IDX, urlindex)
+        hosts.hosttable.set_server_dictionary(state.get('_serversdict', {}))
         self._bytes = state.get('_bytes', 0L)
 
         
     def add_url(self, urlobj):
         """ Add urlobject urlobj to the local dictionary """
         
-        # self._urldict[str(urlobj.index)] = weakref.ref(urlobj)
-        self._urldict[str(urlobj.index)] = urlobj
+        self._urlstore.add(urlobj)
+        self._ledger.mark_queued(urlobj.get_full_url())
+
+        journal = GetObject('journal')
+        if journal: journal.log_url(urlobj)
         
+    def update_url(self, urlobj):
+        """ Save the changes to a url object made when
+        it was downloaded """
+
+        # Pieces of multipart downloads are copies of
+        # the url object
+        if not urlobj.trymultipart:
+            self._urlstore.add(urlobj)
+
     def get_url(self, index):
 
-        # return self._urldict[str(index)]()
-        return self._urldict[str(index)]    
+        return self._urlstore.get(int(index))
+
+    def close_url_db(self):
+        """ Close the url database, removing its file. Url
+        objects which are only on disk are lost """
+
+        self._urlstore.close()
 
     def get_url_db_file(self):
         """ Return the URL database file """
@@ -193,7 +232,7 @@ class HarvestManDataManager(object):
             return ''        
 
     def get_server_dictionary(self):
-        return self._serversdict
+        return hosts.hosttable.get_server_dictionary()
 
     def supports_range_requests(self, urlobj):
         """ Check whether the given url object
@@ -205,13 +244,8 @@ class HarvestManDataManager(object):
         # the server dictionary
         # -1 => does not accept
         
-        # Look up its server in the dictionary
-        server = urlobj.get_full_domain()
-        if server in self._serversdict:
-            d = self._serversdict[server]
-            return d.get('accept-ranges', 0)
-
-        return 0
+        # Look up its server in the host table
+        return urlobj.get_host().acceptranges
         
     def read_project_cache(self):
         """ Try to read the project cache file """
@@ -495,7 +529,7 @@ class HarvestManDataManager(object):
         self._evt.clear()
         
         if self._cfg.retryfailed:
-            self._numfailed = len(self._downloaddict['_failedurls'])
+            self._numfailed = self._ledger.num_failed()
             moreinfo(' ')
             # try downloading again
             # mod: made this multithreaded
@@ -505,7 +539,7 @@ class HarvestManDataManager(object):
 
                 # FIXME: Since a copy of urlobject is made, we need to
                 # modify the logic in update_file_stats function for failedurls.
-                failedurls = self._downloaddict['_failedurls']
+                failedurls = self._ledger.get_failed_urls()
 
                 for urlobj in failedurls:
                     # If this is the base URL, skip it
@@ -530,8 +564,11 @@ class HarvestManDataManager(object):
             self.dump_headers()
 
         # localise downloaded file's links, dont do if jit localisation
-        # is enabled.
-        if self._cfg.localise:
+        # is enabled. An interrupted crawl whose state is saved is
+        # localised when it is resumed and completed.
+        resumable = self._cfg.keyboardinterrupt and self._cfg.savesessions and \
+                    GetObject('trackerqueue').get_outstanding_work() > 0
+        if self._cfg.localise and not resumable:
             self.localise_links()
 
         # Write archive file...
@@ -553,10 +590,11 @@ class HarvestManDataManager(object):
         nlinks, nservers, ndirs = ruleschecker.get_stats()
         nfailed = self._numfailed
 
-        numstillfailed = len(self._downloaddict['_failedurls'])
-        numfiles = len(self._downloaddict['_savedfiles'])
-        numfilesinrepos = self._downloaddict['_reposfiles']
-        numfilesincache = self._downloaddict['_cachefiles']
+        counts = self._ledger.get_counts()
+        numstillfailed = self._ledger.num_failed()
+        numfiles = counts['files']
+        numfilesinrepos = counts['filesinrepos']
+        numfilesincache = counts['filesincache']
 
         numretried = self._numfailed  - numstillfailed
         fetchtime = float((math.modf((self._cfg.endtime-self._cfg.starttime)*100.0)[1])/100.0)
@@ -589,10 +627,10 @@ class HarvestManDataManager(object):
         # Wait on the event
         self._evt.wait()
         
-        try:
-            self._downloaddict['_failedurls'].index(urlObject)
-        except:
-            self._downloaddict['_failedurls'].append(urlObject)
+        if self._ledger.mark_failed(urlObject):
+            journal = GetObject('journal')
+            if journal: journal.log('failed', urlObject.index)
+        self.update_url(urlObject)
 
         return 0
 
@@ -605,9 +643,9 @@ class HarvestManDataManager(object):
         # typ mapping
         # 0 => saved files
         if typ==0:
-            lookuplist = self._downloaddict.get('_savedfiles', [])
-            if filename in lookuplist:
-                lookuplist.remove(filename)
+            if self._ledger.mark_deleted(filename):
+                journal = GetObject('journal')
+                if journal: journal.log('deleted', filename)
                 return True
 
         return False
@@ -624,30 +662,16 @@ class HarvestManDataManager(object):
         # the base url of this url.
         filename = urlObject.get_full_filename()
 
-        ok=False
-
-        # Status == 1 or 2 means look up in "_savedfiles"
-        # Status == 3 means look up in "_reposfiles"
-        # Status == 4 means look up in "_cachefiles"
-        if status == 1 or status == 2:
-            lookuplist = self._downloaddict['_savedfiles']
-            if not filename in lookuplist:
-                lookuplist.append( filename )
-        elif status == 3:
-            self._downloaddict['_reposfiles'] += 1
-            # extrainfo('Filename=>',filename,self._downloaddict['_reposfiles'])
-        elif status == 4:
-            self._downloaddict['_cachefiles'] += 1            
-        #else:
-        #    return -1
-        
-        # If this was present in failed urls list, remove it
-        try:
-            self._downloaddict['_failedurls'].index(urlObject)
-            self._downloaddict['_failedurls'].remove(urlObject)
-        except:
-            pass
-            
+        # Status == 1 or 2 means the file was saved
+        # Status == 3 means the file in the repository was uptodate
+        # Status == 4 means the file was restored from the cache
+        # The url is removed from the failed urls, if present
+        self._ledger.mark_saved(urlObject.get_full_url(), filename, status)
+        self.update_url(urlObject)
+
+        journal = GetObject('journal')
+        if journal: journal.log('saved', urlObject.index, urlObject.get_full_url(), filename, status)
+        
         return 0
     
     def update_links(self, collection):
@@ -656,8 +680,10 @@ class HarvestManDataManager(object):
         # Wait on the event
         self._evt.wait()
         
-        linkscoll = self._downloaddict.get('_collections')
-        linkscoll.append(collection)
+        self._ledger.add_collection(collection)
+
+        journal = GetObject('journal')
+        if journal: journal.log('collection', collection)
 
     def thread_download(self, urlObj):
         """ Download this url object in a separate thread """
@@ -740,13 +766,11 @@ class HarvestManDataManager(object):
         """ Download a URL using HTTP/1.1 multipart download
         using range headers """
 
-        # First add entry of this domain in
-        # dictionary, if not there
-        domain = urlobj.get_full_domain()
-        try:
-            self._serversdict[domain]
-        except KeyError:
-            self._serversdict[domain] = {'accept-ranges': True}
+        # First mark the server of this url
+        # as accepting ranges, if not known
+        host = urlobj.get_host()
+        if not host.acceptranges:
+            host.acceptranges = True
 
         if mirrors.supported_server(urlobj):
             return mirrors.download_multipart_url(urlobj, clength, self._cfg.numparts, self._urlThreadPool)
@@ -790,32 +814,51 @@ class HarvestManDataManager(object):
         
         url = urlobj.get_full_url()
         
-        try:
-            self._downloaddict['_doneurls'].index(url)
-        except ValueError:
-            self._downloaddict['_doneurls'].append(url)            
+        if self._ledger.mark_done(url):
+            journal = GetObject('journal')
+            if journal: journal.log('done', url, urlobj.index)
         
         # Modified - Anand Jan 10 06, added the caller thread
         # argument to this function for keeping a dictionary
         # containing URLs currently being downloaded by fetchers.
         
+        # Data of urls fetched by the asynchronous fetch
+        # engine is already downloaded.
+        response = caller.get_response()
+        
         no_threads = (not self._cfg.usethreads) or \
                      urlobj.is_webpage() or \
-                     urlobj.is_stylesheet()
+                     urlobj.is_stylesheet() or \
+                     (response is not None)
 
         data=""
         if no_threads:
             server = urlobj.get_domain()
             conn_factory = GetObject('connectorfactory')
 
-            # This call will block if we exceed the number of connections
-            debug('WAITING FOR CONNECTION...',caller)
-            conn = conn_factory.create_connector(urlobj)
-            debug('GOT CONNECTION...',caller)
-            
-            res = conn.save_url( urlobj )
-            
-            conn_factory.remove_connector(conn)
+            if response is not None:
+                # The connector only applies the rules and
+                # writes the files
+                conn = HarvestManAsyncUrlConnector(response)
+                fetchtime = response.elapsed
+                res = conn.save_url( urlobj )
+            else:
+                # This call will block if we exceed the number of connections
+                debug('WAITING FOR CONNECTION...',caller)
+                conn = conn_factory.create_connector(urlobj)
+                debug('GOT CONNECTION...',caller)
+
+                # Web pages may be parsed as they are downloaded
+                conn.set_stream_parser(caller.get_stream_parser())
+                t1 = time.time()
+                res = conn.save_url( urlobj )
+                fetchtime = time.time() - t1
+                conn.set_stream_parser(None)
+                conn_factory.remove_connector(conn)
+                
+            # Politeness for the host is handled by the
+            # url queue, which needs the response time
+            GetObject('trackerqueue').record_fetch(urlobj, fetchtime)
 
             # Return values for res
             # 0 => error, file not downloaded
@@ -837,11 +880,11 @@ class HarvestManDataManager(object):
                 if res==1:
                     moreinfo("Saved to",filename)
 
-                self.update_file_stats( urlobj, res )
-
                 data = conn.get_data()
                 # Update pagehash on the URL object
                 if data: urlobj.pagehash = sha.new(data).hexdigest()
+
+                self.update_file_stats( urlobj, res )
                 
             else:
                 fetchurl = urlobj.get_full_url()
@@ -861,27 +904,19 @@ class HarvestManDataManager(object):
         """ Find if the <filename> is present in the
         saved files list """
 
-        try:
-            self._downloaddict['_savedfiles'].index(filename)
-            return True
-        except ValueError:
-            return False
+        return self._ledger.is_file_saved(filename)
 
     def is_downloaded(self, url):
         """ Check whether the given URL was processed by
         download_url method """
 
-        try:
-            self._downloaddict['_doneurls'].index(url)
-            return True
-        except ValueError:
-            return False
+        return self._ledger.is_done(url)
     
     def clean_up(self):
         """ Purge data for a project by cleaning up
         lists, dictionaries and resetting other member items"""
 
-        self._downloaddict = {}
+        self._ledger.clear()
         # Reset byte count
         self._bytes = 0L
 
@@ -944,7 +979,7 @@ class HarvestManDataManager(object):
         """ Add original URL headers of urls downloaded
         as an entry to the cache file """
 
-        linkscoll = self._downloaddict['_collections']
+        linkscoll = self._ledger.get_collections()
         listoflinks = [coll.getAllURLs() for coll in linkscoll]
 
         for links in listoflinks:
@@ -972,7 +1007,7 @@ class HarvestManDataManager(object):
         # print dbmfile
         extrainfo("Writing url headers database")        
         
-        linkscoll = self._downloaddict['_collections']
+        linkscoll = self._ledger.get_collections()
         listoflinks = [coll.getAllURLs() for coll in linkscoll]
         
         headersdict = {}
@@ -999,7 +1034,7 @@ class HarvestManDataManager(object):
         
         info('Localising links of downloaded web pages...',)
 
-        linkscoll = self._downloaddict['_collections']
+        linkscoll = self._ledger.get_collections()
         
         count = 0
 
@@ -1007,6 +1042,12 @@ class HarvestManDataManager(object):
         for collection in linkscoll:
             sourceurl = self.get_url(collection.getSourceURL())
             childurls = [self.get_url(index) for index in collection.getAllURLs()]
+            # Url objects for links skipped during the crawl
+            for typ, url, cgi in collection.getSkippedURLs():
+                try:
+                    childurls.append(urlparser.HarvestManUrlParser(url, typ, cgi, sourceurl))
+                except urlparser.HarvestManUrlParserError:
+                    pass
             filename = sourceurl.get_full_filename()
 
             if (not filename in localized) and os.path.exists(filename):
@@ -1223,6 +1264,9 @@ class HarvestManDataManager(object):
             
         if fatal: info(fatal,fns[6],'had fatal errors and failed to download.')
         if bytes: info(bytes,' bytes received at the rate of',bps,ratespec,'.\n')
+
+        cache = urlparser.HarvestManUrlParser.resolutioncache
+        extrainfo('Url resolution cache:',cache.hits,'hits,',cache.misses,'misses, hit rate %.1f%%' % cache.hit_rate())
         info('*** Log Completed ***\n')
         
         # get current time stamp
@@ -1300,7 +1344,7 @@ class HarvestManDataManager(object):
     def dump_urltree_textmode(self, stream):
         """ Dump urls in text mode """
 
-        linkscoll = self._downloaddict['_collections']
+        linkscoll = self._ledger.get_collections()
         
         for collection in linkscoll:
             idx = 0
@@ -1329,7 +1373,7 @@ class HarvestManDataManager(object):
     def dump_urltree_htmlmode(self, stream):
         """ Dump urls in html mode """
 
-        linkscoll = self._downloaddict['_collections']
+        linkscoll = self._ledger.get_collections()
 
         # Write html header
         stream.write('<html>\n')
@@ -1483,9 +1527,9 @@ class HarvestManController(tg.Thread):
     def _manage_file_limits(self):
         """ Manage limits on maximum file count """
 
-        ddict = self._dmgr._downloaddict
+        dledger = self._dmgr._ledger
         
-        lsaved = len(ddict.get('_savedfiles', []))
+        lsaved = dledger.num_saved()
         lmax = self._cfg.maxfiles
 
         if lsaved < lmax:
@@ -1499,7 +1543,7 @@ class HarvestManController(tg.Thread):
         # files while we were killing, then delete them!
         if lsaved > lmax:
             diff = lsaved - lmax
-            savedcopy = (ddict['_savedfiles'])[0:]
+            savedcopy = dledger.get_saved_files()
 
             for x in xrange(diff):
                 # 2 bugs: fixed a bug where the deletion
@@ -1512,8 +1556,7 @@ class HarvestManController(tg.Thread):
                     try:
                         extrainfo('Deleting file ', lastfile)
                         os.remove(lastfile)
-                        (ddict['_deletedfiles']).append(lastfile)
-                        ddict['_savedfiles'].remove(lastfile)
+                        dledger.mark_deleted(lastfile, ledger.REASON_FILELIMIT)
                     except (OSError, IndexError, ValueError), e:
                         logconsole(e)
 
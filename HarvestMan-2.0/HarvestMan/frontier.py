@@ -0,0 +1,792 @@
+# -- coding: latin-1
+""" frontier.py - Module providing the crawl frontier, i.e the
+    priority queues which hold urls and url data waiting to be
+    processed by crawler and fetcher threads. This is part of
+    the HarvestMan program.
+
+    The queues are binary heaps keyed on (priority, sequence)
+    so that push and pop are O(log n) and items of equal
+    priority come out in the order they were pushed.
+
+    The url queue is a host-aware frontier which keeps one
+    sub-queue per host along with the time at which that host
+    may next be fetched from. Only urls of hosts which are
+    ready are handed out, which takes care of politeness
+    without making the crawler threads sleep.
+
+    Optionally a frontier keeps only a bounded number of items
+    in memory and spills the rest to append-only segment files
+    on disk, one chain of segments per priority, from where
+    they are paged back in as the items in memory drain.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import os
+import math
+import heapq
+import itertools
+import random
+import time
+import tempfile
+import cPickle, pickle
+
+from collections import deque
+
+from Queue import Queue, Empty, Full
+
+def heap_extend(heap, entries):
+    """ Add a list of entries to a heap in place. The entries
+    are pushed one by one if there are few of them compared to
+    the heap, else the heap is rebuilt in a single pass """
+
+    n, k = len(heap), len(entries)
+    # Pushing costs about k*log(n+k) comparisons, while
+    # heapify costs about 2*(n+k).
+    if k > 1 and k*math.log(n+k, 2) > 2*(n+k):
+        heap.extend(entries)
+        heapq.heapify(heap)
+    else:
+        for entry in entries:
+            heapq.heappush(heap, entry)
+    
+class HarvestManFrontierSpill(object):
+    """ Disk store for the spilled tail of a frontier. Items
+    are pickled to append-only segment files. There is a FIFO
+    of segments per priority, so that items of a priority are
+    read back in the order in which they were spilled """
+
+    # Number of items per segment file
+    segsize = 10000
+    
+    def __init__(self, spooldir=None, dumpfunc=None, loadfunc=None):
+        # Directory for the segment files, created on
+        # first spill
+        self.spooldir = spooldir
+        self.dirname = ''
+        # Functions to convert an item to and from a compact
+        # record which is written to disk. By default the
+        # item itself is pickled.
+        self.dumpfunc = dumpfunc
+        self.loadfunc = loadfunc
+        # Dictionary of priority => deque of segments
+        self.levels = {}
+        self.count = 0
+        self._segidx = itertools.count()
+
+    def __len__(self):
+        return self.count
+
+    def has_priority(self, prio):
+        """ Return whether items of the given priority
+        are spilled """
+
+        return prio in self.levels
+
+    def min_priority(self):
+        """ Return the lowest spilled priority """
+
+        return min(self.levels)
+    
+    def _new_segment(self):
+        if not self.dirname:
+            if self.spooldir and not os.path.isdir(self.spooldir):
+                os.makedirs(self.spooldir)
+            self.dirname = tempfile.mkdtemp(prefix='frontier', dir=self.spooldir)
+
+        fname = os.path.join(self.dirname, 'segment%d' % self._segidx.next())
+        return HarvestManFrontierSegment(fname)
+        
+    def push(self, item):
+        """ Append an item to the segment chain of its priority """
+
+        segs = self.levels.get(item[0])
+        if segs is None:
+            segs = self.levels[item[0]] = deque()
+            
+        if not segs or not segs[-1].writable() or segs[-1].size >= self.segsize:
+            segs.append(self._new_segment())
+
+        if self.dumpfunc:
+            segs[-1].append(self.dumpfunc(item))
+        else:
+            segs[-1].append(item)
+        self.count += 1
+
+    def pop(self, n):
+        """ Remove and return upto n items, lowest
+        priorities first """
+
+        items = []
+        load = self.loadfunc
+        
+        while n>0 and self.levels:
+            prio = min(self.levels)
+            segs = self.levels[prio]
+            seg = segs[0]
+            
+            while n>0 and seg.nread < seg.size:
+                rec = seg.read()
+                if load: rec = load(rec)
+                items.append(rec)
+                n -= 1
+                self.count -= 1
+
+            if seg.nread == seg.size:
+                seg.remove()
+                segs.popleft()
+                if not segs:
+                    del self.levels[prio]
+
+        return items
+
+    def get_items(self):
+        """ Return a list of the spilled items, in priority
+        order, without removing them """
+
+        items = []
+        load = self.loadfunc
+        
+        for prio in sorted(self.levels.keys()):
+            for seg in self.levels[prio]:
+                if load:
+                    items.extend([load(rec) for rec in seg.records()])
+                else:
+                    items.extend(seg.records())
+
+        return items
+
+    def clear(self):
+        """ Remove all spilled items """
+
+        for segs in self.levels.values():
+            for seg in segs:
+                seg.remove()
+
+        self.levels = {}
+        self.count = 0
+        
+        if self.dirname:
+            try:
+                os.rmdir(self.dirname)
+            except OSError:
+                pass
+            self.dirname = ''
+
+class HarvestManFrontierSegment(object):
+    """ An append-only file of pickled records. The segment
+    is closed for writing once reading from it starts """
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Number of records written & read
+        self.size = 0
+        self.nread = 0
+        self.writer = open(filename, 'wb')
+        self.reader = None
+
+    def writable(self):
+        return self.writer is not None
+    
+    def append(self, rec):
+        cPickle.dump(rec, self.writer, pickle.HIGHEST_PROTOCOL)
+        self.size += 1
+
+    def read(self):
+        if self.reader is None:
+            self.writer.close()
+            self.writer = None
+            self.reader = open(self.filename, 'rb')
+
+        self.nread += 1
+        return cPickle.load(self.reader)
+
+    def records(self):
+        """ Return the unread records, without consuming them """
+
+        if self.writer:
+            self.writer.flush()
+
+        f = open(self.filename, 'rb')
+        try:
+            recs = [cPickle.load(f) for x in range(self.size)]
+        finally:
+            f.close()
+
+        return recs[self.nread:]
+    
+    def remove(self):
+        for f in (self.writer, self.reader):
+            if f: f.close()
+        self.writer = self.reader = None
+        
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+        
+class HarvestManFrontier(Queue):
+    """ Thread-safe priority queue based on the heapq module.
+    Items are tuples whose first element is the priority. Lower
+    priorities are popped first, ties are broken in FIFO order """
+
+    def __init__(self, maxsize=0, memory=0, spooldir=None, dumpfunc=None, loadfunc=None):
+        # Maximum number of items kept in memory, the rest
+        # are spilled to disk. Zero means no limit.
+        self.memory = memory
+        self.spill = None
+        if memory:
+            self.spill = HarvestManFrontierSpill(spooldir, dumpfunc, loadfunc)
+        # Flag which is set when the queue is shut down
+        self.closed = False
+        # Count of interrupts of waiting getters
+        self.interrupts = 0
+        Queue.__init__(self, maxsize)
+
+    def _init(self, maxsize):
+        self.maxsize = maxsize
+        # Heap of (priority, sequence, item) entries
+        self.queue = []
+        self._seq = itertools.count()
+
+    def _entry(self, item):
+        return (item[0], self._seq.next(), item)
+
+    def _put(self, item):
+        spill = self.spill
+        # Items of a priority which has spilled items go to
+        # disk too, so that FIFO order is kept for the priority
+        if spill is not None and (self._memsize() >= self.memory or spill.has_priority(item[0])):
+            spill.push(item)
+        else:
+            self._push(item)
+
+    def _push(self, item):
+        heapq.heappush(self.queue, self._entry(item))
+
+    def _put_many(self, items):
+        # Put a list of items, those which go to memory
+        # are added in one step
+        spill = self.spill
+        if spill is None:
+            self._push_many(items)
+            return
+
+        size = self._memsize()
+        batch = []
+        for item in items:
+            if size >= self.memory or spill.has_priority(item[0]):
+                spill.push(item)
+            else:
+                batch.append(item)
+                size += 1
+
+        self._push_many(batch)
+            
+    def _push_many(self, items):
+        heap_extend(self.queue, [self._entry(item) for item in items])
+        
+    def _get(self):
+        self._page_in()
+        return heapq.heappop(self.queue)[-1]
+
+    def _get_ready(self, now):
+        # Return the next item or None if the
+        # queue is empty
+        if self._qsize():
+            return self._get()
+
+    def _wait_time(self, now):
+        # Time after which an item can become
+        # available without a put, if any
+        return None
+
+    def _page_in(self):
+        # Move spilled items to memory, when memory is half
+        # empty or when a spilled item comes before the items
+        # in memory.
+        spill = self.spill
+        if not spill:
+            return
+
+        size = self._memsize()
+        n = self.memory - size
+        head = self._head_priority()
+        before = (head is not None and spill.min_priority() < head)
+        
+        if n <= 0:
+            if not before: return
+            n = 1
+        elif size > self.memory/2 and not before:
+            return
+
+        for item in spill.pop(n):
+            self._push(item)
+
+    def _memsize(self):
+        return len(self.queue)
+
+    def _head_priority(self):
+        if self.queue:
+            return self.queue[0][0]
+
+    def _entries(self):
+        return self.queue
+    
+    def __len__(self):
+        return self._qsize()
+
+    def _qsize(self):
+        if self.spill:
+            return self._memsize() + len(self.spill)
+        
+        return self._memsize()
+
+    def _empty(self):
+        return not self._qsize()
+
+    def _full(self):
+        return self.maxsize>0 and self._qsize() == self.maxsize
+
+    def get(self, block=True, timeout=None):
+        """ Remove and return an item from the queue. If no item
+        is available, wait till one is available, till the timeout
+        expires, till the queue is shut down or till the getters
+        are interrupted, when Empty is raised """
+        
+        self.not_empty.acquire()
+        try:
+            if timeout is not None:
+                endtime = time.time() + timeout
+
+            interrupts = self.interrupts
+            while True:
+                if self.closed:
+                    raise Empty
+                
+                now = time.time()
+                item = self._get_ready(now)
+                if item is not None:
+                    break
+                if not block or self.interrupts != interrupts:
+                    raise Empty
+                
+                wait = self._wait_time(now)
+                if timeout is not None:
+                    remaining = endtime - now
+                    if remaining <= 0.0:
+                        raise Empty
+                    if wait is None or wait > remaining:
+                        wait = remaining
+                        
+                self.not_empty.wait(wait)
+
+            self.not_full.notify()
+            return item
+        finally:
+            self.not_empty.release()
+
+    def put(self, item, block=True, timeout=None):
+        """ Put an item into the queue. If the queue is full, wait
+        till a slot is free, till the timeout expires or till the
+        queue is shut down, when Full is raised """
+
+        self.not_full.acquire()
+        try:
+            if self.maxsize > 0:
+                if timeout is not None:
+                    endtime = time.time() + timeout
+                    
+                while self._qsize() >= self.maxsize:
+                    if self.closed or not block:
+                        raise Full
+                    if timeout is None:
+                        self.not_full.wait()
+                    else:
+                        remaining = endtime - time.time()
+                        if remaining <= 0.0:
+                            raise Full
+                        self.not_full.wait(remaining)
+                        
+            if self.closed:
+                raise Full
+            
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        finally:
+            self.not_full.release()
+
+    def push_many(self, items, block=True, timeout=None):
+        """ Put a list of items into the queue, taking the lock
+        once. If the queue is bounded, as many items as there is
+        room for are put at a time, waiting for slots to free up
+        as in put. Returns the number of items put, which is less
+        than the number of items if the timeout expires or if the
+        queue is shut down """
+
+        items = list(items)
+        count = 0
+        
+        self.not_full.acquire()
+        try:
+            if timeout is not None:
+                endtime = time.time() + timeout
+                
+            while count < len(items):
+                if self.closed:
+                    break
+                
+                if self.maxsize > 0:
+                    room = self.maxsize - self._qsize()
+                    if room <= 0:
+                        if not block:
+                            break
+                        if timeout is None:
+                            self.not_full.wait()
+                        else:
+                            remaining = endtime - time.time()
+                            if remaining <= 0.0:
+                                break
+                            self.not_full.wait(remaining)
+                        continue
+                    batch = items[count:count+room]
+                else:
+                    batch = items[count:]
+
+                self._put_many(batch)
+                count += len(batch)
+                self.unfinished_tasks += len(batch)
+                self.not_empty.notifyAll()
+        finally:
+            self.not_full.release()
+
+        return count
+    
+    def interrupt(self):
+        """ Wake up all threads waiting to get items. Those
+        for which no item is available raise Empty """
+
+        self.mutex.acquire()
+        try:
+            self.interrupts += 1
+            self.not_empty.notifyAll()
+        finally:
+            self.mutex.release()
+            
+    def shutdown(self):
+        """ Shut down the queue, waking up all threads waiting
+        to get or put items. All gets and puts fail after this """
+
+        self.mutex.acquire()
+        try:
+            self.closed = True
+            self.not_empty.notifyAll()
+            self.not_full.notifyAll()
+        finally:
+            self.mutex.release()
+            
+    def close(self):
+        """ Remove any items spilled to disk """
+
+        self.mutex.acquire()
+        try:
+            if self.spill is not None: self.spill.clear()
+        finally:
+            self.mutex.release()
+            
+    def get_items(self):
+        """ Return a list of the items in the queue, in
+        the order in which they would be popped """
+
+        self.mutex.acquire()
+        try:
+            items = [entry[-1] for entry in sorted(self._entries())]
+            if self.spill:
+                # Spilled items come after items of the
+                # same priority in memory.
+                items.extend(self.spill.get_items())
+                items.sort(key=lambda item: item[0])
+
+            return items
+        finally:
+            self.mutex.release()
+
+    def set_items(self, items):
+        """ Replace the contents of the queue with the given
+        items. The items are taken to be in pop order, which
+        is the format returned by get_items and also the
+        format of the older sorted queues """
+
+        self.mutex.acquire()
+        try:
+            if self.spill is not None: self.spill.clear()
+            self._init(self.maxsize)
+            for item in items:
+                self._put(item)
+        finally:
+            self.mutex.release()
+
+def parse_host_delays(dstr):
+    """ Generate a dictionary of per-host delays from the
+    host delay string """
+
+    # Host delay string is of the form...
+    # host1=delay1,host2=delay2 etc...
+    # where delay is the time gap in seconds.
+    d = {}
+    
+    for s in dstr.split(','):
+        if s.find('=') == -1: continue
+        key, val = s.split('=', 1)
+        try:
+            d[key.strip().lower()] = float(val)
+        except ValueError:
+            continue
+
+    return d
+
+class HarvestManHost(object):
+    """ Scheduling record for a single host in the frontier """
+
+    def __init__(self, name, delay):
+        self.name = name
+        # Heap of (priority, sequence, item) entries
+        self.queue = []
+        # Configured minimum time gap between fetches
+        self.delay = delay
+        # Moving average of the response time
+        self.fetchtime = 0.0
+        # Time at which this host can be fetched from next
+        self.nextfetch = 0.0
+        # Flag which is set when the host is in the
+        # waiting heap of the frontier
+        self.waiting = False
+
+class HarvestManHostFrontier(HarvestManFrontier):
+    """ Priority queue which keeps a sub-queue per host and
+    hands out items only for hosts whose politeness delay has
+    expired. Among the ready hosts, the item with the lowest
+    priority is popped first, in FIFO order for ties """
+
+    def __init__(self, maxsize=0, hostfunc=None, delay=0.0, randomize=False,
+                 adaptive=False, factor=2.0, maxdelay=30.0, hostdelays={},
+                 namefunc=None, **kwargs):
+        # Function returning the host of an item, by default
+        # items are (priority, urlobject) tuples.
+        self.hostfunc = hostfunc or (lambda item: item[1].get_domain_with_port())
+        # Function returning the name of a host returned by
+        # hostfunc, for looking up its configured delay. By
+        # default hosts are their names.
+        self.namefunc = namefunc or (lambda host: host)
+        # Default time gap between fetches from a host
+        self.delay = delay
+        # Vary the time gap randomly between 0.5 and 1.5
+        # times its value
+        self.randomize = randomize
+        # If adaptive is set, the time gap is also at least
+        # factor times the average response time of the host,
+        # upto a maximum of maxdelay.
+        self.adaptive = adaptive
+        self.factor = factor
+        self.maxdelay = maxdelay
+        # Configured delays for specific hosts
+        self.hostdelays = hostdelays
+        HarvestManFrontier.__init__(self, maxsize, **kwargs)
+
+    def _init(self, maxsize):
+        HarvestManFrontier._init(self, maxsize)
+        # Dictionary of host name => host record
+        self.hosts = {}
+        # Heap of (priority, sequence, host) entries of hosts
+        # which can be fetched from now. Entries are checked
+        # against the head of the host queue when popped.
+        self.ready = []
+        # Heap of (time, sequence, host) entries of hosts which
+        # are waiting for their delay to expire.
+        self.waiting = []
+        # Number of items in memory
+        self.count = 0
+
+    def _memsize(self):
+        return self.count
+
+    def _head_priority(self):
+        if self.ready:
+            return self.ready[0][0]
+
+    def _entries(self):
+        entries = []
+        for host in self.hosts.values():
+            entries.extend(host.queue)
+
+        return entries
+
+    def get_host_delay(self, name):
+        """ Return the configured delay for the given host """
+
+        d = self.hostdelays
+        if d:
+            if name in d:
+                return d[name]
+            # Look up parent domains, without the port
+            parts = name.split(':')[0].split('.')
+            for x in range(len(parts)-1):
+                key = '.'.join(parts[x:])
+                if key in d:
+                    return d[key]
+
+        return self.delay
+
+    def get_host(self, name):
+        """ Return the record for the given host, creating
+        it if required """
+
+        host = self.hosts.get(name)
+        if host is None:
+            host = HarvestManHost(name, self.get_host_delay(self.namefunc(name)))
+            self.hosts[name] = host
+
+        return host
+
+    def get_delay(self, host):
+        """ Return the time gap to apply before the next
+        fetch from the given host """
+
+        delay = host.delay
+        if self.adaptive and host.fetchtime:
+            delay = max(delay, min(self.factor*host.fetchtime, self.maxdelay))
+        if self.randomize:
+            delay *= random.uniform(0.5, 1.5)
+
+        return delay
+
+    def _schedule(self, host, now):
+        # Put a host with queued items in the ready
+        # or waiting heap
+        head = host.queue[0]
+        if host.nextfetch <= now:
+            host.waiting = False
+            heapq.heappush(self.ready, (head[0], head[1], host))
+        else:
+            host.waiting = True
+            heapq.heappush(self.waiting, (host.nextfetch, head[1], host))
+        
+    def _push(self, item):
+        host = self.get_host(self.hostfunc(item))
+        entry = self._entry(item)
+        q = host.queue
+        
+        if not q:
+            q.append(entry)
+            self._schedule(host, time.time())
+        else:
+            newhead = (entry < q[0])
+            heapq.heappush(q, entry)
+            if newhead and not host.waiting:
+                heapq.heappush(self.ready, (entry[0], entry[1], host))
+                
+        self.count += 1
+
+    def _push_many(self, items):
+        # Group the entries by host and add them to each host
+        # queue in one step
+        batches = {}
+        for item in items:
+            host = self.get_host(self.hostfunc(item))
+            entries = batches.get(host)
+            if entries is None:
+                entries = batches[host] = []
+            entries.append(self._entry(item))
+
+        now = time.time()
+        for host, entries in batches.iteritems():
+            q = host.queue
+            head = q and q[0]
+            heap_extend(q, entries)
+            if not head:
+                self._schedule(host, now)
+            elif q[0] is not head and not host.waiting:
+                heapq.heappush(self.ready, (q[0][0], q[0][1], host))
+                
+        self.count += len(items)
+        
+    def _get_ready(self, now):
+        # Return the next item from the ready hosts
+        # or None if no host is ready
+        self._page_in()
+        
+        waiting = self.waiting
+        while waiting and waiting[0][0] <= now:
+            t, seq, host = heapq.heappop(waiting)
+            if not host.waiting or not host.queue:
+                continue
+            if host.nextfetch > now:
+                # Delay got extended after a fetch
+                heapq.heappush(waiting, (host.nextfetch, seq, host))
+                continue
+            self._schedule(host, now)
+
+        ready = self.ready
+        while ready:
+            prio, seq, host = heapq.heappop(ready)
+            q = host.queue
+            # Skip stale entries
+            if host.waiting or not q or q[0][1] != seq:
+                continue
+            
+            item = heapq.heappop(q)[-1]
+            self.count -= 1
+            host.nextfetch = now + self.get_delay(host)
+            if q:
+                self._schedule(host, now)
+                
+            return item
+
+        return None
+
+    def _wait_time(self, now):
+        # Time till the next waiting host becomes ready
+        if self.waiting:
+            return max(self.waiting[0][0] - now, 0.0)
+
+        return None
+
+    def get_wait_time(self):
+        """ Return the time in seconds until a host with
+        queued items will become ready, zero if one is ready
+        now or if the queue is empty """
+
+        self.mutex.acquire()
+        try:
+            if self.ready or not self.waiting:
+                return 0.0
+            return self._wait_time(time.time())
+        finally:
+            self.mutex.release()
+        
+    def record_fetch(self, name, fetchtime):
+        """ Record the response time of a fetch from the
+        given host. This restarts the time gap of the host
+        from the end of the fetch and adapts it to the
+        response time, if adaptive delays are enabled """
+
+        self.mutex.acquire()
+        try:
+            host = self.get_host(name)
+            if host.fetchtime:
+                host.fetchtime = 0.7*host.fetchtime + 0.3*fetchtime
+            else:
+                host.fetchtime = fetchtime
+
+            nextfetch = time.time() + self.get_delay(host)
+            if nextfetch > host.nextfetch:
+                host.nextfetch = nextfetch
+        finally:
+            self.mutex.release()
@@ -20,6 +20,8 @@ import urlqueue
 import connector
 import rules
 import datamgr
+import journal
+import parsepool
 import utils
 import time
 import threading
@@ -75,6 +77,8 @@ class HarvestMan(object):
                 browser = utils.HarvestManBrowser()
                 browser.make_project_browse_page()
 
+        dmgr.close_url_db()
+
     def finalize(self):
         """ This function can be called at program exit or
         when handling signals to clean up """
@@ -85,7 +89,11 @@ class HarvestMan(object):
         # remove it.
         if self._cfg.runfile:
             try:
-                os.remove(self._cfg.runfile)
+                if os.path.isdir(self._cfg.runfile):
+                    # Journal of a crawl
+                    shutil.rmtree(self._cfg.runfile)
+                else:
+                    os.remove(self._cfg.runfile)
             except OSError, e:
                 moreinfo('Error removing runfile %s.' % self._cfg.runfile)
 
@@ -114,6 +122,15 @@ class HarvestMan(object):
         if not self._cfg.savesessions:
             extrainfo('Session save feature is disabled.')
             return
+
+        # If the state is journalled, writing the pending
+        # records of the journal saves the state
+        j = GetObject('journal')
+        if j and not j.closed:
+            moreinfo('Saving run-state to journal %s...' % j.dirname)
+            j.close()
+            moreinfo('Saved run-state to journal %s.' % j.dirname)
+            return
         
         # Top-level state dictionary
         state = {}
@@ -212,6 +229,9 @@ class HarvestMan(object):
 
         tracker_queue = GetObject('trackerqueue')
 
+        self.open_parser_pool()
+        self.open_journal()
+        
         if not self._cfg.resuming:
             # Configure tracker manager for this project
             if tracker_queue.configure():
@@ -220,6 +240,60 @@ class HarvestMan(object):
         else:
             tracker_queue.restart()
 
+        # Crawl is complete, so the journal is not needed
+        j = GetObject('journal')
+        if j: j.close(remove=True)
+
+        pool = GetObject('parserpool')
+        if pool: pool.close()
+
+    def open_parser_pool(self):
+        """ Start worker processes for parsing web pages, if
+        enabled """
+
+        cfg = self._cfg
+        if not cfg.parseworkers or not cfg.fastmode:
+            return
+
+        try:
+            pool = parsepool.HarvestManParserPool(cfg.parseworkers, cfg.parsewindow)
+        except (ImportError, OSError), e:
+            logconsole(e)
+            moreinfo('Could not start parser processes, web pages will be parsed by fetchers')
+            return
+
+        SetObject(pool)
+        extrainfo('Parsing web pages in %d processes' % cfg.parseworkers)
+
+    def open_journal(self):
+        """ Open a journal for saving the state of the current
+        project incrementally, if enabled """
+
+        cfg = self._cfg
+        if not cfg.savesessions or not cfg.checkpointinterval or not cfg.fastmode:
+            return
+
+        dirname = os.path.join(cfg.usersessiondir, '.harvestman_journal#' + str(int(time.time())))
+        j = journal.HarvestManJournal(dirname, cfg.checkpointinterval, cfg.checkpointcompact)
+
+        # When resuming, the replayed state of the previous
+        # journal is the starting snapshot
+        state = getattr(self, '_journalstate', None)
+        self._journalstate = None
+        
+        try:
+            j.open(state)
+        except (OSError, IOError), e:
+            logconsole(e)
+            moreinfo('Could not open journal, run-state will be saved at exit only')
+            return
+        
+        if state is None:
+            j.log('config', cfg.copy())
+            
+        SetObject(j)
+        extrainfo('Journalling run-state to %s' % dirname)
+
     def clean_up(self):
         """ Clean up actions to do, say after
         an interrupt """
@@ -232,6 +306,9 @@ class HarvestMan(object):
             tq = GetObject('trackerqueue')
             tq.terminate_threads()
 
+            pool = GetObject('parserpool')
+            if pool: pool.terminate()
+
     def calculate_bandwidth(self):
         """ Calculate bandwidth. This also sets limit on
         maximum file size """
@@ -466,7 +543,13 @@ class HarvestMan(object):
         """ Restore state of some objects from a previous run """
 
         try:
-            state = cPickle.load(open(state_file, 'rb'))
+            if os.path.isdir(state_file):
+                # Replay the journal of the crawl
+                jstate = journal.load_journal(state_file)
+                state = journal.make_state(jstate)
+                self._journalstate = jstate
+            else:
+                state = cPickle.load(open(state_file, 'rb'))
             # This has six keys - configobj, threadpool, ruleschecker,
             # datamanager, common and trackerqueue.
 
@@ -535,10 +618,12 @@ class HarvestMan(object):
         sessions_dir = self._cfg.usersessiondir
 
         files = glob.glob(os.path.join(sessions_dir, '.harvestman_saves#*'))
-
+        # Journals of crawls
+        files.extend(glob.glob(os.path.join(sessions_dir, '.harvestman_journal#*')))
+        
         # Get the last dumped file
         if files:
-            runfile = max(files)
+            runfile = max(files, key=lambda f: f.split('#')[-1])
             res = raw_input('Found HarvestMan save file %s. Do you want to re-run it ? [y/n]' % runfile)
             if res.lower()=='y':
                 if self.restore_state(runfile)==0:
@@ -0,0 +1,165 @@
+# -- coding: latin-1
+""" hosts.py - Module providing the table of hosts (servers)
+    seen in a crawl. This is part of the HarvestMan program.
+
+    Each (protocol, domain, port) is given a small integer id
+    the first time it is seen, along with a record which keeps
+    what the rules checker, url queue and data manager know
+    about the host. These look up the record of a url through
+    its url object instead of building, comparing and hashing
+    domain strings for every url.
+
+    The table is shared by all projects of a process, like
+    the other registered objects.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import md5
+import threading
+
+# Default ports of protocols
+default_ports = { 'http://' : 80,
+                  'https://' : 443,
+                  'ftp://' : 21 }
+
+class HarvestManHostRecord(object):
+    """ Information about a single host """
+
+    __slots__ = ('id', 'protocol', 'domain', 'port', 'name', 'domainhash',
+                 'robotsread', 'robots', 'acceptranges', 'baseid', 'external',
+                 'extindex', 'fetches', 'fetchtime')
+
+    def __init__(self, hostid, protocol, domain, port):
+        self.id = hostid
+        self.protocol = protocol
+        self.domain = domain
+        self.port = port
+        # Domain with the port, if it is not the default
+        # port of the protocol
+        if port != default_ports.get(protocol, port):
+            self.name = '%s:%s' % (domain, port)
+        else:
+            self.name = domain
+        # Hash of the protocol and domain
+        self.domainhash = md5.new(protocol + domain).hexdigest()
+        self.reset()
+
+    def reset(self):
+        """ Reset the information about the host """
+
+        # Flag set when robots.txt of the host was read,
+        # robots is the robots.txt parser or None if the
+        # host has no robots.txt
+        self.robotsread = False
+        self.robots = None
+        # Whether the host accepts range requests,
+        # 0 if not known
+        self.acceptranges = 0
+        # Whether the host is a server other than that
+        # of the starting url, whose host id is baseid
+        self.baseid = -1
+        self.external = False
+        # Index of the host in the external servers
+        # of the rules checker, -1 if not counted yet
+        self.extindex = -1
+        # Number of fetches and their total time
+        self.fetches = 0
+        self.fetchtime = 0.0
+
+    def get_full_domain(self):
+        return self.protocol + self.domain
+
+class HarvestManHostTable(object):
+    """ Table of host records indexed by host id """
+
+    def __init__(self):
+        # Dictionary of (protocol, domain, port) => record
+        self._keys = {}
+        # List of records, the index is the host id
+        self._hosts = []
+        # Server information of a saved state, for
+        # the hosts which are not in the table yet
+        self._servers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hosts)
+
+    def __iter__(self):
+        return iter(self._hosts[:])
+
+    def get_host(self, protocol, domain, port):
+        """ Return the record of the given host, adding
+        it to the table if it is not there """
+
+        key = (protocol, domain, port)
+        try:
+            return self._keys[key]
+        except KeyError:
+            pass
+
+        self._lock.acquire()
+        try:
+            host = self._keys.get(key)
+            if host is None:
+                host = HarvestManHostRecord(len(self._hosts), protocol, domain, port)
+                if self._servers:
+                    self._set_server_info(host)
+                self._hosts.append(host)
+                self._keys[key] = host
+            return host
+        finally:
+            self._lock.release()
+
+    def get_host_by_id(self, hostid):
+        """ Return the record of the host with the given id """
+
+        return self._hosts[hostid]
+
+    def get_server_dictionary(self):
+        """ Return a dictionary of full domain => server
+        information, for the hosts which accept range requests """
+
+        d = self._servers.copy()
+        for host in self:
+            if host.acceptranges:
+                d[host.get_full_domain()] = {'accept-ranges': host.acceptranges}
+
+        return d
+
+    def set_server_dictionary(self, d):
+        """ Set the server information of the hosts from
+        a dictionary returned by get_server_dictionary """
+
+        self._servers = d.copy()
+        for host in self:
+            self._set_server_info(host)
+
+    def _set_server_info(self, host):
+        info = self._servers.get(host.get_full_domain())
+        if info:
+            host.acceptranges = info.get('accept-ranges', 0)
+
+    def reset(self):
+        """ Reset the information about all hosts, the
+        host ids are kept """
+
+        self._servers = {}
+        for host in self:
+            host.reset()
+
+# Single instance of the host table
+hosttable = HarvestManHostTable()
+
+def get_host(protocol, domain, port):
+    return hosttable.get_host(protocol, domain, port)
+
+def get_host_by_id(hostid):
+    return hosttable.get_host_by_id(hostid)
@@ -0,0 +1,587 @@
+# -- coding: latin-1
+""" journal.py - Module providing incremental checkpointing
+    of crawl state. This is part of the HarvestMan program.
+
+    Instead of taking a snapshot of the whole state of the
+    crawler when a session is saved, the changes to the state
+    are written to an append-only journal as they happen,
+    i.e the items pushed to and processed from the queues,
+    the urls seen, and the files downloaded. Records are
+    pickled by the thread which makes the change and written
+    to disk periodically by a background thread.
+
+    The journal is a directory with a snapshot file, an archive
+    file and a number of segment files. When a segment grows
+    beyond a certain number of records, it is sealed and folded
+    by the background thread. Records of the urls, links and
+    files of the crawl are appended to the archive, and the
+    queues and counters are written to the snapshot, so the
+    work of a compaction does not grow with the crawl. Url
+    objects are saved once, with their base url object as its
+    index, and are referred to by index in the other records.
+    A session is resumed by replaying the segments over the
+    snapshot and reading the archive into the url store and
+    the seen set of the crawl.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import os
+import glob
+import time
+import shutil
+import threading
+import cPickle, pickle
+
+import ledger
+import seenset
+import urlstore
+
+from common.common import *
+
+# Name of the snapshot file in the journal directory
+SNAPSHOT = 'snapshot'
+# Name of the archive file in the journal directory
+ARCHIVE = 'archive'
+# Prefix of the segment files in the journal directory
+SEGMENT = 'segment'
+
+# Records which are kept in the archive when segments are
+# compacted, the others only change the snapshot
+ARCHIVED = ('url', 'link', 'done', 'saved', 'failed', 'deleted', 'collection')
+
+def new_state():
+    """ Return an empty journal state """
+
+    # Items in the url queue are keyed on the index of their
+    # url, with values (sequence, priority, generation). Those
+    # in the data queue are keyed on the journal id of their
+    # collection, with values (sequence, item). Sequences put
+    # the items back in the order they were pushed.
+    return { 'config' : None,
+             'baseurl' : None,
+             'url_q' : {},
+             'data_q' : {},
+             'seq' : 0,
+             'inflight' : {},
+             'counters' : {},
+             # Size of the archive and number of the last
+             # segment which are in the snapshot
+             'archivesize' : 0,
+             'segment' : -1,
+             'dirname' : '' }
+
+def fold(state, rec):
+    """ Apply a journal record to a journal state. Records
+    of the archive only change the urls in flight """
+
+    op = rec[0]
+
+    if op == 'push':
+        qname, seq, item = rec[1:]
+        if qname == 'url_q':
+            prio, index, generation = item
+            state['url_q'][index] = (seq, prio, generation)
+        else:
+            state['data_q'][item[1].getId()] = (seq, item)
+        state['seq'] = max(state['seq'], seq + 1)
+    elif op == 'pop':
+        try:
+            del state[rec[1]][rec[2]]
+        except KeyError:
+            pass
+    elif op == 'done':
+        # Until it is saved or fails
+        state['inflight'][rec[2]] = 1
+    elif op == 'saved' or op == 'failed':
+        state['inflight'].pop(rec[1], None)
+    elif op == 'counters':
+        state['counters'].update(rec[1])
+    elif op == 'config':
+        state['config'] = rec[1]
+    elif op == 'base':
+        state['baseurl'] = rec[1]
+
+def read_records(filename, size=-1):
+    """ Generator yielding the records in a journal file, or
+    in its first size bytes if size is not negative. A partly
+    written record at the end of the file is skipped """
+
+    f = open(filename, 'rb')
+    try:
+        while size < 0 or f.tell() < size:
+            try:
+                yield cPickle.load(f)
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, cPickle.UnpicklingError, ValueError,
+                    AttributeError, IndexError), e:
+                # Truncated at a crash
+                debug('Error reading journal %s: %s' % (filename, e))
+                break
+    finally:
+        f.close()
+
+def get_segments(dirname, after=-1):
+    """ Return the numbers and files of the segments of the
+    journal in the given directory which come after the given
+    segment number, in the order they were written """
+
+    segs = []
+    for fname in glob.glob(os.path.join(dirname, SEGMENT + '*')):
+        try:
+            num = int(os.path.basename(fname)[len(SEGMENT):])
+        except ValueError:
+            continue
+        if num > after:
+            segs.append((num, fname))
+
+    segs.sort()
+    return segs
+
+def load_snapshot(dirname):
+    """ Return the journal state in the snapshot of the
+    journal in the given directory, or an empty state if
+    there is no snapshot """
+
+    snapshot = os.path.join(dirname, SNAPSHOT)
+    if os.path.isfile(snapshot):
+        state = cPickle.load(open(snapshot, 'rb'))
+    else:
+        state = new_state()
+    state['dirname'] = dirname
+    return state
+
+def load_journal(dirname):
+    """ Replay the segments of the journal in the given directory
+    over its snapshot and return the journal state. Records of
+    the archive are read by make_state """
+
+    state = load_snapshot(dirname)
+    for num, fname in get_segments(dirname, state['segment']):
+        for rec in read_records(fname):
+            fold(state, rec)
+
+    return state
+
+def read_archive(state):
+    """ Generator yielding the records of the archive of the
+    journal of the given state, followed by those of its
+    segments which go to the archive """
+
+    dirname = state['dirname']
+    archive = os.path.join(dirname, ARCHIVE)
+    if state['archivesize'] and os.path.isfile(archive):
+        for rec in read_records(archive, state['archivesize']):
+            yield rec
+    for num, fname in get_segments(dirname, state['segment']):
+        for rec in read_records(fname):
+            if rec[0] in ARCHIVED:
+                yield rec
+
+def make_state(state):
+    """ Convert a journal state to the state dictionaries of
+    the crawler objects, as saved by the session saver. The
+    url objects are added to a url store and the urls seen
+    to a seen set, which keep at most the configured number
+    of them in memory """
+
+    cfg = state['config'] or {}
+    urls = urlstore.HarvestManUrlStore()
+    urls.open(os.path.join(cfg.get('projdir', ''), 'urls.db'), cfg.get('urlmemory', 0))
+    links = seenset.HarvestManSeenSet(cfg.get('seenmemory', 64), GetMyTempDir())
+    dledger = ledger.HarvestManDownloadLedger()
+
+    # Urls which are queued or were being downloaded when the
+    # crawl stopped are not done yet, and their files are written
+    # again if they were being downloaded.
+    pending = state['url_q'].copy()
+    pending.update(state['inflight'])
+    failed = {}
+    urlindex = 0
+    
+    for rec in read_archive(state):
+        op = rec[0]
+        if op == 'url':
+            index = rec[1]
+            urlobj = urlstore.make_url(rec[2], urls)
+            urls.add(urlobj)
+            dledger.mark_queued(urlobj.get_full_url())
+            urlindex = max(urlindex, index)
+        elif op == 'link':
+            links.add(rec[1])
+        elif op == 'done':
+            if rec[2] not in pending:
+                dledger.mark_done(rec[1])
+        elif op == 'saved':
+            index, url, filename, status = rec[1:]
+            if index not in pending:
+                dledger.mark_saved(url, filename, status)
+            failed.pop(index, None)
+        elif op == 'failed':
+            failed[rec[1]] = 1
+        elif op == 'deleted':
+            dledger.mark_deleted(rec[1])
+        elif op == 'collection':
+            dledger.add_collection(rec[1])
+
+    for index in sorted(failed):
+        if index in urls:
+            dledger.mark_failed(urls.get(index))
+
+    base = None
+    if state['baseurl'] is not None and state['baseurl'] in urls:
+        base = urls.get(state['baseurl'])
+        base.starturl = True
+
+    # Url objects which are queued, with their priorities.
+    # Urls which were being downloaded are queued again,
+    # after those which were queued.
+    items = [(prio, seq, index, generation) for index, (seq, prio, generation) \
+             in state['url_q'].iteritems()]
+    seq = state['seq']
+    for index in sorted(state['inflight']):
+        if index in urls and index not in state['url_q']:
+            urlobj = urls.get(index)
+            items.append((urlobj.priority, seq, index, urlobj.generation))
+            seq += 1
+    items.sort()
+    url_q = []
+    for prio, seq, index, generation in items:
+        if index not in urls: continue
+        urlobj = urls.get(index)
+        urlobj.priority = prio
+        urlobj.generation = generation
+        url_q.append((prio, urlobj))
+
+    items = [(prio, seq, coll) for seq, (prio, coll) in state['data_q'].itervalues()]
+    items.sort()
+    data_q = [(prio, coll) for prio, seq, coll in items]
+
+    # Threads of the crawler queue, the base tracker is a
+    # fetcher and the rest alternate between crawlers and
+    # fetchers.
+    threadinfo = {}
+    for x in range(cfg.get('maxtrackers', 4)):
+        if x % 2 == 0:
+            role = 'fetcher'
+        else:
+            role = 'crawler'
+        threadinfo[x] = { 'role' : role, '_status' : 0, '_loops' : 0,
+                          '_url' : '', '_urlobject' : None, 'links' : [] }
+
+    counters = state['counters']
+
+    tq = { '_baseUrlObj' : base,
+           'url_q' : url_q,
+           'data_q' : data_q,
+           'threadinfo' : threadinfo,
+           '_pushes' : counters.get('_pushes', 0),
+           '_requests' : counters.get('_requests', 0) }
+
+    # Url objects created after the resume are indexed after
+    # the last url object of the journal
+    dm = { '_numfailed' : counters.get('_numfailed', 0),
+           '_ledger' : dledger,
+           '_urlstore' : urls,
+           '_urlindex' : urlindex,
+           '_serversdict' : counters.get('_serversdict', {}),
+           '_bytes' : counters.get('_bytes', 0L) }
+
+    rules = { '_links' : links }
+
+    return { 'configobj' : state['config'],
+             'trackerqueue' : tq,
+             'datamanager' : dm,
+             'ruleschecker' : rules }
+
+class HarvestManJournal(object):
+    """ Append-only journal of the changes to the state of
+    a crawl """
+
+    def __init__(self, dirname, interval=30.0, compactsize=50000):
+        # Directory of the journal
+        self.dirname = dirname
+        # Interval between writes to disk
+        self.interval = interval
+        # Number of records in a segment after which
+        # it is folded into the snapshot
+        self.compactsize = compactsize
+        # Pickled records waiting to be written
+        self._pending = []
+        # Sequence number of the next item pushed
+        # to a queue
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Current segment file
+        self._segment = None
+        self._segnum = 0
+        self._nrecords = 0
+        self._writer = None
+        # Lock for writing to disk
+        self._iolock = threading.Lock()
+        # Flag which is set when the journal is closed
+        self.closed = False
+
+    def open(self, state=None):
+        """ Open the journal for writing. If the journal state of
+        another journal is given, it is written as the initial
+        snapshot along with a copy of the archive of that journal """
+
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+
+        if state is not None:
+            self._copy_archive(state)
+            self._seq = state['seq']
+
+        segs = get_segments(self.dirname)
+        if segs:
+            self._segnum = segs[-1][0] + 1
+        self._new_segment()
+
+        if self.interval > 0:
+            self._writer = HarvestManJournalWriter(self)
+            self._writer.start()
+
+    def log(self, *rec):
+        """ Add a record to the journal """
+
+        if self.closed: return
+
+        data = cPickle.dumps(rec, pickle.HIGHEST_PROTOCOL)
+        self._lock.acquire()
+        self._pending.append(data)
+        self._lock.release()
+
+    def log_url(self, urlobj):
+        """ Add a record for a url object. Its base url object
+        is saved as its index """
+
+        if self.closed: return
+
+        self.log('url', urlobj.index, urlstore.get_url_state(urlobj))
+
+    def log_push(self, qname, item):
+        """ Add a record for an item pushed to the given queue.
+        Each item gets a sequence number, which is also the id
+        of the collection of items of the data queue, used in
+        the record of its pop. Url objects of the url queue are
+        saved as their index, with the attributes which change
+        after they are added to the data manager """
+
+        if self.closed: return
+
+        if qname == 'url_q':
+            prio, urlobj = item
+            item = (prio, urlobj.index, urlobj.generation)
+            
+        self._lock.acquire()
+        try:
+            seq = self._seq
+            self._seq += 1
+            if qname == 'data_q':
+                item[1].setId(seq)
+            self._pending.append(cPickle.dumps(('push', qname, seq, item),
+                                               pickle.HIGHEST_PROTOCOL))
+        finally:
+            self._lock.release()
+
+    def _new_segment(self):
+        fname = os.path.join(self.dirname, SEGMENT + str(self._segnum))
+        self._segment = open(fname, 'ab')
+        self._segnum += 1
+        self._nrecords = 0
+
+    def flush(self):
+        """ Write pending records to disk """
+
+        self._iolock.acquire()
+        try:
+            self.log('counters', self.get_counters())
+
+            self._lock.acquire()
+            pending, self._pending = self._pending, []
+            self._lock.release()
+
+            if self._segment is None or not pending:
+                return
+
+            self._segment.write(''.join(pending))
+            self._sync(self._segment)
+            self._nrecords += len(pending)
+        finally:
+            self._iolock.release()
+
+    def get_counters(self):
+        """ Return the counters of the crawler objects
+        which are saved in the journal """
+
+        d = {}
+        dmgr = GetObject('datamanager')
+        if dmgr:
+            d['_bytes'] = dmgr._bytes
+            d['_numfailed'] = dmgr._numfailed
+            d['_serversdict'] = dmgr.get_server_dictionary().copy()
+        tq = GetObject('trackerqueue')
+        if tq:
+            d['_pushes'] = tq._pushes
+            d['_requests'] = tq._requests
+
+        return d
+
+    def checkpoint(self):
+        """ Write pending records to disk and compact the
+        journal if the current segment is large """
+
+        self.flush()
+        if self._nrecords >= self.compactsize:
+            self.compact()
+
+    def compact(self):
+        """ Seal the current segment and fold all sealed
+        segments into the snapshot. Records of the archive
+        are appended to it, so only the queues and counters
+        of the snapshot are written again """
+
+        self._iolock.acquire()
+        try:
+            if self._segment is None: return
+
+            self._segment.close()
+            state = load_snapshot(self.dirname)
+            sealed = get_segments(self.dirname, state['segment'])
+            self._new_segment()
+        finally:
+            self._iolock.release()
+
+        # Writes go to the new segment while the sealed
+        # ones are folded.
+        archive = self._open_archive(state)
+        try:
+            for num, fname in sealed:
+                for rec in read_records(fname):
+                    fold(state, rec)
+                    if rec[0] in ARCHIVED:
+                        archive.write(cPickle.dumps(rec, pickle.HIGHEST_PROTOCOL))
+                state['segment'] = num
+            self._sync(archive)
+            state['archivesize'] = archive.tell()
+        finally:
+            archive.close()
+
+        # Segments are removed once the snapshot which
+        # has them is written, a crash before that leaves
+        # them to be folded again after the end of the
+        # archive in the old snapshot.
+        self._write_snapshot(state)
+
+        for num, fname in sealed:
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+
+        extrainfo('Compacted journal %s' % self.dirname)
+
+    def _copy_archive(self, state):
+        # Start the archive with that of the journal of
+        # the given state and the records of its segments
+        # which go to the archive
+        state = state.copy()
+        archive = self._open_archive(new_state())
+        try:
+            for rec in read_archive(state):
+                archive.write(cPickle.dumps(rec, pickle.HIGHEST_PROTOCOL))
+            self._sync(archive)
+            state['archivesize'] = archive.tell()
+        finally:
+            archive.close()
+
+        state['segment'] = -1
+        self._write_snapshot(state)
+
+    def _open_archive(self, state):
+        # Open the archive for appending after the size in
+        # the snapshot, dropping records written after it
+        fname = os.path.join(self.dirname, ARCHIVE)
+        if os.path.isfile(fname):
+            archive = open(fname, 'r+b')
+        else:
+            archive = open(fname, 'w+b')
+        archive.seek(state['archivesize'])
+        archive.truncate()
+        return archive
+
+    def _sync(self, f):
+        f.flush()
+        try:
+            os.fsync(f.fileno())
+        except (OSError, AttributeError):
+            pass
+
+    def _write_snapshot(self, state):
+        snapshot = os.path.join(self.dirname, SNAPSHOT)
+        tmpname = snapshot + '.tmp'
+        f = open(tmpname, 'wb')
+        try:
+            cPickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+
+        # Rename is not atomic on Windows if the
+        # target exists
+        if os.name == 'nt' and os.path.exists(snapshot):
+            os.remove(snapshot)
+        os.rename(tmpname, snapshot)
+
+    def close(self, remove=False):
+        """ Stop the writer, write pending records and close
+        the journal. If remove is True, the journal is deleted """
+
+        if self.closed: return
+
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+
+        if remove:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            shutil.rmtree(self.dirname, True)
+        elif self._segment is not None:
+            self.flush()
+            self._segment.close()
+            self._segment = None
+
+        self.closed = True
+
+class HarvestManJournalWriter(threading.Thread):
+    """ Thread which writes the journal to disk at
+    intervals and compacts it """
+
+    def __init__(self, journal):
+        self._journal = journal
+        self._evt = threading.Event()
+        threading.Thread.__init__(self, None, None, 'journalwriter')
+        self.setDaemon(True)
+
+    def run(self):
+        while not self._evt.isSet():
+            self._evt.wait(self._journal.interval)
+            if self._evt.isSet(): break
+            try:
+                self._journal.checkpoint()
+            except (OSError, IOError, pickle.PicklingError), e:
+                moreinfo('Error writing journal: %s' % e)
+
+    def stop(self):
+        self._evt.set()
+        self.join()
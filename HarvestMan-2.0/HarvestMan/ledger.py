@@ -0,0 +1,304 @@
+# -- coding: latin-1
+""" ledger.py - Module providing the download ledger of the
+    data manager, which keeps the state of each url of a crawl
+    and the files saved for them. This is part of the HarvestMan
+    program.
+
+    The state of a url and the reason for it are packed into a
+    single integer in a dictionary keyed on the url, so that
+    looking up or changing the state of a url takes constant
+    time however many urls have been downloaded. Urls are keyed
+    on the 64 bit fingerprint of their md5 hash which the seen
+    set of the rules checker keeps, instead of the url string,
+    since every url queued in a crawl is in the ledger. The ledger
+    also keeps the saved, deleted and failed files in order
+    and counts of urls in each state for the statistics of
+    a project.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import md5
+import struct
+import threading
+
+# States of urls
+STATE_QUEUED, STATE_DONE, STATE_SAVED, STATE_FAILED, STATE_DELETED = range(1, 6)
+
+state_names = { STATE_QUEUED : 'queued',
+                STATE_DONE : 'done',
+                STATE_SAVED : 'saved',
+                STATE_FAILED : 'failed',
+                STATE_DELETED : 'deleted' }
+
+# Reasons for the state of a url. Saved urls have the return
+# value of the save_url method of the connector as reason and
+# failed urls the error number of the url.
+REASON_NONE = 0
+REASON_FETCHED = 1
+REASON_RENAMED = 2
+REASON_UPTODATE = 3
+REASON_CACHED = 4
+REASON_RULES = 5
+REASON_FILELIMIT = 6
+
+# Bits of the packed state which hold the state, the
+# rest is the reason
+STATE_BITS = 4
+STATE_MASK = (1 << STATE_BITS) - 1
+
+def url_key(url):
+    """ Return the key of the url in the ledger, the first
+    64 bits of its md5 hash as a signed integer, which takes
+    less memory than a long """
+
+    return struct.unpack('>q', md5.new(url).digest()[:8])[0]
+
+class HarvestManDownloadLedger(object):
+    """ Ledger of the state of urls and the files downloaded
+    for them in a project """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """ Remove all urls and files from the ledger """
+
+        # Dictionary of url key => packed state and reason
+        self._urls = {}
+        # Number of urls in each state
+        self._counts = [0]*(len(state_names) + 1)
+        # Dictionaries of filename => (sequence, url key)
+        # of the saved and deleted files, and url =>
+        # (sequence, url object) of the failed urls
+        self._files = {}
+        self._deleted = {}
+        self._failed = {}
+        self._seq = 0
+        # Url collections of crawled pages
+        self._collections = []
+        # Number of files which were up to date in
+        # the repository or restored from the cache
+        self.reposfiles = 0
+        self.cachefiles = 0
+
+    def __getstate__(self):
+        # The ordered items are saved as lists, which are
+        # smaller than the dictionaries with sequences
+        return (self._urls, [(filename, item[1]) for filename, item in self._ordered(self._files)],
+                self.get_deleted_files(), self.get_failed_urls(), self._collections,
+                self.reposfiles, self.cachefiles)
+
+    def __setstate__(self, state):
+        self._lock = threading.Lock()
+        self.clear()
+        urls, files, deleted, failed, self._collections, self.reposfiles, self.cachefiles = state
+
+        for key, packed in urls.iteritems():
+            self._counts[packed & STATE_MASK] += 1
+        self._urls = urls
+        for filename, key in files:
+            self._files[filename] = (self._next(), key)
+        for filename in deleted:
+            self._deleted[filename] = (self._next(), None)
+        for urlobj in failed:
+            self._failed[urlobj.get_full_url()] = (self._next(), urlobj)
+
+    def load(self, doneurls, savedfiles, deletedfiles=(), failedurls=(),
+             collections=(), reposfiles=0, cachefiles=0):
+        """ Load the ledger from lists of urls and files, as kept in
+        the download dictionary of earlier versions of the data manager
+        and in the journal """
+
+        self.clear()
+        for url in doneurls:
+            self.mark_done(url)
+        for filename in savedfiles:
+            self._files[filename] = (self._next(), None)
+        for filename in deletedfiles:
+            self._deleted[filename] = (self._next(), None)
+        for urlobj in failedurls:
+            self.mark_failed(urlobj)
+        self._collections = list(collections)
+        self.reposfiles = reposfiles
+        self.cachefiles = cachefiles
+
+    def _next(self):
+        self._seq += 1
+        return self._seq
+
+    def _set_state(self, key, state, reason=REASON_NONE):
+        # Set the state of a url by its key, the lock
+        # must be held
+        old = self._urls.get(key)
+        if old is not None:
+            self._counts[old & STATE_MASK] -= 1
+        self._urls[key] = state | (reason << STATE_BITS)
+        self._counts[state] += 1
+
+    def get_state(self, url):
+        """ Return the state of the url, or 0 if the url
+        is not in the ledger """
+
+        return self._urls.get(url_key(url), 0) & STATE_MASK
+
+    def get_reason(self, url):
+        """ Return the reason for the state of the url """
+
+        return self._urls.get(url_key(url), 0) >> STATE_BITS
+
+    def mark_queued(self, url):
+        """ Add a url which is queued for download """
+
+        key = url_key(url)
+        self._lock.acquire()
+        try:
+            if key not in self._urls:
+                self._set_state(key, STATE_QUEUED)
+        finally:
+            self._lock.release()
+
+    def mark_done(self, url):
+        """ Mark the url as processed for download. Returns True
+        if it was not processed before """
+
+        key = url_key(url)
+        self._lock.acquire()
+        try:
+            if self._urls.get(key, STATE_QUEUED) & STATE_MASK != STATE_QUEUED:
+                return False
+            self._set_state(key, STATE_DONE)
+            return True
+        finally:
+            self._lock.release()
+
+    def is_done(self, url):
+        """ Return whether the url was processed for download """
+
+        return self._urls.get(url_key(url), STATE_QUEUED) & STATE_MASK != STATE_QUEUED
+
+    def mark_saved(self, url, filename, status):
+        """ Record the outcome of a download of the url to the
+        given file, status is the return value of the save_url
+        method of the connector """
+
+        key = url_key(url)
+        self._lock.acquire()
+        try:
+            if status == REASON_FETCHED or status == REASON_RENAMED:
+                if filename not in self._files:
+                    self._files[filename] = (self._next(), key)
+                self._deleted.pop(filename, None)
+                self._set_state(key, STATE_SAVED, status)
+            elif status == REASON_UPTODATE:
+                self.reposfiles += 1
+                self._set_state(key, STATE_SAVED, status)
+            elif status == REASON_CACHED:
+                self.cachefiles += 1
+                self._set_state(key, STATE_SAVED, status)
+            else:
+                self._set_state(key, STATE_DONE, status)
+
+            self._failed.pop(url, None)
+        finally:
+            self._lock.release()
+
+    def mark_failed(self, urlobj):
+        """ Mark the url of the url object as failed, with the
+        error number of the url as reason. Returns True if the
+        url was not in the failed urls """
+
+        url = urlobj.get_full_url()
+        self._lock.acquire()
+        try:
+            if url in self._failed:
+                return False
+            self._failed[url] = (self._next(), urlobj)
+            self._set_state(url_key(url), STATE_FAILED, urlobj.status)
+            return True
+        finally:
+            self._lock.release()
+
+    def mark_deleted(self, filename, reason=REASON_NONE):
+        """ Mark the saved file as deleted. Returns True if the
+        file was in the saved files """
+
+        self._lock.acquire()
+        try:
+            item = self._files.pop(filename, None)
+            if item is None:
+                return False
+            self._deleted[filename] = (self._next(), item[1])
+            if item[1] is not None:
+                self._set_state(item[1], STATE_DELETED, reason)
+            return True
+        finally:
+            self._lock.release()
+
+    def is_file_saved(self, filename):
+        """ Return whether the file was saved """
+
+        return filename in self._files
+
+    def _ordered(self, d):
+        items = d.items()
+        items.sort(key=lambda item: item[1][0])
+        return items
+
+    def get_saved_files(self):
+        """ Return the saved files in the order in which
+        they were saved """
+
+        return [filename for filename, item in self._ordered(self._files)]
+
+    def get_deleted_files(self):
+        """ Return the deleted files in the order in
+        which they were deleted """
+
+        return [filename for filename, item in self._ordered(self._deleted)]
+
+    def get_failed_urls(self):
+        """ Return the url objects of failed urls in the
+        order in which they failed """
+
+        return [item[1] for url, item in self._ordered(self._failed)]
+
+    def add_collection(self, collection):
+        """ Add the url collection of a crawled page """
+
+        self._collections.append(collection)
+
+    def get_collections(self):
+        """ Return the url collections of crawled pages """
+
+        return self._collections
+
+    def num_saved(self):
+        return len(self._files)
+
+    def num_failed(self):
+        return len(self._failed)
+
+    def get_counts(self):
+        """ Return a dictionary of the number of urls in
+        each state and of the files saved """
+
+        d = {}
+        for state, name in state_names.items():
+            d[name] = self._counts[state]
+        d['files'] = len(self._files)
+        d['deletedfiles'] = len(self._deleted)
+        d['filesinrepos'] = self.reposfiles
+        d['filesincache'] = self.cachefiles
+
+        return d
+
+    def __len__(self):
+        return len(self._urls)
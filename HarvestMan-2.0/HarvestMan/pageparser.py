@@ -35,7 +35,8 @@
 __version__ = '2.0 b1'
 __author__ = 'Anand B Pillai'
 
-from sgmllib import SGMLParser
+import sgmllib
+from sgmllib import SGMLParser, SGMLParseError
 from urltypes import *
 from common.jsparser import JSParser
 from common.common import *
@@ -87,6 +88,8 @@ class HarvestManSimpleParser(SGMLParser):
         self._tag = ''
         # Page title
         self._pagetitle = ''
+        # Flag set when the <head> section is parsed
+        self._headdone = False
         SGMLParser.__init__(self)
         
     def save_anchors(self, value):
@@ -167,13 +170,17 @@ class HarvestManSimpleParser(SGMLParser):
         # Set as current tag
         self._tag = tag
         # print self._tag, attrs
-        
+
+        if tag in ('body', 'frameset'):
+            self._headdone = True
+            
         if not attrs: return
         isBaseTag = not self.base and tag == 'base'
         
         if tag in self.handled:
 
-            d = CaselessDict(attrs)
+            # Attribute names are in lower case
+            d = dict(attrs)
             
             _values = (self.handled[tag])
 
@@ -245,9 +252,9 @@ class HarvestManSimpleParser(SGMLParser):
                                 continue
 
                     elif tag != 'applet':
-                        link = d[key]
+                        link = d[key.lower()]
                     else:
-                        link += d[key]
+                        link += d[key.lower()]
                         if key == 'codebase':
                             if link:
                                 if link[-1] != '/':
@@ -268,6 +275,59 @@ class HarvestManSimpleParser(SGMLParser):
                     # append to private list of links
                     self.check_add_link(typ, link)
 
+    def unknown_endtag(self, tag):
+        if tag == 'head':
+            self._headdone = True
+
+    def feed(self, data):
+        rawdata = self.rawdata + data
+        SGMLParser.feed(self, data)
+        self.save_script(rawdata)
+
+    def close(self):
+        rawdata = self.rawdata
+        SGMLParser.close(self)
+        self.save_script(rawdata)
+        if self._scriptpos >= 0:
+            # Unterminated <script> block
+            self.scripts.append(self._script)
+            self._scriptpos = -1
+
+    def save_script(self, rawdata):
+        """ Save the javascript source in data which was
+        consumed by the parser, since the parser only keeps
+        the data it has not consumed """
+
+        if self._scriptpos >= 0:
+            done = len(rawdata) - len(self.rawdata)
+            self._script += rawdata[self._scriptpos:done]
+            self._scriptpos = 0
+
+    def parse_starttag(self, i):
+        k = self.scan_starttag(i)
+        if k >= 0 and self._tag == 'script' and self._scriptpos < 0:
+            # Start of javascript
+            self._scriptpos = k
+        return k
+
+    def scan_starttag(self, i):
+        return SGMLParser.parse_starttag(self, i)
+
+    def parse_endtag(self, i):
+        if self._scriptpos >= 0:
+            match = sgmllib.endbracket.search(self.rawdata, i+1)
+            if match and self.rawdata[i+2:match.start(0)].strip().lower() == 'script':
+                self.end_script(i)
+
+        return SGMLParser.parse_endtag(self, i)
+
+    def end_script(self, i):
+        """ End the <script> block at position i of the data """
+
+        self.scripts.append(self._script + self.rawdata[self._scriptpos:i])
+        self._script = ''
+        self._scriptpos = -1
+        
     def handle_data(self, data):
         # Set title only once
         if self._tag.lower()=='title' and self._pagetitle=='':
@@ -276,17 +336,21 @@ class HarvestManSimpleParser(SGMLParser):
     def check_add_link(self, typ, link):
         """ To avoid adding duplicate links """
 
-        f = False
-
+        # The lists of links and images are kept in the
+        # order in which they are found, a dictionary of
+        # the links and images added is used for lookup.
+        item = (typ, link)
+        if item in self._seen: return
+        self._seen[item] = 1
+        
         if typ == 'image':
-            if not (typ, link) in self.images:
-                # moredebug('Adding image ', link, typ)
-                self.images.append((typ, link))
-        elif not (typ, link) in self.links:
-                # moredebug('Adding link ', link, typ)
-                pos = self.getpos()
-                self.links.append((typ, link))
-                self.linkpos[(typ,link)] = (pos[0],pos[1])
+            # moredebug('Adding image ', link, typ)
+            self.images.append(item)
+        else:
+            # moredebug('Adding link ', link, typ)
+            pos = self.getpos()
+            self.links.append(item)
+            self.linkpos[item] = (pos[0],pos[1])
                 
 
     def add_tag_info(self, taginfo):
@@ -341,11 +405,25 @@ class HarvestManSimpleParser(SGMLParser):
         self.base = None
         self.links = []
         self.images = []
+        self._seen = {}
+        # Javascript source of the <script> blocks
+        self.scripts = []
+        # Start of the <script> block being parsed in the
+        # data and its source in data already consumed
+        self._scriptpos = -1
+        self._script = ''
         self.base_href = False
         self.base_url = ''
         self.can_index = True
         self.can_follow = True
+        self._headdone = False
         
+    def head_done(self):
+        """ Return whether the <head> section of the
+        page has been parsed """
+
+        return self._headdone
+    
     def base_url_defined(self):
         """ Return whether this url had a
         base url of the form <base href='...'>
@@ -372,6 +450,259 @@ class HarvestManSGMLOpParser(HarvestManSimpleParser):
 
     def feed(self, data):
         self.parser.feed(data)
+
+class HarvestManFastParser(HarvestManSimpleParser):
+    """ A parser which scans the page with compiled regular
+    expressions. It finds the same links as HarvestManSimpleParser,
+    but parses the attributes of handled tags only and skips
+    text other than the page title """
+
+    # The page is split into tags and text exactly like
+    # sgmllib does it, so that malformed pages give the
+    # same results. Since this parser has no start_*, do_*
+    # or end_* methods, tags go directly to the unknown_*
+    # methods.
+    
+    # Start of markup, '<' followed by anything else is text
+    markup_re = re.compile(r'<[a-zA-Z>/!?]')
+    
+    def goahead(self, end):
+        rawdata = self.rawdata
+        i = 0
+        n = len(rawdata)
+
+        markup = self.markup_re.search
+        starttagopen = sgmllib.starttagopen.match
+        endbracket = sgmllib.endbracket.search
+        
+        while i < n:
+            # Text is of interest only for the title
+            intitle = (self._tag == 'title' and self._pagetitle == '')
+            if intitle:
+                match = sgmllib.interesting.search(rawdata, i)
+            else:
+                match = markup(rawdata, i)
+                
+            if match:
+                j = match.start()
+            elif rawdata[-1] == '<':
+                # Could be the start of a tag
+                j = n - 1
+            else:
+                j = n
+                
+            if i < j and intitle:
+                self.handle_data(rawdata[i:j])
+            i = j
+            if i == n: break
+            
+            if rawdata[i] == '<':
+                if starttagopen(rawdata, i):
+                    k = self.parse_starttag(i)
+                    if k < 0: break
+                    i = k
+                    continue
+                if rawdata.startswith("</", i):
+                    # End tag
+                    match = endbracket(rawdata, i+1)
+                    if not match: break
+                    j = match.start(0)
+                    tag = rawdata[i+2:j].strip().lower()
+                    if tag == 'script' and self._scriptpos >= 0:
+                        self.end_script(i)
+                    self.unknown_endtag(tag)
+                    if rawdata[j] == '>':
+                        j = j+1
+                    i = j
+                    continue
+                if rawdata.startswith("<!--", i):
+                    k = self.parse_comment(i)
+                    if k < 0: break
+                    i = k
+                    continue
+                if rawdata.startswith("<?", i):
+                    k = self.parse_pi(i)
+                    if k < 0: break
+                    i = i+k
+                    continue
+                if rawdata.startswith("<!", i):
+                    k = self.parse_declaration(i)
+                    if k < 0: break
+                    i = k
+                    continue
+            else:
+                match = sgmllib.charref.match(rawdata, i)
+                if match:
+                    self.handle_charref(match.group(1))
+                    i = match.end(0)
+                    if rawdata[i-1] != ';': i = i-1
+                    continue
+                match = sgmllib.entityref.match(rawdata, i)
+                if match:
+                    self.handle_entityref(match.group(1))
+                    i = match.end(0)
+                    if rawdata[i-1] != ';': i = i-1
+                    continue
+
+            match = sgmllib.incomplete.match(rawdata, i)
+            if not match:
+                self.handle_data(rawdata[i])
+                i = i+1
+                continue
+            j = match.end(0)
+            if j == n:
+                break # Really incomplete
+            self.handle_data(rawdata[i:j])
+            i = j
+            
+        if end and i < n:
+            if self._tag == 'title' and self._pagetitle == '':
+                self.handle_data(rawdata[i:n])
+            i = n
+        self.rawdata = rawdata[i:]
+
+    def scan_starttag(self, i):
+        rawdata = self.rawdata
+        if sgmllib.shorttagopen.match(rawdata, i):
+            # SGML shorthand: <tag/data/ == <tag>data</tag>
+            match = sgmllib.shorttag.match(rawdata, i)
+            if not match:
+                return -1
+            tag, data = match.group(1, 2)
+            tag = tag.lower()
+            self.unknown_starttag(tag, [])
+            self.handle_data(data)
+            self.unknown_endtag(tag)
+            return match.end(0)
+
+        match = sgmllib.endbracket.search(rawdata, i+1)
+        if not match:
+            return -1
+        j = match.start(0)
+        
+        attrs = []
+        if rawdata[i:i+2] == '<>':
+            # SGML shorthand: <> == <last open tag seen>
+            k = j
+            tag = self.lasttag
+        else:
+            match = sgmllib.tagfind.match(rawdata, i+1)
+            k = match.end(0)
+            tag = rawdata[i+1:k].lower()
+            self.lasttag = tag
+
+        # Attributes of other tags are not used
+        if tag in self.handled:
+            attrfind = sgmllib.attrfind
+            while k < j:
+                match = attrfind.match(rawdata, k)
+                if not match: break
+                attrname, rest, attrvalue = match.group(1, 2, 3)
+                if not rest:
+                    attrvalue = attrname
+                else:
+                    if (attrvalue[:1] == "'" == attrvalue[-1:] or
+                        attrvalue[:1] == '"' == attrvalue[-1:]):
+                        # strip quotes
+                        attrvalue = attrvalue[1:-1]
+                    if '&' in attrvalue:
+                        attrvalue = self.entity_or_charref.sub(
+                            self._convert_ref, attrvalue)
+                attrs.append((attrname.lower(), attrvalue))
+                k = match.end(0)
+            
+        if rawdata[j] == '>':
+            j = j+1
+        self.unknown_starttag(tag, attrs)
+        return j
+
+def make_html_parser():
+    """ Return an html parser of the type set in the config """
+
+    htmlparser = GetObject('config').htmlparser
+    if htmlparser == 1:
+        try:
+            return HarvestManSGMLOpParser()
+        except ImportError, e:
+            debug('sgmlop is not available, using sgmllib parser')
+    elif htmlparser == 2:
+        return HarvestManFastParser()
+
+    return HarvestManSimpleParser()
+    
+class HarvestManStreamParser(object):
+    """ Feeds the data of a web page to an html parser in
+    blocks as it is downloaded, and passes on the links
+    found so far to a callback function """
+
+    # Links are passed on only after the <head> section
+    # is parsed, so that any <base href="..."> and META
+    # robots tags of the page are known by then.
+    
+    def __init__(self, parser, callback=None):
+        self.parser = parser
+        # Function called with the new (links, images)
+        self.callback = callback
+        # Flag for obeying META robots tags
+        self.robots = GetObject('config').robots
+        self.reset()
+
+    def reset(self):
+        self.parser.reset()
+        # Number of links and images passed on
+        self._nlinks = 0
+        self._nimages = 0
+        # Error in parsing, if any
+        self.error = None
+        # Flag set when no more data is parsed, i.e on
+        # an error or if the page does not allow its
+        # links to be followed.
+        self.stopped = False
+        # Flag set when all data of the page is fed
+        self.complete = False
+
+    def feed(self, data):
+        """ Parse a block of data of the page """
+        
+        if self.stopped: return
+
+        try:
+            self.parser.feed(data)
+        except (SGMLParseError, IOError, ValueError), e:
+            self.error = e
+            self.stopped = True
+            return
+
+        if self.robots and not self.parser.can_follow:
+            # META robots NOFOLLOW, no need to
+            # look for more links
+            self.stopped = True
+        elif self.parser.head_done():
+            self.flush()
+
+    def flush(self):
+        """ Pass on the links found since the last call """
+        
+        if self.callback is None: return
+
+        links = self.parser.links[self._nlinks:]
+        images = self.parser.images[self._nimages:]
+        if links or images:
+            self._nlinks += len(links)
+            self._nimages += len(images)
+            self.callback(links, images)
+
+    def close(self):
+        """ Mark the end of data of the page """
+
+        if not self.stopped:
+            try:
+                self.parser.close()
+            except (SGMLParseError, IOError, ValueError), e:
+                self.error = e
+                
+        self.stopped = True
+        self.complete = True
         
 class HarvestManCSSParser(object):
     """ Class to parse stylesheets and extract URLs """
@@ -452,7 +783,13 @@ class HarvestManJSParser(JSParser):
 
         super(HarvestManJSParser, self).feed(data)
         # Get the statements
-        for s in self.statements:
+        self.feed_scripts(self.statements)
+
+    def feed_scripts(self, scripts):
+        """ Perform JS processing on javascript source
+        already extracted from the page """
+
+        for s in scripts:
             # Split the statements to lines
             jslines = s.split('\n')
             for line in jslines:
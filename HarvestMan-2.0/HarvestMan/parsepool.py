@@ -0,0 +1,222 @@
+# -- coding: latin-1
+""" parsepool.py - Module providing a pool of worker processes
+    for parsing web pages. This is part of the HarvestMan program.
+
+    Parsing of web pages is CPU bound and is done by the fetcher
+    threads, so because of the global interpreter lock, a crawl
+    uses only one processor when parsing is the bottleneck. With a
+    parser pool, fetchers send the page data to worker processes
+    and get back the links, the base url, the META robots flags
+    and the hash of the page. The number of pages in flight is
+    bounded, fetchers wait when the window is full.
+
+    The pool needs the multiprocessing module (or its predecessor,
+    the processing package). If neither is available, pages are
+    parsed by the fetchers as before.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import re
+import sha
+import threading
+
+try:
+    import multiprocessing
+except ImportError:
+    try:
+        import processing as multiprocessing
+    except ImportError:
+        multiprocessing = None
+
+from sgmllib import SGMLParseError
+
+from common.common import *
+from urltypes import *
+
+import pageparser
+import simhash
+
+# Token in any javascript redirection
+location_re = re.compile('location', re.IGNORECASE)
+
+class HarvestManPageInfo(object):
+    """ Information extracted from a web page """
+
+    def __init__(self):
+        # (type, url) list of links including any
+        # javascript redirection, and of images
+        self.links = []
+        self.images = []
+        # Url of <base href="..."> if defined
+        self.base = None
+        # Flags of META robots tag
+        self.can_index = True
+        self.can_follow = True
+        # SHA hash of the page data
+        self.pagehash = ''
+        # SimHash fingerprint of the page text,
+        # if near-duplicates are checked
+        self.simhash = None
+
+def parse_page(data, url, wp=None, stream=None):
+    """ Parse the data of the web page with the given url and
+    return a HarvestManPageInfo object. The html parser wp is
+    used if given. If the data was fed to a stream parser as
+    it was downloaded, the html is not parsed again """
+
+    info = HarvestManPageInfo()
+
+    if stream is not None and stream.complete:
+        wp = stream.parser
+        if wp.base_url_defined():
+            info.base = wp.get_base_url()
+        if isinstance(stream.error, (SGMLParseError, IOError)):
+            extrainfo('SGML parse error:',str(stream.error))
+            extrainfo('Error in parsing web-page %s' % url)
+    else:
+        if wp is None:
+            wp = pageparser.make_html_parser()
+
+        try:
+            wp.reset()
+            wp.feed(data)
+            # Bug Fix: If the <base href="..."> tag was defined in the
+            # web page, relative urls must be constructed against
+            # the url provided in <base href="...">
+            if wp.base_url_defined():
+                info.base = wp.get_base_url()
+            wp.close()
+        except (SGMLParseError, IOError), e:
+            extrainfo('SGML parse error:',str(e))
+            extrainfo('Error in parsing web-page %s' % url)
+        except ValueError, e:
+            pass
+
+    # Perform any Javascript based redirection etc
+    try:
+        redirectedurl = find_js_redirect(data, wp)
+        if redirectedurl:
+            extrainfo("Javascript redirection to",redirectedurl)
+            info.links.append((TYPE_WEBPAGE, redirectedurl))
+    except Exception, e:
+        extrainfo("Error while parsing Javascript", e)
+
+    info.can_index = wp.can_index
+    info.can_follow = wp.can_follow
+    info.links.extend(wp.links)
+    info.images = wp.images[:]
+
+    return info
+
+def find_js_redirect(data, wp):
+    """ Return the url of any javascript redirection in the
+    data of a web page parsed by the html parser wp """
+
+    # Pages without a location token cannot redirect
+    count = len(location_re.findall(data))
+    if count == 0:
+        return ''
+
+    parser = pageparser.HarvestManJSParser()
+
+    # If all location tokens are in the <script> blocks collected
+    # by the html parser, only those blocks are processed. Otherwise
+    # the javascript parser processes the whole page.
+    scripts = [s for s in wp.scripts if location_re.search(s)]
+    if sum([len(location_re.findall(s)) for s in scripts]) == count:
+        parser.feed_scripts(scripts)
+    else:
+        parser.feed(data)
+
+    return parser.redirectedurl
+
+# Parser of a worker process
+_parser = None
+
+def _init_worker(options):
+    # Set the config values used by the parser,
+    # in case the process was not forked
+    cfg = GetObject('config')
+    if cfg is None:
+        import config
+        InitConfig(config.HarvestManStateObject)
+        cfg = GetObject('config')
+
+    for key, val in options.iteritems():
+        setattr(cfg, key, val)
+
+def _parse_worker(data, url):
+    global _parser
+
+    if _parser is None:
+        _parser = pageparser.make_html_parser()
+
+    info = parse_page(data, url, _parser)
+    info.pagehash = sha.new(data).hexdigest()
+    if GetObject('config').nearduplicates:
+        info.simhash = simhash.fingerprint(data)
+    return info
+
+class HarvestManParserPool(object):
+    """ Pool of worker processes for parsing web pages """
+
+    def __init__(self, workers, window=0, timeout=120.0):
+        if multiprocessing is None:
+            raise ImportError, 'multiprocessing module is not available'
+
+        cfg = GetObject('config')
+        options = { 'getquerylinks' : cfg.getquerylinks,
+                    'htmlparser' : cfg.htmlparser,
+                    'nearduplicates' : cfg.nearduplicates }
+
+        self.workers = workers
+        # Maximum number of pages in flight
+        self.window = window or 2*workers
+        # Time to wait for the result of a page
+        self.timeout = timeout
+        self._sema = threading.BoundedSemaphore(self.window)
+        self._pool = multiprocessing.Pool(workers, _init_worker, (options,))
+        self.closed = False
+
+    def parse(self, data, url):
+        """ Parse the data of a web page in a worker process
+        and return a HarvestManPageInfo object. This waits if
+        the window of pages in flight is full. Returns None if
+        the page could not be parsed by the pool """
+
+        if self.closed: return None
+
+        self._sema.acquire()
+        try:
+            try:
+                result = self._pool.apply_async(_parse_worker, (data, url))
+                return result.get(self.timeout)
+            except Exception, e:
+                # Worker died, timed out or the pool was closed
+                extrainfo('Error parsing web-page %s in worker: %s' % (url, e))
+                return None
+        finally:
+            self._sema.release()
+
+    def close(self):
+        """ Stop the worker processes after the pages
+        in flight are parsed """
+
+        if self.closed: return
+        self.closed = True
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """ Stop the worker processes at once """
+
+        if self.closed: return
+        self.closed = True
+        self._pool.terminate()
@@ -53,7 +53,7 @@ def create_index(self, arg):
 
     urllist = []
     
-    for urlobj in self._urldict.values():
+    for urlobj in self._urlstore.itervalues():
 
         filename = urlobj.get_full_filename()
         url = urlobj.get_full_url()
@@ -64,7 +64,7 @@ def create_index(self, arg):
         except ValueError:
             urllist.append(url)
 
-        if not filename in self._downloaddict['_savedfiles']: continue
+        if not self._ledger.is_file_saved(filename): continue
         
         data = ''
 
@@ -33,6 +33,7 @@ import re
 import os
 import time
 import copy
+import md5
 
 import robotparser
 
@@ -41,6 +42,9 @@ from common.lrucache import LRU
 from common.methodwrapper import MethodWrapperMetaClass
 
 import urlparser
+import simhash
+import hosts
+import seenset
 
 # Defining pluggable functions
 __plugins__ = {'violates_basic_rules_plugin': 'HarvestManRulesChecker:violates_basic_rules'}
@@ -61,13 +65,14 @@ class HarvestManRulesChecker(object):
 
     def __init__(self):
 
-        self._links = LRU(1000)
+        self._configobj = GetObject('config')
+        # Set of hashes of the urls seen
+        self._links = seenset.HarvestManSeenSet(self._configobj.seenmemory, GetMyTempDir())
         self._filter = []
         self._extservers = []
         self._extdirs = []
         self._rexplist = []
         self._wordstr = '[\s+<>]'
-        self._robots  = {}
         self._robocache = []
         self._invalidservers = []
         self._logger = GetObject('logger')
@@ -75,37 +80,56 @@ class HarvestManRulesChecker(object):
         self._pagehash = LRU(1000)
         # Flag for making filters
         self._madefilters = False
-        # Configure robotparser object if rep rule is specified
-        self._configobj = GetObject('config')
+        # Matcher for url/server priorities
+        self._prioritymatcher = HarvestManPriorityMatcher()
+        # Dictionary of id => (rules, matcher) of the
+        # url/server filter rules
+        self._filtermatchers = {}
         # Create junk filter if specified
         if self._configobj.junkfilter:
             self.junkfilter = JunkFilter()
         else:
             self.junkfilter = None
+        # For SimHash fingerprints of pages whose
+        # links were crawled
+        self._simhash = simhash.HarvestManSimHashIndex(self._configobj.nearduplicatedistance,
+                                                       self._configobj.nearduplicatesize)
 
     def get_state(self):
         """ Return a snapshot of the current state of this
         object and its containing threads for serializing """
         
         d = {}
-        d['_links'] = copy.copy(self._links)
+        d['_links'] = self._links
         d['_filter'] = self._filter[:]
         d['_extservers'] = self._extservers[:]
         d['_extdirs'] = self._extdirs[:]
         d['_robocache'] = self._robocache[:]
         d['_pagehash'] = copy.copy(self._pagehash)
+        d['_simhash'] = self._simhash
 
         return d
 
     def set_state(self, state):
         """ Set state to a previous saved state """
 
-        self._links = state.get('_links', {})
+        links = state.get('_links', {})
+        if isinstance(links, seenset.HarvestManSeenSet):
+            self._links.close()
+            self._links = links
+        else:
+            # Dictionary of url hashes saved by an
+            # earlier version
+            for urlhash in links.keys():
+                self._links.add(urlhash)
         self._filter = state.get('_filter', [])
         self._extservers = state.get('_extservers', [])
+        for host in hosts.hosttable:
+            host.extindex = -1
         self._extdirs = state.get('_extdirs', [])
         self._robocache = state.get('_robocache', [])                
         self._pagehash = state.get('_pagehash', {})
+        self._simhash = state.get('_simhash', self._simhash)
 
         self._configobj = GetObject('config')
         # Create junk filter if specified
@@ -166,18 +190,44 @@ class HarvestManRulesChecker(object):
     def is_duplicate_link(self, urlobj):
         """ Check whether the passed URL is a duplicate URL """
 
-        try:
-            x = self._links[urlobj.get_url_hash()]
+        return not self.add_link(urlobj)
+
+    def is_filtered_url(self, url, typ):
+        """ Check the full url string of a link of the given
+        type before a url object is created for it. Returns True
+        if the url is a duplicate or is blocked by the url filters,
+        so that its url object would be skipped anyway """
+
+        # Same hash as the url object's get_url_hash
+        if md5.new(url).hexdigest() in self._links:
             return True
-        except KeyError, e:
-            self.add_link(urlobj)
+
+        if typ in self._configobj.skipruletypes:
             return False
 
+        try:
+            self._filter.index(url)
+            return True
+        except ValueError:
+            pass
+
+        if self.apply_url_filter(url):
+            extrainfo("Custom filter - filtered ", url)
+            return True
+
+        return False
+        
     def add_link(self, urlobj):
-        """ Add URL to links """
+        """ Add URL to links. Returns True if the URL
+        was not in the links already """
+
+        urlhash = urlobj.get_url_hash()
+        if self._links.add(urlhash):
+            return False
 
-        # This is an LRU cache
-        self._links[urlobj.get_url_hash()] = 1
+        journal = GetObject('journal')
+        if journal: journal.log('link', urlhash)
+        return True
         
     def add_to_filter(self, link):
         """ Add the link to the filter list """
@@ -328,20 +378,23 @@ class HarvestManRulesChecker(object):
         except ValueError:
             pass
 
-        try:
-            rp = self._robots[domport]
+        # The parser is kept in the record of the host
+        host = urlObj.get_host()
+        if host.robotsread:
+            rp = host.robots
             # Check #4
             # If there is an entry, but it
             # is None, it means there is no
             # robots.txt file in the server
             # (see below). So return False.
             if not rp: return 0
-        except KeyError:
+        else:
             # Not there, create a fresh
             # one and add it.
             rp = robotparser.RobotFileParser()
             rp.set_url(robotsfile)
             ret = rp.read()
+            host.robotsread = True
             # Check #5                
             if ret==-1:
                 # no robots.txt file
@@ -349,11 +402,11 @@ class HarvestManRulesChecker(object):
                 # server as None, so next
                 # time we dont need to do
                 # this operation again.
-                self._robots[domport] = None
+                host.robots = None
                 return 0
             else:
                 # Set it
-                self._robots[domport] = rp
+                host.robots = rp
 
         # Get user-agent from Spider
         ua = GetObject('USER_AGENT')
@@ -404,25 +457,19 @@ class HarvestManRulesChecker(object):
         if inclfilter:
             inclcheck=1
             # see if we have a match
-            for f in inclfilter:
-                m=f.search(url)
-                if m:
-                    extrainfo('Go-through filter for url ', url, 'found')
-                    matchincl=True
-                    inclcheck=0
-                    break
+            matchincl = self._get_filter_matcher(inclfilter).get_rule(url)
+            if matchincl is not None:
+                extrainfo('Go-through filter for url ', url, 'found')
+                inclcheck=0
 
         if exclfilter:
             exclcheck=0
             # see if we have a match
-            for f in exclfilter:
-                m=f.search(url)
-                if m:
-                    extrainfo('No-pass filter for url ', url, 'found')
-                    matchexcl=True
-                    self.add_to_filter(url)               
-                    exclcheck=1
-                    break
+            matchexcl = self._get_filter_matcher(exclfilter).get_rule(url)
+            if matchexcl is not None:
+                extrainfo('No-pass filter for url ', url, 'found')
+                self.add_to_filter(url)               
+                exclcheck=1
 
         if inclcheck==1:
             extrainfo("Inclfilter does not allow this url", url)
@@ -434,7 +481,7 @@ class HarvestManRulesChecker(object):
         # we check the order of the filters in the global filter. Whichever
         # comes first has precedence.
         if inclcheck == 0 and exclcheck == 1:
-            globalfilter=self._configobj.allfilters
+            globalfilter=self._get_filter_matcher(self._configobj.allfilters).rules
             try:
                 indexincl=globalfilter.index(matchincl)
             except:
@@ -491,29 +538,20 @@ class HarvestManRulesChecker(object):
 
         if serverinclfilter:
             inclcheck = 1
-
-            for f in serverinclfilter:
-                # see if we have a match
-                m=re.search(re.compile(f,re.IGNORECASE), server)
-
-                if m:
-                    extrainfo('Go-through filter for url ', url, 'found')
-                    matchincl=f
-                    inclcheck=0
-                    break
+            # see if we have a match
+            matchincl = self._get_filter_matcher(serverinclfilter).get_rule(server)
+            if matchincl is not None:
+                extrainfo('Go-through filter for url ', url, 'found')
+                inclcheck=0
 
         if serverexclfilter:
-            exclcheck = 1
-            for f in serverexclfilter:
-                # see if we have a match
-                m=re.search(re.compile(f,re.IGNORECASE), server)
-
-                if m:
-                    extrainfo('No-pass filter for url ', url, 'found')
-                    matchexcl=f
-                    self.add_to_filter(url)               
-                    exclcheck=1
-                    break
+            exclcheck = 0
+            # see if we have a match
+            matchexcl = self._get_filter_matcher(serverexclfilter).get_rule(server)
+            if matchexcl is not None:
+                extrainfo('No-pass filter for url ', url, 'found')
+                self.add_to_filter(url)               
+                exclcheck=1
 
         if inclcheck==1:
             extrainfo("Inclfilter does not allow this url", url)
@@ -525,7 +563,7 @@ class HarvestManRulesChecker(object):
         # we check the order of the filters in the global filter. Whichever
         # comes first has precedence.
         if inclcheck == 0 and exclcheck == 1:
-            globalfilter=self._configobj.allserverfilters
+            globalfilter=self._get_filter_matcher(self._configobj.allserverfilters).rules
             try:
                 indexincl=globalfilter.index(matchincl)
             except:
@@ -620,11 +658,18 @@ class HarvestManRulesChecker(object):
         if not baseUrlObj:
             return False
 
-        # Check based on the server
-        server = urlObj.get_domain()
-        baseserver = baseUrlObj.get_domain()
+        # Check based on the server. The result is
+        # kept in the record of the host, since the
+        # comparison can look up the base server.
+        host = urlObj.get_host()
+        baseid = baseUrlObj.get_host_id()
+        if host.baseid != baseid:
+            server = urlObj.get_domain()
+            baseserver = baseUrlObj.get_domain()
+            host.external = not self.compare_domains( server, baseserver )
+            host.baseid = baseid
 
-        return not self.compare_domains( server, baseserver )
+        return host.external
 
     def is_external_link(self, urlObj):
         """ Check if the url is an external link relative to starting url,
@@ -726,9 +771,8 @@ class HarvestManRulesChecker(object):
                     if not parentUrlObj:
                         return False
 
-                    server = urlObj.get_domain()
                     if parentUrlObj.get_domain() == baseserver:
-                        self._increment_ext_server_count(server)
+                        self._increment_ext_server_count(urlObj)
                         return False
                     else:
                         return True
@@ -742,7 +786,7 @@ class HarvestManRulesChecker(object):
                 self._configobj.eserverlinks=1
                 # do other checks , just fall through
 
-            res = self._ext_server_check(urlObj.get_domain())
+            res = self._ext_server_check(urlObj)
 
             if not res:
                 self.add_to_filter(urlObj.get_full_url())
@@ -815,11 +859,11 @@ class HarvestManRulesChecker(object):
         else:
             return True
 
-    def _ext_server_check(self, server):
-        """ Check whether the server <server> should be considered
-        external """
+    def _ext_server_check(self, urlObj):
+        """ Check whether the server of the url object should be
+        considered external """
 
-        index=self._increment_ext_server_count(server)
+        index=self._increment_ext_server_count(urlObj)
 
         # are we above a prescribed limit ?
         if self._configobj.maxextservers and len(self._extservers)>self._configobj.maxextservers:
@@ -846,13 +890,23 @@ class HarvestManRulesChecker(object):
 
         return index
 
-    def _increment_ext_server_count(self,server):
+    def _increment_ext_server_count(self, urlObj):
         """ Increment the external server count """
 
+        # The index is kept in the record of the host,
+        # hosts with other protocols or ports share the
+        # index of the server.
+        host = urlObj.get_host()
+        if host.extindex != -1:
+            return host.extindex
+
         index=-1
+        server = host.domain
         try:
             index=self._extservers.index(server)
-        except:
+            host.extindex = index
+        except ValueError:
+            host.extindex = len(self._extservers)
             self._extservers.append(server)
 
         return index
@@ -869,6 +923,18 @@ class HarvestManRulesChecker(object):
         else:
             self._pagehash[urlobj.pagehash] = urlobj.get_domain()
             return False
+
+    def check_near_duplicate(self, urlobj, fingerprint):
+        """ Check if the page of this URL is a near-duplicate
+        of a page whose links were crawled, given the SimHash
+        fingerprint of the page """
+
+        # Like for duplicate content, we allow near-duplicate
+        # pages from different domains
+        if fingerprint is None:
+            return False
+
+        return self._simhash.check(fingerprint, urlobj.get_domain())
         
     def get_stats(self):
         """ Return statistics as a 3 tuple. This returns
@@ -915,6 +981,8 @@ class HarvestManRulesChecker(object):
 
         self._configobj.set_option('serverprioritydict_value', server_priorities)
 
+        self._prioritymatcher = HarvestManPriorityMatcher(url_priorities, server_priorities)
+
         # word filter list
         wordfilterstr = self._configobj.wordfilter.strip()
         # print 'Word filter string=>',wordfilterstr,len(wordfilterstr)
@@ -924,6 +992,11 @@ class HarvestManRulesChecker(object):
 
         self._madefilters = True
         
+    def get_priority_matcher(self):
+        """ Return the matcher for url/server priorities """
+
+        return self._prioritymatcher
+    
     def _make_priority(self, pstr):
         """ Generate a priority dictionary from the priority string """
 
@@ -1059,6 +1132,22 @@ class HarvestManRulesChecker(object):
 
         return refilter
 
+    def _get_filter_matcher(self, rules):
+        """ Return the compiled matcher for a list of url
+        or server filter rules of the configuration """
+
+        # Matchers are kept for the lists they were made
+        # from, the configuration replaces the lists when
+        # the filters change.
+        try:
+            return self._filtermatchers[id(rules)][1]
+        except KeyError:
+            pass
+
+        matcher = HarvestManFilterMatcher(rules, re.IGNORECASE)
+        self._filtermatchers[id(rules)] = (rules, matcher)
+        return matcher
+        
     def _make_word_filter(self, s):
         """ Create a word filter rule for HarvestMan """
 
@@ -1072,14 +1161,285 @@ class HarvestManRulesChecker(object):
         self._extservers = []
         self._extdirs = []
         self._robocache = []
+        self._filtermatchers = {}
         # Reset dicts
-        self._robots.clear()
-        self._links.clear()
+        hosts.hosttable.reset()
+        self._links.close()
         self._pagehash.clear()
+        self._simhash.clear()
+
+class HarvestManPriorityMatcher(object):
+    """ Compiled matcher for the url & server priorities. Url
+    priorities are looked up in a table of file extensions.
+    Server priority keys match any part of a domain, they are
+    compiled into an Aho-Corasick automaton which finds all
+    keys in a domain in a single scan. If more than one key
+    matches, the longest one is applied. Results are cached
+    per domain """
+
+    # Maximum number of domains in the cache
+    cachesize = 10000
+    
+    def __init__(self, urlpriorities={}, serverpriorities={}):
+        # Dictionary of extension => priority
+        self.extensions = dict(urlpriorities)
+        # Dictionary of server key => priority
+        self.servers = dict(serverpriorities)
+        # Dictionary of domain => priority
+        self._cache = {}
+        self._make_automaton()
+
+    def _make_automaton(self):
+        """ Build the automaton for the server keys """
+
+        # Transitions, failure links and the longest key
+        # matching at each state
+        self._goto = goto = [{}]
+        self._fail = fail = [0]
+        self._out = out = [None]
+
+        for key in sorted(self.servers.keys()):
+            state = 0
+            for c in key:
+                nextstate = goto[state].get(c)
+                if nextstate is None:
+                    goto.append({})
+                    fail.append(0)
+                    out.append(None)
+                    nextstate = goto[state][c] = len(goto) - 1
+                state = nextstate
+            out[state] = key
+
+        # Set failure links in breadth first order, so the
+        # failure link of a state is the state of its longest
+        # proper suffix which is a prefix of a key.
+        states = goto[0].values()
+        while states:
+            nextstates = []
+            for state in states:
+                for c, child in goto[state].iteritems():
+                    f = fail[state]
+                    while f and c not in goto[f]:
+                        f = fail[f]
+                    fail[child] = goto[f].get(c, 0)
+                    if out[child] is None:
+                        out[child] = out[fail[child]]
+                    nextstates.append(child)
+            states = nextstates
+
+    def match_server(self, domain):
+        """ Return the server key matching the given domain,
+        or None if no key matches """
+
+        goto, fail, out = self._goto, self._fail, self._out
+        best = out[0]
+        state = 0
         
+        for c in domain:
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            key = out[state]
+            if key is not None and (best is None or len(key) > len(best)):
+                best = key
+
+        return best
+    
+    def get_server_priority(self, domain):
+        """ Return the priority for the given domain """
+
+        try:
+            return self._cache[domain]
+        except KeyError:
+            pass
+
+        key = self.match_server(domain)
+        if key is None:
+            prio = 0
+        else:
+            prio = int(self.servers[key])
+
+        if len(self._cache) >= self.cachesize:
+            self._cache.clear()
+        self._cache[domain] = prio
+        
+        return prio
+
+    def get_url_priority(self, filename):
+        """ Return the priority for the given file name
+        based on its extension """
+
+        if not self.extensions:
+            return 0
+
+        # Same as the extension returned by os.path.splitext,
+        # leading dots of a file name are not an extension.
+        index = filename.rfind('.')
+        if index <= 0 or not filename[:index].lstrip('.'):
+            return 0
+
+        return int(self.extensions.get(filename[index+1:].lower(), 0))
+    
+    def get_priority(self, filename, domain):
+        """ Return the combined url & server priority
+        for the given file name and domain """
+
+        prio = self.get_url_priority(filename)
+        if self.servers:
+            prio += self.get_server_priority(domain)
+
+        return prio
+
+class HarvestManFilterMatcher(object):
+    """ Compiled matcher for a list of filter rules. The rules
+    are merged into an alternation with a named group for each
+    rule, so a string is searched once for all rules and the
+    rule which matched is known from the name of its group.
+    Since a regular expression can have at most 99 groups,
+    long lists of rules are split into as many regular
+    expressions as needed.
+
+    Rules which would not work the same when merged, i.e with
+    backreferences, inline flags or named groups, are searched
+    on their own. If more than one rule matches, the first one
+    in the list is returned, as when the rules are searched in
+    turn """
+
+    # Maximum number of groups of a regular expression,
+    # the sre module counts the whole match as one more
+    maxgroups = 99
+    # Regular expression for leading /* and .* of a rule,
+    # which do not change whether a search matches
+    leadre = re.compile(r'^(?:[./]\*)+(?!\?)')
+    # Regular expression for backreferences, inline flags
+    # and conditional groups of a rule, which are not
+    # escaped by a backslash
+    separatere = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?[iLmsux(])')
+
+    def __init__(self, rules=[], flags=0):
+        # Rules as regular expression strings, compiled
+        # rules are replaced by their pattern
+        self.rules = [getattr(rule, 'pattern', rule) for rule in rules]
+        self.flags = flags
+        # Compiled rules, searched in turn to find the
+        # first rule matching a string
+        self._compiled = [re.compile(rule, flags) for rule in self.rules]
+        # List of (index of first rule, regular expression),
+        # the regular expression is None for a rule which is
+        # searched on its own
+        self._regexes = []
+        self._compile()
+
+    def _is_separate(self, index):
+        """ Return True if the rule at the given index is
+        to be searched on its own """
+
+        return bool(self._compiled[index].groupindex or \
+                    self.separatere.search(self.rules[index]))
+
+    def _compile(self):
+        """ Build the regular expressions for the rules """
+
+        alternatives, ngroups, start = [], 0, 0
+        for index, rule in enumerate(self.rules):
+            # The group of the rule and its own groups
+            groups = self._compiled[index].groups + 1
+            separate = self._is_separate(index)
+            if alternatives and (separate or ngroups + groups > self.maxgroups):
+                self._regexes.append((start, re.compile('|'.join(alternatives), self.flags)))
+                alternatives, ngroups = [], 0
+
+            if separate:
+                self._regexes.append((index, None))
+                continue
+            if not alternatives:
+                start = index
+
+            # A leading .* makes the search try the rest of
+            # the rule at every position after every position
+            # it starts from, so it is left out
+            rule = self.leadre.sub('', rule)
+            if self._is_alternation(rule):
+                rule = '(?:%s)' % rule
+            # The group of a rule is an empty one at its end,
+            # so rules starting with the same characters are
+            # still seen as such by the regular expression
+            # compiler, which then looks for them only once.
+            alternatives.append('%s(?P<r%d>)' % (rule, index))
+            ngroups += groups
+
+        if alternatives:
+            self._regexes.append((start, re.compile('|'.join(alternatives), self.flags)))
+
+    def _is_alternation(self, rule):
+        """ Return True if the rule has a '|' which is
+        not inside a group or a character set """
+
+        depth, index, charset = 0, 0, False
+        while index < len(rule):
+            c = rule[index]
+            if c == '\\':
+                index += 1
+            elif charset:
+                charset = (c != ']')
+            elif c == '[':
+                charset = True
+                # A ']' at the start of a set is part of it
+                if rule[index+1:index+2] == '^':
+                    index += 1
+                if rule[index+1:index+2] == ']':
+                    index += 1
+            elif c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            elif c == '|' and depth == 0:
+                return True
+            index += 1
+
+        return False
+
+    def __len__(self):
+        return len(self.rules)
+
+    def search(self, s):
+        """ Return the index of the first rule matching the
+        given string, or -1 if no rule matches """
+
+        for start, regex in self._regexes:
+            if regex is None:
+                if self._compiled[start].search(s):
+                    return start
+                continue
+
+            m = regex.search(s)
+            if m:
+                # The group of a rule comes after its own
+                # groups, so it is the last one closed. This
+                # is the rule matching leftmost in the string,
+                # rules before it may match further on.
+                index = int(m.lastgroup[1:])
+                for x in range(start, index):
+                    if self._compiled[x].search(s):
+                        return x
+                return index
+
+        return -1
+
+    def get_rule(self, s):
+        """ Return the rule matching the given string,
+        or None if no rule matches """
+
+        index = self.search(s)
+        if index == -1:
+            return None
+        return self.rules[index]
+    
 class JunkFilter(object):
     """ Junk filter class. Filter out junk urls such
-    as ads, banners, flash files etc """
+    as ads, banners, flash files etc. A url is junk if
+    its domain or any parent domain of it is a blocked
+    domain, or if it matches a block pattern """
 
     # Domain specific blocking - List courtesy
     # junkbuster proxy.
@@ -1441,16 +1801,17 @@ class JunkFilter(object):
     def __init__(self):
         self.msg = '<No Error>'
         self.match = ''
-        # Compile pattern list for performance
-        self.patterns = map(re.compile, self.block_patterns)
-        # Create base domains list from domains list
-        self.base_domains = map(self.base_domain, self.block_domains)
+        # Compile pattern list into a single matcher
+        self.patterns = HarvestManFilterMatcher(self.block_patterns)
+        # Dictionary of blocked domains for looking up
+        # a domain and its parent domains
+        self.domains = dict.fromkeys(self.block_domains, True)
 
     def reset_msg(self):
         self.msg = '<No Error>'
 
     def reset_match(self):
-        self.msg = ''        
+        self.match = ''
         
     def check(self, url_obj):
         """ Check whether the url is junk. Return
@@ -1468,33 +1829,32 @@ class JunkFilter(object):
         # Check pattern next
         return self._check_pattern(url_obj)
 
-    def base_domain(self, domain):
-
-        if domain.count(".") > 1:
-            strings = domain.split(".")
-            return "".join((strings[-2], strings[-1]))
-        else:
-            return domain
-            
     def _check_domain(self, url_obj):
         """ Check whether the url belongs to a junk
         domain. Return true if url is O.K (NOT a junk
         domain) and False otherwise """
 
-        # Get base server of the domain with port
-        base_domain_port = url_obj.get_base_domain_with_port()
-        # Get domain with port
-        domain_port = url_obj.get_domain_with_port()
+        domain = url_obj.get_domain()
+        # Port of the domain, if it is not the default
+        # for the protocol
+        port = url_obj.get_domain_with_port()[len(domain):]
 
         # First check for domain
-        if domain_port in self.block_domains:
+        if domain + port in self.domains:
             self.msg = '<Found domain match>'
+            self.match = domain + port
             return False
-        # Then check for base domain
-        else:
-            if base_domain_port in self.base_domains:
-                self.msg = '<Found base-domain match>'                
+
+        # Then check for its parent domains, for
+        # stats.foo.com these are foo.com and com
+        index = domain.find('.')
+        while index != -1:
+            parent = domain[index+1:] + port
+            if parent in self.domains:
+                self.msg = '<Found base-domain match>'
+                self.match = parent
                 return False
+            index = domain.find('.', index+1)
 
         return True
 
@@ -1503,17 +1863,12 @@ class JunkFilter(object):
         Return true if url is O.K (not a junk pattern) and
         false otherwise """
 
-        url = url_obj.get_full_url()
-
-        indx=0
-        for p in self.patterns:
-            # Do a search, not match
-            if p.search(url):
-                self.msg = '<Found pattern match>'
-                self.match = self.block_patterns[indx]
-                return False
-            
-            indx += 1
+        # Do a search, not match
+        indx = self.patterns.search(url_obj.get_full_url())
+        if indx != -1:
+            self.msg = '<Found pattern match>'
+            self.match = self.block_patterns[indx]
+            return False
             
         return True
             
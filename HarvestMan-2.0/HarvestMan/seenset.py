@@ -0,0 +1,345 @@
+# -- coding: latin-1
+""" seenset.py - Module providing the set of urls seen in
+    a crawl, which the rules checker uses to skip duplicate
+    urls. This is part of the HarvestMan program.
+
+    Urls are kept as 64 bit fingerprints taken from their md5
+    hash, in an open addressing hash table held in an array of
+    machine words, which takes about 12 bytes per url instead
+    of the hundred or so of a dictionary of hash strings.
+
+    The table grows up to a configured share of the memory of
+    the set. Fingerprints of urls beyond that go to files on
+    disk, split into buckets, with a Bloom filter in front of
+    them which uses the rest of the memory. A url is looked up
+    on disk only if the Bloom filter has its bits set, which is
+    the case for urls which were seen and a small fraction of
+    the others, so the set stays exact at bounded memory.
+
+    Bucket files are kept sorted, apart from a short tail of
+    the fingerprints written since the bucket was last merged,
+    and the first fingerprint of each block of a bucket is kept
+    in memory. A lookup on disk reads a single block and the
+    tail of its bucket, however large the bucket grows.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import os
+import array
+import bisect
+import shutil
+import tempfile
+import threading
+
+# Fingerprints are kept in arrays of unsigned longs, on
+# platforms where these are 32 bits the fingerprints are
+# shortened to fit
+FP_MASK = (1L << (8*array.array('L').itemsize)) - 1
+# Number of slots of an empty table
+MIN_SLOTS = 1 << 12
+# Number of hash functions of the Bloom filter
+BLOOM_HASHES = 7
+# Number of bucket files on disk
+NBUCKETS = 1024
+# Number of fingerprints of a bucket kept in memory
+# before they are written to its file
+BUCKET_BUFFER = 64
+# Maximum number of fingerprints in the unsorted tail
+# of a bucket file, the bucket is merged and sorted
+# when it would grow beyond that
+BUCKET_TAIL = 256
+# Number of fingerprints in a block of a sorted bucket
+BLOCK_SIZE = 512
+
+def fingerprint(urlhash):
+    """ Return the fingerprint of a url from its md5 hex
+    digest, as returned by get_url_hash. Fingerprints are
+    never zero, which marks empty slots in the table """
+
+    return int(urlhash[:16], 16) & FP_MASK or 1
+
+class HarvestManSeenSet(object):
+    """ Set of the hashes of urls seen in a crawl, using
+    at most the given memory in megabytes """
+
+    def __init__(self, memory=64, spooldir=None):
+        self.memory = memory
+        # Directory for the bucket files, created when
+        # the table is full
+        self.spooldir = spooldir
+        self.dirname = ''
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """ Remove all urls from the set """
+
+        self._table = array.array('L', [0])*MIN_SLOTS
+        self._mask = MIN_SLOTS - 1
+        self._count = 0
+        # Maximum number of slots of the table, three
+        # quarters of the memory go to the table
+        maxslots = MIN_SLOTS
+        while maxslots*2*self._table.itemsize <= self.memory*1024*1024*3/4:
+            maxslots *= 2
+        self._maxslots = maxslots
+        # Flag set when the table is full
+        self._full = False
+        # Bloom filter of the fingerprints on disk, created
+        # when the table is full
+        self._bloom = None
+        self._nbits = 0
+        # Number of fingerprints on disk and of lookups
+        # which went to disk
+        self._ondisk = 0
+        self.disklookups = 0
+        # Dictionary of bucket => array of fingerprints
+        # not yet written to disk
+        self._pending = {}
+        # Number of sorted fingerprints at the start of
+        # each bucket file and in the tail after them
+        self._sorted = array.array('l', [0])*NBUCKETS
+        self._tails = array.array('l', [0])*NBUCKETS
+        # Dictionary of bucket => array of the first
+        # fingerprint of each block of the bucket
+        self._blocks = {}
+        if self.dirname:
+            shutil.rmtree(self.dirname, True)
+            self.dirname = ''
+
+    def close(self):
+        """ Remove all urls from the set along with the
+        files of the set on disk """
+
+        self._lock.acquire()
+        try:
+            self.clear()
+        finally:
+            self._lock.release()
+
+    def __getstate__(self):
+        self._lock.acquire()
+        try:
+            # Fingerprints on disk are saved with the
+            # rest, the Bloom filter is rebuilt from them
+            ondisk = array.array('L')
+            for bucket in range(NBUCKETS):
+                ondisk.extend(self._read_bucket(bucket))
+            return { 'memory' : self.memory,
+                     'spooldir' : self.spooldir,
+                     'table' : self._table.tostring(),
+                     'count' : self._count,
+                     'full' : self._full,
+                     'ondisk' : ondisk.tostring() }
+        finally:
+            self._lock.release()
+
+    def __setstate__(self, state):
+        self.memory = state['memory']
+        self.spooldir = state['spooldir']
+        self.dirname = ''
+        self._lock = threading.Lock()
+        self.clear()
+
+        self._table = array.array('L')
+        self._table.fromstring(state['table'])
+        self._mask = len(self._table) - 1
+        self._count = state['count']
+        self._full = state['full']
+        ondisk = array.array('L')
+        ondisk.fromstring(state['ondisk'])
+        for fp in ondisk:
+            self._add_to_disk(fp)
+
+    def __len__(self):
+        return self._count + self._ondisk
+
+    def __contains__(self, urlhash):
+        fp = int(urlhash[:16], 16) & FP_MASK or 1
+        self._lock.acquire()
+        try:
+            if self._table[self._find(fp)] == fp:
+                return True
+            return self._ondisk > 0 and self._disk_contains(fp)
+        finally:
+            self._lock.release()
+
+    def add(self, urlhash):
+        """ Add the url with the given hash to the set. Returns
+        True if it was already in the set, else False """
+
+        fp = int(urlhash[:16], 16) & FP_MASK or 1
+        self._lock.acquire()
+        try:
+            slot = self._find(fp)
+            if self._table[slot] == fp or (self._ondisk and self._disk_contains(fp)):
+                return True
+
+            if self._full:
+                self._add_to_disk(fp)
+            else:
+                self._table[slot] = fp
+                self._count += 1
+                if self._count*4 > len(self._table)*3:
+                    if len(self._table) < self._maxslots:
+                        self._grow()
+                    else:
+                        self._full = True
+            return False
+        finally:
+            self._lock.release()
+
+    def _find(self, fp):
+        # Return the slot of the fingerprint in the table,
+        # or the empty slot where it would go
+        table = self._table
+        mask = self._mask
+        slot = fp & mask
+        while True:
+            value = table[slot]
+            if value == fp or value == 0:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        old = self._table
+        self._table = array.array('L', [0])*(len(old)*2)
+        self._mask = len(self._table) - 1
+        table = self._table
+        for fp in old:
+            if fp:
+                table[self._find(fp)] = fp
+
+    def _bloom_bits(self, fp):
+        # Bit positions of the fingerprint in the Bloom filter,
+        # by double hashing with the two halves of it
+        h1 = fp & 0xffffffff
+        h2 = (fp >> 32) | 1
+        nbits = self._nbits
+        return [(h1 + k*h2) % nbits for k in range(BLOOM_HASHES)]
+
+    def _disk_contains(self, fp):
+        if not self._ondisk:
+            return False
+
+        bloom = self._bloom
+        for bit in self._bloom_bits(fp):
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+
+        self.disklookups += 1
+        bucket = (fp >> 16) % NBUCKETS
+        pending = self._pending.get(bucket)
+        if pending and fp in pending:
+            return True
+
+        nsorted, ntail = self._sorted[bucket], self._tails[bucket]
+        if not nsorted and not ntail:
+            return False
+
+        itemsize = self._table.itemsize
+        f = open(os.path.join(self.dirname, 'bucket%d' % bucket), 'rb')
+        try:
+            # Block of the sorted part which can hold
+            # the fingerprint
+            block = bisect.bisect_right(self._blocks.get(bucket, ()), fp) - 1
+            if block >= 0:
+                start = block*BLOCK_SIZE
+                fps = array.array('L')
+                f.seek(start*itemsize)
+                fps.fromstring(f.read(min(BLOCK_SIZE, nsorted - start)*itemsize))
+                pos = bisect.bisect_left(fps, fp)
+                if pos < len(fps) and fps[pos] == fp:
+                    return True
+
+            if ntail:
+                fps = array.array('L')
+                f.seek(nsorted*itemsize)
+                fps.fromstring(f.read(ntail*itemsize))
+                return fp in fps
+            return False
+        finally:
+            f.close()
+
+    def _add_to_disk(self, fp):
+        if self._bloom is None:
+            # The rest of the memory goes to the Bloom filter
+            nbytes = max(self.memory*1024*1024/4, 1024)
+            self._bloom = array.array('B', [0])*nbytes
+            self._nbits = nbytes*8
+            if self.spooldir and not os.path.isdir(self.spooldir):
+                os.makedirs(self.spooldir)
+            self.dirname = tempfile.mkdtemp(prefix='seen', dir=self.spooldir)
+
+        bloom = self._bloom
+        for bit in self._bloom_bits(fp):
+            bloom[bit >> 3] |= (1 << (bit & 7))
+
+        bucket = (fp >> 16) % NBUCKETS
+        pending = self._pending.get(bucket)
+        if pending is None:
+            pending = self._pending[bucket] = array.array('L')
+        pending.append(fp)
+        if len(pending) >= BUCKET_BUFFER:
+            self._write_bucket(bucket, pending)
+            del self._pending[bucket]
+        self._ondisk += 1
+
+    def _write_bucket(self, bucket, fps):
+        # Write the fingerprints to the tail of the bucket,
+        # or merge them with the bucket if the tail is full
+        fname = os.path.join(self.dirname, 'bucket%d' % bucket)
+        if self._tails[bucket] + len(fps) <= BUCKET_TAIL:
+            f = open(fname, 'ab')
+            try:
+                fps.tofile(f)
+            finally:
+                f.close()
+            self._tails[bucket] += len(fps)
+            return
+
+        merged = self._read_bucket(bucket, False)
+        merged.extend(fps)
+        merged = array.array('L', sorted(merged))
+        f = open(fname, 'wb')
+        try:
+            merged.tofile(f)
+        finally:
+            f.close()
+        self._sorted[bucket] = len(merged)
+        self._tails[bucket] = 0
+        self._blocks[bucket] = merged[::BLOCK_SIZE]
+
+    def _read_bucket(self, bucket, pending=True):
+        # Return the fingerprints of a bucket on disk,
+        # along with those not yet written if pending
+        # is True
+        fps = array.array('L')
+        if self.dirname:
+            fname = os.path.join(self.dirname, 'bucket%d' % bucket)
+            if os.path.isfile(fname):
+                f = open(fname, 'rb')
+                try:
+                    fps.fromstring(f.read())
+                finally:
+                    f.close()
+        if pending and bucket in self._pending:
+            fps.extend(self._pending[bucket])
+        return fps
+
+def make_seen_set(hashes, memory=64, spooldir=None):
+    """ Return a seen set with the given url hashes, for
+    converting the dictionaries of url hashes saved by
+    earlier versions """
+
+    seen = HarvestManSeenSet(memory, spooldir)
+    for urlhash in hashes:
+        seen.add(urlhash)
+    return seen
@@ -0,0 +1,175 @@
+# -- coding: latin-1
+""" simhash.py - Module providing near-duplicate detection of
+    web pages. This is part of the HarvestMan program.
+
+    The text of a web page is split into overlapping shingles
+    of a few words and reduced to a 64 bit SimHash fingerprint.
+    Pages which differ only in small parts, such as timestamps,
+    session tokens or advertisements, have fingerprints which
+    differ in only a few bits.
+
+    Fingerprints are kept in an index split into bands. If two
+    fingerprints differ in at most k bits and are split into k+1
+    bands, at least one band is the same in both, so looking up
+    each band of a fingerprint in a hash table finds all stored
+    fingerprints within the Hamming distance k without comparing
+    against every page.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import re
+import md5
+import threading
+
+from collections import deque
+
+# Number of words in a shingle
+SHINGLE_SIZE = 4
+# Pages with fewer words than this are not fingerprinted,
+# since they are too short for their similarity to mean
+# anything (frameset pages, redirects etc)
+MIN_WORDS = 20
+
+# Script and style blocks, comments and tags
+markup_re = re.compile(r'<script.*?</script\s*>|<style.*?</style\s*>|<!--.*?-->|<[^>]*>',
+                       re.IGNORECASE|re.DOTALL)
+entity_re = re.compile(r'&#?\w+;')
+word_re = re.compile(r'\w+')
+
+# Binary digits of each byte value
+_bytebits = [''.join([str((x >> s) & 1) for s in range(7, -1, -1)]) for x in range(256)]
+
+def get_words(data):
+    """ Return the list of words in the text of the
+    web page data """
+
+    text = markup_re.sub(' ', data)
+    text = entity_re.sub(' ', text)
+    return word_re.findall(text.lower())
+
+def fingerprint(data):
+    """ Return the 64 bit SimHash fingerprint of the text
+    of the web page data, or None if the page has too
+    little text """
+
+    words = get_words(data)
+    if len(words) < MIN_WORDS:
+        return None
+
+    shingles = set()
+    for i in range(len(words) - SHINGLE_SIZE + 1):
+        shingles.add(' '.join(words[i:i+SHINGLE_SIZE]))
+
+    # Each bit of the fingerprint is set if it is set in
+    # the majority of the shingle hashes. The hashes are
+    # written as strings of binary digits, whose columns
+    # are counted.
+    hashes = []
+    for shingle in shingles:
+        digest = md5.new(shingle).digest()
+        hashes.append(''.join([_bytebits[ord(c)] for c in digest[:8]]))
+
+    half = len(hashes)/2.0
+    bits = ['01'[column.count('1') > half] for column in zip(*hashes)]
+    return long(''.join(bits), 2)
+
+def distance(fp1, fp2):
+    """ Return the Hamming distance between two fingerprints """
+
+    return bin(fp1 ^ fp2).count('1')
+
+class HarvestManSimHashIndex(object):
+    """ Bounded index of page fingerprints for finding
+    near-duplicate pages """
+
+    def __init__(self, distance=3, size=100000):
+        # Maximum number of bits in which the fingerprints
+        # of near-duplicate pages differ
+        self.distance = distance
+        # Maximum number of fingerprints in the index, the
+        # oldest ones are dropped beyond this
+        self.size = size
+        # (shift, mask) of each band of the fingerprint
+        self._bands = []
+        nbands = min(distance + 1, 64)
+        start = 0
+        for i in range(nbands):
+            width = 64/nbands + (i < 64 % nbands)
+            self._bands.append((start, (1L << width) - 1))
+            start += width
+        # One table per band, mapping the value of the
+        # band to a list of (fingerprint, key) entries
+        self._tables = [{} for band in self._bands]
+        # Entries in the order they were added
+        self._entries = deque()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d['_lock']
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def find(self, fp, key=None):
+        """ Return a fingerprint with the same key as the
+        given one within the Hamming distance of the index,
+        or None if there is no such fingerprint """
+
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for entry in table.get((fp >> shift) & mask, ()):
+                if entry[1] == key and distance(fp, entry[0]) <= self.distance:
+                    return entry[0]
+
+        return None
+
+    def add(self, fp, key=None):
+        """ Add a fingerprint with the given key to the index """
+
+        entry = (fp, key)
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((fp >> shift) & mask, []).append(entry)
+        self._entries.append(entry)
+
+        while len(self._entries) > self.size:
+            self.remove(self._entries.popleft())
+
+    def remove(self, entry):
+        fp = entry[0]
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            band = (fp >> shift) & mask
+            bucket = table[band]
+            bucket.remove(entry)
+            if not bucket:
+                del table[band]
+
+    def check(self, fp, key=None):
+        """ Return True if a near-duplicate of the fingerprint
+        with the given key is in the index, else add the
+        fingerprint to the index and return False """
+
+        self._lock.acquire()
+        try:
+            if self.find(fp, key) is not None:
+                return True
+            self.add(fp, key)
+            return False
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        for table in self._tables:
+            table.clear()
+        self._entries.clear()
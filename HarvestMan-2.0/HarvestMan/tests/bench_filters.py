@@ -0,0 +1,123 @@
+# -- coding: latin-1
+""" Benchmark of the url filters and the junk filter, comparing
+a loop over the compiled rules with the combined matcher.
+
+Usage: python bench_filters.py [-n urls]
+
+The junk filter is run with its default lists of blocked domains
+and block patterns, once with a list lookup for the domains and a
+loop over the patterns, as done by earlier versions, and once as
+it is now. The url filters are run with a filter string of a dozen
+rules. Urls per second of each are printed, along with the number
+of urls blocked. The junk filter blocks more urls than earlier
+versions, since these blocked subdomains only of blocked domains
+of two parts such as doubleclick.net.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import re
+import time
+import random
+import getopt
+
+test_base.setUp()
+
+from rules import HarvestManRulesChecker, HarvestManFilterMatcher, JunkFilter
+from urlparser import HarvestManUrlParser
+
+URLFILTER = '-*.gif-*.jpg-*.png-*.css-*.js-/cgi-bin/-/images/-/print/-/login-*.pdf+/docs/+/lib/*.html'
+
+HOSTS = ['www.foo.com', 'docs.python.org', 'www.bar.org:8080', 'news.baz.net',
+         'mirror.foo.co.uk', 'www.python.org']
+WORDS = ['docs', 'lib', 'news', 'archive', 'tutorial', 'api', 'images', 'about',
+         'download', 'search', 'index', 'faq', 'release', 'cgi-bin', 'static']
+# Path names of the kind the block patterns are for
+JUNK = ['ads', 'banner', 'counter.cgi', 'adverts', 'promotions', 'popupads', 'sponsors']
+
+def make_urls(n):
+    random.seed(n)
+    domains = JunkFilter.block_domains
+    urls = []
+    for x in range(n):
+        r = random.random()
+        if r < 0.05:
+            host = random.choice(domains)
+        elif r < 0.1:
+            host = 'cdn.' + random.choice(domains)
+        else:
+            host = random.choice(HOSTS)
+        path = [random.choice(WORDS) for y in range(random.randint(1, 4))]
+        if random.random() < 0.1:
+            path.insert(random.randint(0, len(path)), random.choice(JUNK))
+        fname = 'page%d.%s' % (x, random.choice(('html', 'html', 'php', 'gif', 'jpg')))
+        urls.append('http://%s/%s/%s' % (host, '/'.join(path), fname))
+    return urls
+
+class LoopJunkFilter(object):
+    """ Junk filter of earlier versions """
+
+    def __init__(self):
+        self.block_domains = JunkFilter.block_domains
+        self.block_patterns = JunkFilter.block_patterns
+        self.patterns = map(re.compile, self.block_patterns)
+        self.base_domains = map(self.base_domain, self.block_domains)
+
+    def base_domain(self, domain):
+        if domain.count(".") > 1:
+            strings = domain.split(".")
+            return "".join((strings[-2], strings[-1]))
+        else:
+            return domain
+
+    def check(self, url_obj):
+        if url_obj.get_domain_with_port() in self.block_domains:
+            return False
+        if url_obj.get_base_domain_with_port() in self.base_domains:
+            return False
+
+        url = url_obj.get_full_url()
+        for p in self.patterns:
+            if p.search(url):
+                return False
+        return True
+
+def loop_filter(filters, url):
+    for f in filters:
+        if f.search(url):
+            return True
+    return False
+
+def bench(name, func, items):
+    t = time.time()
+    blocked = len([item for item in items if func(item)])
+    t = time.time() - t
+    print '%24s %10d %12d %10d' % (name, len(items), len(items)/t, blocked)
+    return t
+
+def main(n):
+    urls = make_urls(n)
+    urlobjs = [HarvestManUrlParser(url) for url in urls]
+
+    print '%24s %10s %12s %10s' % ('filter', 'urls', 'urls/s', 'blocked')
+    loopjunk, junk = LoopJunkFilter(), JunkFilter()
+    t1 = bench('junk filter, loops', lambda u: not loopjunk.check(u), urlobjs)
+    t2 = bench('junk filter, matcher', lambda u: not junk.check(u), urlobjs)
+    print 'Speedup: %.1f' % (t1/t2)
+
+    # Rules as compiled by the rules checker
+    checker = HarvestManRulesChecker()
+    incl, excl, all = checker._make_filter(URLFILTER)
+    checker.clean_up()
+    rules = incl + excl
+    matcher = HarvestManFilterMatcher(rules, re.IGNORECASE)
+    t1 = bench('url filter, loops', lambda u: loop_filter(rules, u), urls)
+    t2 = bench('url filter, matcher', lambda u: matcher.search(u) != -1, urls)
+    print 'Speedup: %.1f' % (t1/t2)
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    opts = dict(opts)
+    main(int(opts.get('-n', 20000)))
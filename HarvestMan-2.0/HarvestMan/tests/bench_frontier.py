@@ -0,0 +1,84 @@
+# -- coding: latin-1
+""" Benchmark comparing the heap based crawl frontier with
+the older bisect/MyDeque based priority queue.
+
+Usage: python bench_frontier.py [size1 size2 ...]
+
+The legacy queue does an O(n) insertion for every push, so
+by default it is only timed up to 10000 entries. Pass
+--legacy-all to time it at every size.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import random
+import bisect
+
+test_base.setUp()
+
+from Queue import Queue
+from common.common import MyDeque
+from frontier import HarvestManFrontier
+
+class LegacyPriorityQueue(Queue):
+    """ The older priority queue based on bisect module """
+
+    def _init(self, maxsize):
+        self.maxsize = maxsize
+        self.queue = MyDeque()
+
+    def _put(self, item):
+        bisect.insort(self.queue, item)
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _get(self):
+        return self.queue.pop(0)
+
+class Url(object):
+    """ Stand-in for a url object """
+    pass
+
+def make_items(n):
+    # Url priorities fall in a small range, so there
+    # are lots of ties.
+    random.seed(n)
+    return [(random.randint(-5, 5), Url()) for x in xrange(n)]
+
+def bench(klass, items):
+    q = klass(0)
+    t1 = time.time()
+    for item in items:
+        q.put(item)
+    t2 = time.time()
+    for x in xrange(len(items)):
+        q.get()
+    t3 = time.time()
+
+    return (t2 - t1, t3 - t2)
+
+def main(sizes, legacy_limit):
+    print '%10s %12s %12s %12s %12s' % ('entries', 'queue', 'push (s)', 'pop (s)', 'usec/op')
+    for n in sizes:
+        items = make_items(n)
+        for name, klass in (('heap', HarvestManFrontier), ('bisect', LegacyPriorityQueue)):
+            if klass is LegacyPriorityQueue and legacy_limit and n > legacy_limit:
+                print '%10d %12s %12s' % (n, name, 'skipped')
+                continue
+            tput, tget = bench(klass, items)
+            print '%10d %12s %12.3f %12.3f %12.2f' % (n, name, tput, tget,
+                                                    1000000.0*(tput + tget)/(2*n))
+
+if __name__=="__main__":
+    args = sys.argv[1:]
+    legacy_limit = 10000
+    if '--legacy-all' in args:
+        args.remove('--legacy-all')
+        legacy_limit = 0
+
+    sizes = [int(x) for x in args] or [10000, 100000, 1000000]
+    main(sizes, legacy_limit)
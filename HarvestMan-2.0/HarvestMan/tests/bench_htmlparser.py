@@ -0,0 +1,93 @@
+# -- coding: latin-1
+""" Benchmark comparing the throughput of the html parsers
+for web pages.
+
+Usage: python bench_htmlparser.py [-n pages] [directory]
+
+Pages are read from the html files in the given directory,
+or generated if no directory is given. The sgmlop parser is
+timed only if the sgmlop module is available.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import glob
+import random
+import getopt
+
+test_base.setUp()
+
+import pageparser
+
+def make_page(n):
+    # A page with nested layout markup, most of whose tags
+    # are not of interest to the parser
+    random.seed(n)
+    parts = ['<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN">\n',
+             '<html><head><title>Page %d</title>\n' % n,
+             '<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">\n',
+             '<link rel="stylesheet" href="/css/style%d.css" type="text/css">\n' % (n % 10),
+             '<script type="text/javascript" src="/js/site.js"></script></head>\n<body>\n',
+             '<table class="layout" width="100%" cellpadding="0" cellspacing="0">\n']
+    for x in range(150):
+        parts.append('<tr class="row%d"><td class="cell" align="left" valign="top">' % (x % 2))
+        parts.append('<span class="text" style="color: #333">Some text &amp; more text for row %d</span>' % x)
+        if x % 3 == 0:
+            parts.append('<a href="%s/page%d.html" title="Link %d">link</a>' % (random.choice(('', '/docs', 'sub', '..')),
+                                                                           random.randint(0, 100000), x))
+        if x % 10 == 0:
+            parts.append('<img src="/images/%d/%d.png" alt="image" width="10" height="10">' % (n, x))
+        parts.append('</td></tr>\n')
+    parts.append('</table></body></html>\n')
+    return ''.join(parts)
+
+def load_pages(dirname, n):
+    pages = []
+    for fname in glob.glob(os.path.join(dirname, '*.htm*')):
+        pages.append(open(fname, 'rb').read())
+    if not pages:
+        sys.exit('No html files in %s' % dirname)
+    return (pages*(n/len(pages) + 1))[:n]
+
+def bench(klass, pages):
+    p = klass()
+    nlinks = 0
+    t = time.time()
+    for data in pages:
+        p.reset()
+        try:
+            p.feed(data)
+            p.close()
+        except pageparser.SGMLParseError:
+            pass
+        nlinks += len(p.links) + len(p.images)
+
+    return time.time() - t, nlinks
+
+def main(pages):
+    size = sum([len(data) for data in pages])/(1024.0*1024.0)
+    parsers = [('sgmllib', pageparser.HarvestManSimpleParser),
+               ('regex', pageparser.HarvestManFastParser)]
+    try:
+        import sgmlop
+        parsers.append(('sgmlop', pageparser.HarvestManSGMLOpParser))
+    except ImportError:
+        pass
+
+    print '%10s %10s %10s %12s %12s %10s' % ('parser', 'pages', 'links', 'time (s)', 'pages/sec', 'MB/sec')
+    for name, klass in parsers:
+        t, nlinks = bench(klass, pages)
+        print '%10s %10d %10d %12.3f %12.1f %10.2f' % (name, len(pages), nlinks, t, len(pages)/t, size/t)
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    npages = int(dict(opts).get('-n', 200))
+
+    if args:
+        pages = load_pages(args[0], npages)
+    else:
+        pages = [make_page(x) for x in range(npages)]
+    main(pages)
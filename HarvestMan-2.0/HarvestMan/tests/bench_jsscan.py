@@ -0,0 +1,96 @@
+# -- coding: latin-1
+""" Benchmark of the javascript processing of web pages,
+comparing a separate javascript pass over the whole page
+with the processing of the <script> blocks collected by
+the html parser.
+
+Usage: python bench_jsscan.py [-n pages] [directory]
+
+Pages are read from the html files in the given directory,
+or generated if no directory is given. Half of the generated
+pages have <script> blocks, one in ten has a javascript
+redirection.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import glob
+import random
+import getopt
+
+test_base.setUp()
+
+import pageparser
+import parsepool
+
+def make_page(n):
+    random.seed(n)
+    parts = ['<html><head><title>Page %d</title>\n' % n]
+    if n % 2 == 0:
+        parts.append('<script type="text/javascript">\n')
+        for x in range(50):
+            parts.append('var v%d = document.getElementById("e%d");\n' % (x, x))
+        if n % 10 == 0:
+            parts.append('window.location.replace("http://www.foo.com/moved%d.html");\n' % n)
+        parts.append('</script>\n')
+    parts.append('</head><body>\n')
+    for x in range(200):
+        parts.append('<p>Some text for paragraph %d of page %d ' % (x, n))
+        parts.append('<a href="%s/page%d.html">link %d</a></p>\n' % (random.choice(('', '/docs', 'sub', '..')),
+                                                                random.randint(0, 100000), x))
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+def load_pages(dirname, n):
+    pages = []
+    for fname in glob.glob(os.path.join(dirname, '*.htm*')):
+        pages.append(open(fname, 'rb').read())
+    if not pages:
+        sys.exit('No html files in %s' % dirname)
+    return (pages*(n/len(pages) + 1))[:n]
+
+def parse_twice(data, url, wp):
+    # Javascript parser run over the whole page,
+    # followed by the html parser
+    links = []
+    js = pageparser.HarvestManJSParser()
+    js.feed(data)
+    if js.redirectedurl:
+        links.append(js.redirectedurl)
+    wp.reset()
+    try:
+        wp.feed(data)
+        wp.close()
+    except pageparser.SGMLParseError:
+        pass
+    return links + wp.links
+
+def parse_once(data, url, wp):
+    return parsepool.parse_page(data, url, wp).links
+
+def bench(func, pages):
+    wp = pageparser.make_html_parser()
+    nlinks = 0
+    t = time.clock()
+    for data in pages:
+        nlinks += len(func(data, 'http://www.foo.com/', wp))
+    return time.clock() - t, nlinks
+
+def main(pages):
+    print '%10s %10s %10s %12s %14s' % ('scan', 'pages', 'links', 'cpu (s)', 'ms/page')
+    for name, func in (('separate', parse_twice), ('single', parse_once)):
+        t, nlinks = bench(func, pages)
+        print '%10s %10d %10d %12.3f %14.3f' % (name, len(pages), nlinks, t, 1000*t/len(pages))
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    npages = int(dict(opts).get('-n', 200))
+
+    if args:
+        pages = load_pages(args[0], npages)
+    else:
+        pages = [make_page(x) for x in range(npages)]
+    main(pages)
@@ -0,0 +1,78 @@
+# -- coding: latin-1
+""" Benchmark of the bookkeeping of the data manager for
+downloaded urls, comparing the earlier lists of done urls,
+saved files and failed urls with the download ledger.
+
+Usage: python bench_ledger.py [-n urls]
+
+For each url, the url is checked and marked as done, its
+file is checked and added to the saved files and the url
+is removed from the failed urls, as the data manager does
+for a download. One url in twenty fails.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import getopt
+
+test_base.setUp()
+
+from common.common import MyDeque
+from ledger import HarvestManDownloadLedger
+
+class FailedUrl(object):
+
+    def __init__(self, url):
+        self.url = url
+        self.status = 404
+
+    def get_full_url(self):
+        return self.url
+
+def deque_downloads(urls):
+    # The earlier implementation
+    doneurls, savedfiles, failedurls = MyDeque(), MyDeque(), MyDeque()
+    for x, (url, filename) in enumerate(urls):
+        try:
+            doneurls.index(url)
+        except ValueError:
+            doneurls.append(url)
+        if x % 20 == 0:
+            try:
+                failedurls.index(url)
+            except ValueError:
+                failedurls.append(url)
+        else:
+            if not filename in savedfiles:
+                savedfiles.append(filename)
+            try:
+                failedurls.index(url)
+                failedurls.remove(url)
+            except ValueError:
+                pass
+
+def ledger_downloads(urls):
+    dledger = HarvestManDownloadLedger()
+    for x, (url, filename) in enumerate(urls):
+        dledger.mark_done(url)
+        if x % 20 == 0:
+            dledger.mark_failed(FailedUrl(url))
+        else:
+            dledger.mark_saved(url, filename, 1)
+
+def main(n):
+    urls = [('http://www.foo.com/docs/page%d.html' % x, '/tmp/project/docs/page%d.html' % x)
+            for x in range(n)]
+    print '%10s %10s %12s %14s' % ('store', 'urls', 'cpu (s)', 'us per url')
+    for name, func in (('deque', deque_downloads), ('ledger', ledger_downloads)):
+        t = time.clock()
+        func(urls)
+        t = time.clock() - t
+        print '%10s %10d %12.3f %14.1f' % (name, n, t, 1000000*t/n)
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    main(int(dict(opts).get('-n', 20000)))
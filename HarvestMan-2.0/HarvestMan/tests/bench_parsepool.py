@@ -0,0 +1,104 @@
+# -- coding: latin-1
+""" Benchmark of parsing web pages by the fetcher threads
+against parsing them in a pool of worker processes.
+
+Usage: python bench_parsepool.py [-t threads] [-n pages] [directory]
+
+Pages are read from the html files in the given directory,
+or generated if no directory is given. Each page is parsed
+by one of a number of threads standing in for the fetchers,
+and the pages parsed per second are reported for inline
+parsing and for pools of 1, 2, 4 and 8 workers.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import glob
+import random
+import threading
+import getopt
+
+test_base.setUp()
+
+import parsepool
+
+def make_page(n):
+    # A page of moderate size with a few hundred links
+    # and images, some of them relative
+    random.seed(n)
+    parts = ['<html><head><title>Page %d</title>' % n,
+             '<link rel="stylesheet" href="/css/style%d.css">' % (n % 10),
+             '<script src="/js/site.js"></script></head><body>']
+    for x in range(200):
+        if x % 5 == 0:
+            parts.append('<img src="/images/%d/%d.png" alt="image">' % (n, x))
+        parts.append('<p>Some text for paragraph %d of page %d ' % (x, n))
+        parts.append('<a href="%s/page%d.html">link %d</a></p>' % (random.choice(('', '/docs', 'sub', '..')),
+                                                              random.randint(0, 100000), x))
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+def load_pages(dirname, n):
+    pages = []
+    for fname in glob.glob(os.path.join(dirname, '*.htm*')):
+        pages.append(open(fname, 'rb').read())
+    if not pages:
+        sys.exit('No html files in %s' % dirname)
+    return (pages*(n/len(pages) + 1))[:n]
+
+def bench(pages, nthreads, pool=None):
+    pages = pages[:]
+    lock = threading.Lock()
+
+    def fetcher():
+        while True:
+            lock.acquire()
+            try:
+                if not pages: return
+                data = pages.pop()
+            finally:
+                lock.release()
+
+            url = 'http://www.foo.com/index.html'
+            info = None
+            if pool:
+                info = pool.parse(data, url)
+            if info is None:
+                info = parsepool.parse_page(data, url)
+
+    threads = [threading.Thread(target=fetcher) for x in range(nthreads)]
+    t = time.time()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    return time.time() - t
+
+def main(pages, nthreads):
+    print '%10s %10s %12s %12s' % ('workers', 'pages', 'time (s)', 'pages/sec')
+    n = len(pages)
+    t = bench(pages, nthreads)
+    print '%10s %10d %12.3f %12.1f' % ('inline', n, t, n/t)
+    for workers in (1, 2, 4, 8):
+        pool = parsepool.HarvestManParserPool(workers)
+        # Start up time of the workers is not counted
+        pool.parse(pages[0], 'http://www.foo.com/')
+        t = bench(pages, nthreads, pool)
+        pool.close()
+        print '%10d %10d %12.3f %12.1f' % (workers, n, t, n/t)
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 't:n:')
+    opts = dict(opts)
+    nthreads = int(opts.get('-t', 10))
+    npages = int(opts.get('-n', 500))
+
+    if args:
+        pages = load_pages(args[0], npages)
+    else:
+        pages = [make_page(x) for x in range(npages)]
+    main(pages, nthreads)
@@ -0,0 +1,94 @@
+# -- coding: latin-1
+""" Benchmark of the set of urls seen in a crawl, comparing
+a dictionary of url hashes with the seen set.
+
+Usage: python bench_seenset.py [-n urls] [-m memory] [-s set]
+
+The hashes of the given number of urls are added to each set,
+and then looked up along with as many hashes of urls which were
+not added. Memory per million urls and lookups per second are
+printed. The seen set is run with 64 megabytes of memory, which
+keeps up to three million urls in memory, and with the given
+memory in megabytes, with which the rest of the urls go to disk.
+Each set is run in a process of its own, so that the memory of
+one does not affect the others, or only the set given by -s
+(dict, seen or disk) is run.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import md5
+import time
+import shutil
+import getopt
+import subprocess
+import tempfile
+
+test_base.setUp()
+
+from seenset import HarvestManSeenSet
+from bench_urlmemory import get_memory
+
+def make_hashes(start, end):
+    return [md5.new('http://www.foo.com/page%d.html' % x).hexdigest() for x in xrange(start, end)]
+
+class DictSet(dict):
+
+    def add(self, urlhash):
+        if urlhash in self:
+            return True
+        self[urlhash] = 1
+        return False
+
+def bench(name, seen, hashes, others):
+    mem = get_memory()
+    t = time.time()
+    for urlhash in hashes:
+        seen.add(urlhash)
+    addtime = time.time() - t
+    mem = get_memory() - mem
+
+    t = time.time()
+    found = len([urlhash for urlhash in hashes if urlhash in seen])
+    notfound = len([urlhash for urlhash in others if urlhash not in seen])
+    looktime = time.time() - t
+    assert found == len(hashes) and notfound == len(others)
+
+    n = len(hashes)
+    print '%10s %10d %14.1f %14d %14d %10d' % (name, n, mem*1000000.0/n/(1024*1024),
+                                                n/addtime, 2*n/looktime,
+                                                getattr(seen, 'disklookups', 0))
+
+def main(n, memory, name):
+    hashes = make_hashes(0, n)
+    others = make_hashes(n, 2*n)
+    spooldir = tempfile.mkdtemp()
+
+    try:
+        if name == 'dict':
+            bench(name, DictSet(), hashes, others)
+        else:
+            if name == 'disk':
+                seen = HarvestManSeenSet(memory, spooldir)
+            else:
+                seen = HarvestManSeenSet(64, spooldir)
+            bench(name, seen, hashes, others)
+            seen.close()
+    finally:
+        shutil.rmtree(spooldir, True)
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:m:s:')
+    opts = dict(opts)
+    n, memory = int(opts.get('-n', 1000000)), int(opts.get('-m', 4))
+
+    if '-s' in opts:
+        main(n, memory, opts['-s'])
+    else:
+        print '%10s %10s %14s %14s %14s %10s' % ('set', 'urls', 'MB/1M urls', 'adds/s',
+                                                 'lookups/s', 'disk')
+        sys.stdout.flush()
+        for name in ('dict', 'seen', 'disk'):
+            subprocess.call([sys.executable, __file__, '-n', str(n), '-m', str(memory), '-s', name])
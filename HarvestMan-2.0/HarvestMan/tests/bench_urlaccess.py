@@ -0,0 +1,58 @@
+# -- coding: latin-1
+""" Profile of the url object accessors used when a url
+is checked, downloaded and saved.
+
+Usage: python bench_urlaccess.py [-n urls] [-r repeats]
+
+Creates url objects for links of generated pages and calls
+get_full_url, get_url_hash, get_domain_hash and get_full_filename
+on each of them a number of times, about as often as the rules
+checker, data manager, url threads and connectors do for a
+downloaded url, and prints the profile of these accessors.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import getopt
+import cProfile
+import pstats
+
+test_base.setUp()
+
+from urlparser import HarvestManUrlParser
+from urltypes import *
+from bench_urlmemory import make_links
+
+ACCESSORS = ('get_full_url', 'get_url_hash', 'get_domain_hash', 'get_full_filename')
+
+def make_urls(n):
+    urls = []
+    base = HarvestManUrlParser('http://www.foo.com/docs/current/index.html',
+                               TYPE_WEBPAGE, 0, None, '/tmp/project')
+    while len(urls) < n:
+        for typ, url in make_links(len(urls)):
+            urls.append(HarvestManUrlParser(url, typ, False, base))
+    return urls[:n]
+
+def access(urls, repeats):
+    for urlobj in urls:
+        for x in range(repeats):
+            urlobj.get_full_url()
+            urlobj.get_url_hash()
+            urlobj.get_domain_hash()
+            urlobj.get_full_filename()
+
+def main(n, repeats):
+    urls = make_urls(n)
+    prof = cProfile.Profile()
+    prof.runcall(access, urls, repeats)
+    stats = pstats.Stats(prof)
+    stats.sort_stats('cumulative')
+    stats.print_stats('|'.join(ACCESSORS))
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:r:')
+    opts = dict(opts)
+    main(int(opts.get('-n', 20000)), int(opts.get('-r', 10)))
@@ -0,0 +1,89 @@
+# -- coding: latin-1
+""" Benchmark of the memory used by url objects.
+
+Usage: python bench_urlmemory.py [-n urls] [-m memory]
+
+Creates url objects for links of a number of generated pages
+and keeps them in a dictionary keyed on their index, like the
+url dictionary of the data manager, and reports the memory used
+per url. The default is one million urls.
+
+If a memory limit is given, the url objects are kept in a url
+store which keeps that many url objects in memory and the rest
+in a url database in the temp directory.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import random
+import getopt
+import resource
+import tempfile
+
+test_base.setUp()
+
+from urlparser import HarvestManUrlParser
+from urlstore import HarvestManUrlStore
+from urltypes import *
+
+def get_memory():
+    """ Return the resident memory of this process in bytes """
+
+    try:
+        pages = int(open('/proc/self/statm').read().split()[1])
+        return pages*resource.getpagesize()
+    except (IOError, OSError, ValueError, IndexError):
+        # Peak memory in kilobytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+def make_links(n):
+    random.seed(n)
+    dirs = ['docs', 'images', 'lib', 'news', 'archive', '2007', 'tutorial', 'api']
+    links = []
+    for x in range(50):
+        depth = random.randint(0, 3)
+        path = '/'.join([random.choice(dirs) for y in range(depth)] + ['page%d.html' % random.randint(0, 10**6)])
+        if x % 5 == 0:
+            links.append((TYPE_IMAGE, '../images/img%d.gif' % random.randint(0, 10**6)))
+        elif x % 7 == 0:
+            links.append((TYPE_ANY, 'http://www.site%d.com/%s' % (random.randint(0, 100), path)))
+        else:
+            links.append((TYPE_ANY, path))
+    return links
+
+def main(n, memory):
+    if memory:
+        store = HarvestManUrlStore()
+        store.open(os.path.join(tempfile.gettempdir(), 'urls.db'), memory)
+    else:
+        urldict = {}
+    bases = [HarvestManUrlParser('http://www.foo%d.com/docs/current/index.html' % x,
+                                 TYPE_WEBPAGE, 0, None, '/tmp/project') for x in range(20)]
+    mem = get_memory()
+    t = time.time()
+    count = 0
+    while count < n:
+        base = bases[count % len(bases)]
+        for typ, url in make_links(count):
+            urlobj = HarvestManUrlParser(url, typ, False, base)
+            urlobj.set_index()
+            if memory:
+                store.add(urlobj)
+            else:
+                urldict[str(urlobj.index)] = urlobj
+            count += 1
+
+    t = time.time() - t
+    mem = get_memory() - mem
+    print '%10s %12s %14s %10s' % ('urls', 'memory (MB)', 'bytes per url', 'time (s)')
+    print '%10d %12.1f %14d %10.1f' % (count, mem/(1024.0*1024), mem/count, t)
+    if memory:
+        store.close()
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:m:')
+    opts = dict(opts)
+    main(int(opts.get('-n', 1000000)), int(opts.get('-m', 0)))
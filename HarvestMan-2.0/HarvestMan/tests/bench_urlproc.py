@@ -0,0 +1,77 @@
+# -- coding: latin-1
+""" Benchmark of the replacement of entities in urls, comparing
+the earlier loop over all entity strings with the single regular
+expression substitution of urlproc.modify_url.
+
+Usage: python bench_urlproc.py [-n urls] [directory]
+
+Urls are read from the links of the html files in the given
+directory, or of the html corpus of the tests if no directory
+is given. Query urls with entities in them are added to these,
+one in five urls.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import re
+import time
+import glob
+import random
+import getopt
+import unicodedata
+
+test_base.setUp()
+
+import urlproc
+
+link_re = re.compile(r'''(?:href|src)\s*=\s*["']?([^"'\s>]+)''', re.IGNORECASE)
+
+def loop_modify_url(url):
+    # The earlier implementation
+    url = url.rstrip()
+    for ampersand_string, ucode_name in zip(urlproc.ampersand_strings, urlproc.char_names):
+        if url.find(ampersand_string) != -1:
+            ucode_char = unicodedata.lookup(ucode_name)
+            url = url.encode('utf-8')
+            url = url.replace(ampersand_string, ucode_char)
+
+    return url
+
+def load_urls(dirname, n):
+    urls = []
+    for fname in glob.glob(os.path.join(dirname, '*.htm*')):
+        urls.extend(link_re.findall(open(fname, 'rb').read()))
+    if not urls:
+        sys.exit('No links in html files in %s' % dirname)
+
+    random.seed(n)
+    for x in range(len(urls)/4):
+        urls.append('http://www.foo.com/search.php?q=item%d&amp;page=%d&amp;lang=en' % (x, random.randint(1, 20)))
+    random.shuffle(urls)
+    return (urls*(n/len(urls) + 1))[:n]
+
+def bench(func, urls):
+    t = time.clock()
+    for url in urls:
+        func(url)
+    return time.clock() - t
+
+def main(urls):
+    nentities = len([url for url in urls if '&' in url])
+    print '%d urls, %d with entities' % (len(urls), nentities)
+    print '%10s %12s %14s' % ('replace', 'cpu (s)', 'us per url')
+    for name, func in (('loop', loop_modify_url), ('regex', urlproc.modify_url)):
+        t = bench(func, urls)
+        print '%10s %12.3f %14.2f' % (name, t, 1000000*t/len(urls))
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    nurls = int(dict(opts).get('-n', 100000))
+
+    if args:
+        dirname = args[0]
+    else:
+        dirname = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'htmlcorpus')
+    main(load_urls(dirname, nurls))
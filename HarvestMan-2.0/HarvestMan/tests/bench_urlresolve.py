@@ -0,0 +1,66 @@
+# -- coding: latin-1
+""" Benchmark of creating url objects for the links of
+web pages with and without the url resolution cache.
+
+Usage: python bench_urlresolve.py [-n pages] [-s cachesize]
+
+Url objects are created with the resolution cache disabled
+and then with a cache of the given size.
+
+Each generated page has a set of navigation links, which
+are the same on all pages of a directory, and a few links
+of its own.
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import sys, os
+import time
+import random
+import getopt
+
+test_base.setUp()
+
+from urlparser import HarvestManUrlParser, HarvestManResolutionCache
+from urltypes import *
+
+NAVLINKS = ['../index.html', '../../about/', 'news.html', '/contact.html', '/css/site.css',
+            '../images/logo.gif', 'http://www.foo.com/search.php', 'toc.html#top',
+            '/docs/', '../archive/2007/']
+
+def make_pages(n):
+    random.seed(n)
+    pages = []
+    dirs = ['docs', 'lib', 'news', 'archive', 'tutorial', 'api']
+    for x in range(n):
+        path = '/'.join([random.choice(dirs) for y in range(random.randint(1, 3))])
+        page = 'http://www.foo.com/%s/page%d.html' % (path, x)
+        links = [(TYPE_ANY, url) for url in NAVLINKS]
+        links += [(TYPE_ANY, 'item%d.html' % random.randint(0, 10**6)) for y in range(10)]
+        links.append((TYPE_IMAGE, 'img%d.png' % random.randint(0, 10**6)))
+        pages.append((page, links))
+    return pages
+
+def create(pages):
+    t = time.clock()
+    for page, links in pages:
+        base = HarvestManUrlParser(page, TYPE_WEBPAGE, 0, None, '/tmp/project')
+        for typ, url in links:
+            HarvestManUrlParser(url, typ, False, base)
+    return time.clock() - t
+
+def main(n, size):
+    pages = make_pages(n)
+    nurls = sum([len(links) + 1 for page, links in pages])
+
+    print '%10s %10s %12s %14s %10s' % ('cache', 'urls', 'cpu (s)', 'us per url', 'hits (%)')
+    for cachesize in (0, size):
+        cache = HarvestManUrlParser.resolutioncache = HarvestManResolutionCache(cachesize)
+        t = create(pages)
+        print '%10d %10d %12.3f %14.1f %10.1f' % (cachesize, nurls, t, 1000000*t/nurls, cache.hit_rate())
+
+if __name__=="__main__":
+    opts, args = getopt.getopt(sys.argv[1:], 'n:s:')
+    opts = dict(opts)
+    main(int(opts.get('-n', 5000)), int(opts.get('-s', 10000)))
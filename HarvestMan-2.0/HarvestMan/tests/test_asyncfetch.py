@@ -0,0 +1,202 @@
+# -- coding: latin-1
+""" Unit test for asyncfetch module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import time
+import gzip
+import cStringIO
+import tempfile
+import shutil
+import threading
+import BaseHTTPServer
+import SocketServer
+
+test_base.setUp()
+
+from common.common import GetObject, SetObject
+from urltypes import TYPE_ANY
+
+class HttpTestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Handler for the local test server """
+
+    def do_GET(self):
+        path = self.path
+        if path.startswith('/slow'):
+            time.sleep(0.5)
+            self.send_data('<html>%s</html>' % path)
+        elif path.startswith('/page'):
+            self.send_data('<html><body><a href="%s">link</a></body></html>' % path)
+        elif path == '/gzip.html':
+            f = cStringIO.StringIO()
+            gz = gzip.GzipFile(fileobj=f, mode='wb')
+            gz.write('<html>compressed</html>')
+            gz.close()
+            self.send_data(f.getvalue(), [('Content-Encoding', 'gzip')])
+        elif path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/page1.html')
+            self.end_headers()
+        elif path == '/cached.html':
+            if self.headers.get('If-Modified-Since'):
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_data('<html>cached</html>')
+        elif path == '/big.bin':
+            self.send_data('x'*5000)
+        else:
+            self.send_error(404)
+
+    def send_data(self, data, headers=[]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(data)))
+        for key, val in headers:
+            self.send_header(key, val)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class HttpTestServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 100
+
+class TestHarvestManAsyncEngine(unittest.TestCase):
+    """ Unit test class for HarvestManAsyncEngine class """
+
+    import asyncfetch
+    from urlparser import HarvestManUrlParser
+
+    def setUp(self):
+        import datamgr, rules
+
+        self.server = HttpTestServer(('127.0.0.1', 0), HttpTestHandler)
+        self.port = self.server.server_address[1]
+        t = threading.Thread(target=self.server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+        self.projdir = tempfile.mkdtemp()
+        cfg = GetObject('config')
+        cfg.projdir = self.projdir
+        cfg.retryfailed = 1
+        cfg.maxfilesize = 1000
+        SetObject(datamgr.HarvestManDataManager())
+        SetObject(rules.HarvestManRulesChecker())
+
+    def stop_server(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def tearDown(self):
+        self.stop_server()
+        shutil.rmtree(self.projdir, True)
+
+    def make_url(self, path):
+        url = 'http://127.0.0.1:%d%s' % (self.port, path)
+        urlobj = self.HarvestManUrlParser(url, TYPE_ANY, rootdir=self.projdir)
+        urlobj.set_index()
+        return urlobj
+
+    def fetch(self, paths, maxconns=100, lmt=-1):
+        engine = self.asyncfetch.HarvestManAsyncEngine(maxconns)
+        urlobjs = [self.make_url(path) for path in paths]
+        for urlobj in urlobjs:
+            engine.fetch(urlobj, lmt)
+
+        responses = {}
+        endtime = time.time() + 10.0
+        while len(responses) < len(urlobjs) and time.time() < endtime:
+            for urlobj, resp in engine.poll(0.1):
+                responses[urlobj.index] = resp
+        engine.close()
+
+        return [responses.get(u.index) for u in urlobjs]
+
+    def test_concurrent(self):
+        # Requests which take half a second each are
+        # made in parallel
+        paths = ['/slow%d.html' % x for x in range(20)]
+        t = time.time()
+        responses = self.fetch(paths)
+        self.assert_(time.time() - t < 4.0)
+        for path, resp in zip(paths, responses):
+            self.assertEqual(resp.status, 200)
+            self.assertEqual(resp.data, '<html>%s</html>' % path)
+            self.assertEqual(resp.error, None)
+
+    def test_responses(self):
+        page, redirect, missing, big = self.fetch(['/page1.html', '/redirect', '/missing', '/big.bin'])
+        self.assertEqual(page.status, 200)
+        self.assertEqual(page.headers['content-type'], 'text/html')
+        self.assertEqual(redirect.status, 200)
+        self.assert_(redirect.url.endswith('/page1.html'))
+        self.assertEqual(redirect.data, page.data)
+        self.assertEqual(missing.status, 404)
+        # Data of files above the maximum size is not read
+        self.assert_(big.oversize)
+        self.assertEqual(big.data, '')
+
+    def test_connection_error(self):
+        # Nothing listens on the port of a closed server
+        self.stop_server()
+        resp = self.fetch(['/page1.html'])[0]
+        self.assertEqual(resp.status, 0)
+        self.assertEqual(resp.error[0], self.asyncfetch.URL_SOCKET_ERROR)
+        self.assertEqual(resp.tries, 2)
+
+    def test_can_fetch(self):
+        engine = self.asyncfetch.HarvestManAsyncEngine()
+        self.assert_(engine.can_fetch(self.make_url('/page1.html')))
+        urlobj = self.HarvestManUrlParser('ftp://ftp.gnu.org/gnu/README', TYPE_ANY)
+        self.assert_(not engine.can_fetch(urlobj))
+
+    def test_connector(self):
+        # The connector processes responses like the
+        # regular connector
+        paths = ['/page1.html', '/gzip.html', '/missing', '/cached.html', '/redirect']
+        urlobjs = [self.make_url(path) for path in paths]
+        responses = self.fetch(paths[:-2]) + self.fetch(paths[-2:-1], lmt=time.time()) + \
+                    self.fetch(paths[-1:])
+        results, errors = [], []
+        for urlobj, resp in zip(urlobjs, responses):
+            conn = self.asyncfetch.HarvestManAsyncUrlConnector(resp)
+            res = conn.connect(urlobj.get_full_url(), urlobj)
+            results.append((res, conn.get_data()))
+            errors.append(conn.get_error())
+
+        self.assertEqual(results[0], (0, '<html><body><a href="/page1.html">link</a></body></html>'))
+        self.assertEqual(results[1], (0, '<html>compressed</html>'))
+        self.assertEqual(results[2], (-1, ''))
+        self.assertEqual(errors[2]['number'], 404)
+        self.assert_(errors[2]['fatal'])
+        self.assertEqual(results[3], (1, ''))
+        # Redirected url is re-resolved
+        self.assertEqual(results[4][0], 0)
+        self.assert_(urlobjs[4].get_full_url().endswith('/page1.html'))
+
+    def test_save_url(self):
+        # Files are written by the same method as
+        # for the regular connector
+        urlobj = self.make_url('/page2.html')
+        resp = self.fetch(['/page2.html'])[0]
+        conn = self.asyncfetch.HarvestManAsyncUrlConnector(resp)
+        self.assertEqual(conn.save_url(urlobj), 1)
+        fname = urlobj.get_full_filename()
+        self.assert_(fname.startswith(self.projdir))
+        self.assertEqual(open(fname).read(), resp.data)
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManAsyncEngine),))
+    unittest.TextTestRunner(verbosity=2).run(s)
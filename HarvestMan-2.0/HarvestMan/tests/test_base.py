@@ -28,3 +28,35 @@ def setUp():
     
     InitConfig(config.HarvestManStateObject)
     InitLogger(logger.HarvestManLogger)
+
+def setUpJSParser():
+    """ Set up a stand-in for the javascript parser module
+    common.jsparser if it is not installed, so that modules
+    which use it can be imported """
+
+    try:
+        import common.jsparser
+    except ImportError:
+        import re
+        import imp
+        import common
+
+        class JSParser(object):
+            """ Javascript parser which collects the source
+            of the <script> blocks of a page as statements """
+
+            scriptre = re.compile(r'<script[^>]*>(.*?)</script\s*>', re.IGNORECASE|re.DOTALL)
+
+            def __init__(self):
+                self.reset()
+
+            def reset(self):
+                self.statements = []
+
+            def feed(self, data):
+                self.statements = self.scriptre.findall(data)
+
+        module = imp.new_module('common.jsparser')
+        module.JSParser = JSParser
+        sys.modules['common.jsparser'] = module
+        common.jsparser = module
@@ -0,0 +1,99 @@
+# -- coding: latin-1
+""" Unit test for connector module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import tempfile
+import shutil
+import threading
+
+test_base.setUp()
+
+from common.common import GetObject, SetObject
+from urltypes import TYPE_WEBPAGE
+from test_asyncfetch import HttpTestServer, HttpTestHandler
+
+class BlockCollector(object):
+    """ Collects the blocks of data fed by the connector """
+
+    def reset(self):
+        self.blocks = []
+        self.complete = False
+
+    def feed(self, data):
+        self.blocks.append(data)
+
+    def close(self):
+        self.complete = True
+
+class TestHarvestManUrlConnector(unittest.TestCase):
+    """ Unit test class for HarvestManUrlConnector class """
+
+    import connector
+    from urlparser import HarvestManUrlParser
+
+    def setUp(self):
+        import datamgr, rules
+
+        self.server = HttpTestServer(('127.0.0.1', 0), HttpTestHandler)
+        self.port = self.server.server_address[1]
+        t = threading.Thread(target=self.server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+        self.projdir = tempfile.mkdtemp()
+        cfg = GetObject('config')
+        cfg.projdir = self.projdir
+        SetObject(datamgr.HarvestManDataManager())
+        SetObject(rules.HarvestManRulesChecker())
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.projdir, True)
+
+    def fetch(self, path, stream):
+        url = 'http://127.0.0.1:%d%s' % (self.port, path)
+        urlobj = self.HarvestManUrlParser(url, TYPE_WEBPAGE, rootdir=self.projdir)
+        urlobj.set_index()
+        conn = self.connector.HarvestManUrlConnector()
+        conn.set_stream_parser(stream)
+        res = conn.connect(url, urlobj, True, 0)
+        return res, conn.get_data()
+
+    def test_stream(self):
+        # Data of web pages is fed as it is read
+        stream = BlockCollector()
+        blocksize = self.connector.STREAM_BLOCK_SIZE
+        self.connector.STREAM_BLOCK_SIZE = 16
+        try:
+            res, data = self.fetch('/page1.html', stream)
+        finally:
+            self.connector.STREAM_BLOCK_SIZE = blocksize
+        self.assertEqual(res, 0)
+        self.assert_(len(stream.blocks) > 1)
+        self.assertEqual(''.join(stream.blocks), data)
+        self.assert_(stream.complete)
+
+    def test_stream_gzip(self):
+        # Compressed pages are fed after deflating
+        stream = BlockCollector()
+        res, data = self.fetch('/gzip.html', stream)
+        self.assertEqual(data, '<html>compressed</html>')
+        self.assertEqual(''.join(stream.blocks), data)
+        self.assert_(stream.complete)
+
+    def test_no_stream(self):
+        res, data = self.fetch('/page1.html', None)
+        self.assertEqual(res, 0)
+        self.assertEqual(data, '<html><body><a href="/page1.html">link</a></body></html>')
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManUrlConnector),))
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,125 @@
+# -- coding: latin-1
+""" Unit test for crawler module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import time
+import shutil
+import tempfile
+import threading
+
+test_base.setUp()
+# The crawler module needs the javascript parser
+# in common.jsparser
+test_base.setUpJSParser()
+
+from common.common import GetObject, SetObject
+from sgmllib import SGMLParseError
+
+class TestHarvestManUrlFetcher(unittest.TestCase):
+    """ Unit test class for HarvestManUrlFetcher class """
+
+    import crawler
+    from urlparser import HarvestManUrlParser
+
+    def setUp(self):
+        import datamgr, rules, urlqueue
+
+        self.projdir = tempfile.mkdtemp()
+        cfg = GetObject('config')
+        cfg.projdir = self.projdir
+        # No time gaps between urls of the same host
+        self.settings = (cfg.balancetrackers, cfg.usethreads, cfg.sleeptime)
+        cfg.balancetrackers, cfg.usethreads, cfg.sleeptime = False, False, 0
+        dmgr = datamgr.HarvestManDataManager()
+        dmgr.initialize()
+        SetObject(dmgr)
+        SetObject(rules.HarvestManRulesChecker())
+        self.queue = urlqueue.HarvestManCrawlerQueue()
+        # A crawl which does not finish times out quickly
+        self.queue._waittime = 10.0
+        SetObject(self.queue)
+
+    def tearDown(self):
+        cfg = GetObject('config')
+        cfg.balancetrackers, cfg.usethreads, cfg.sleeptime = self.settings
+        self.queue.url_q.shutdown()
+        self.queue.data_q.shutdown()
+        self.queue.url_q.close()
+        self.queue.data_q.close()
+        shutil.rmtree(self.projdir, True)
+
+    def crawl(self, error, klass=None, server='http://127.0.0.1', path='page'):
+        """ Crawl ten urls with three fetchers of the given class,
+        processing one of the urls fails with the given error.
+        Returns the urls which were processed """
+
+        failed, processed = [], []
+
+        class FailingFetcher(klass or self.crawler.HarvestManUrlFetcher):
+            # The error counts as a repeating one, so that
+            # the thread is not restarted with the url
+            _lasterror = error
+
+            def process_url(self):
+                if self._url.endswith('/%s3.html' % path) and not failed:
+                    failed.append(self._url)
+                    raise error
+                processed.append(self._url)
+
+        for x in range(10):
+            urlobj = self.HarvestManUrlParser('%s/%s%d.html' % (server, path, x))
+            urlobj.set_index()
+            self.queue.push(urlobj, 'crawler')
+
+        fetchers = [FailingFetcher(x) for x in range(3)]
+        for t in fetchers:
+            t.setDaemon(True)
+            t.start()
+
+        t = time.time()
+        self.queue.mainloop()
+        self.assert_(time.time() - t < 5.0)
+        self.assertEqual(failed, ['%s/%s3.html' % (server, path)])
+        self.assertEqual(self.queue.get_outstanding_work(), 0)
+        self.assertEqual(len(self.queue.url_q), 0)
+        return processed
+
+    def test_error(self):
+        # The thread dies, the other threads crawl the rest
+        self.crawl(IOError('Connection reset'))
+
+    def test_parse_error(self):
+        # The thread is not restarted with the url for a
+        # repeating parse error
+        self.crawl(SGMLParseError('Parse error'))
+
+    def test_async(self):
+        # The requests in flight of an asynchronous fetcher
+        # which dies are fetched by the other fetchers
+        from test_asyncfetch import HttpTestServer, HttpTestHandler
+
+        server = HttpTestServer(('127.0.0.1', 0), HttpTestHandler)
+        t = threading.Thread(target=server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+        try:
+            processed = self.crawl(IOError('Connection reset'), self.crawler.HarvestManAsyncUrlFetcher,
+                                   'http://127.0.0.1:%d' % server.server_address[1], 'slow')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        processed.sort()
+        self.assertEqual(processed, ['http://127.0.0.1:%d/slow%d.html' % (server.server_address[1], x)
+                                     for x in range(10) if x != 3])
+
+if __name__=="__main__":
+    s = unittest.makeSuite(TestHarvestManUrlFetcher)
+    unittest.TextTestRunner(verbosity=2).run(s)
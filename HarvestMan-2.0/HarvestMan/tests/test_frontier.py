@@ -0,0 +1,302 @@
+# -- coding: latin-1
+""" Unit test for frontier module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import time
+
+test_base.setUp()
+
+class TestHarvestManFrontier(unittest.TestCase):
+    """ Unit test class for HarvestManFrontier class """
+
+    from frontier import HarvestManFrontier
+
+    def make_queue(self, maxsize=0):
+        return self.HarvestManFrontier(maxsize)
+
+    def test_priority_order(self):
+        q = self.make_queue()
+        for prio in (5, 1, 3, 0, 4, 2):
+            q.put((prio, 'url%d' % prio))
+
+        self.assertEqual(len(q), 6)
+        self.assertEqual([q.get()[0] for x in range(6)], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(len(q), 0)
+
+    def test_fifo_tie_break(self):
+        q = self.make_queue()
+        for x in range(10):
+            q.put((1, 'a%d' % x))
+            q.put((0, 'b%d' % x))
+
+        items = [q.get()[1] for x in range(20)]
+        self.assertEqual(items, ['b%d' % x for x in range(10)] + ['a%d' % x for x in range(10)])
+
+    def test_unorderable_items(self):
+        # Items of the same priority should never be compared
+        class Item(object):
+            def __cmp__(self, other):
+                raise TypeError, 'cannot compare'
+
+        q = self.make_queue()
+        objs = [Item() for x in range(5)]
+        for obj in objs:
+            q.put((2, obj))
+        self.assertEqual([q.get()[1] for x in range(5)], objs)
+
+    def test_maxsize(self):
+        from Queue import Full
+
+        q = self.make_queue(2)
+        q.put_nowait((0, 'a'))
+        q.put_nowait((0, 'b'))
+        self.assertRaises(Full, q.put_nowait, (0, 'c'))
+
+    def test_backpressure(self):
+        import threading
+        from Queue import Full
+
+        q = self.make_queue(1)
+        q.put((0, 'a'))
+        t = time.time()
+        self.assertRaises(Full, q.put, (0, 'b'), True, 0.1)
+        self.assert_(time.time() - t >= 0.05)
+
+        # A blocked producer is released by a consumer
+        threading.Timer(0.1, q.get).start()
+        q.put((0, 'c'), True, 2.0)
+        self.assertEqual(q.get_nowait(), (0, 'c'))
+
+    def test_shutdown(self):
+        import threading
+        from Queue import Empty, Full
+
+        q = self.make_queue(1)
+        threading.Timer(0.1, q.shutdown).start()
+        t = time.time()
+        self.assertRaises(Empty, q.get)
+        self.assert_(time.time() - t < 2.0)
+        self.assertRaises(Full, q.put, (0, 'a'))
+
+    def test_interrupt(self):
+        import threading
+        from Queue import Empty
+
+        q = self.make_queue()
+        threading.Timer(0.1, q.interrupt).start()
+        t = time.time()
+        self.assertRaises(Empty, q.get)
+        self.assert_(time.time() - t < 2.0)
+
+        # Getters which find an item are not affected
+        q.put((0, 'a'))
+        q.interrupt()
+        self.assertEqual(q.get(), (0, 'a'))
+
+    def test_push_many(self):
+        # A batch comes out in the same order as single puts
+        items = [(x % 7, 'abc'[x % 3] + str(x)) for x in range(200)]
+        q1, q2 = self.make_queue(), self.make_queue()
+        q1.put(items[0])
+        q2.put(items[0])
+        for item in items[1:]:
+            q1.put(item)
+        self.assertEqual(q2.push_many(items[1:]), 199)
+        self.assertEqual(len(q2), 200)
+        self.assertEqual(q2.get_items(), q1.get_items())
+        self.assertEqual([q2.get() for x in range(200)], [q1.get() for x in range(200)])
+
+    def test_push_many_bounded(self):
+        import threading
+
+        q = self.make_queue(3)
+        self.assertEqual(q.push_many([(0, 'a%d' % x) for x in range(5)], False), 3)
+        self.assertEqual(q.push_many([(0, 'b')], True, 0.05), 0)
+
+        # A blocked producer puts the rest as slots free up
+        threading.Timer(0.1, lambda: [q.get() for x in range(3)]).start()
+        self.assertEqual(q.push_many([(1, 'c%d' % x) for x in range(3)], True, 2.0), 3)
+        q.shutdown()
+        self.assertEqual(q.push_many([(0, 'd')]), 0)
+
+    def test_state(self):
+        q = self.make_queue()
+        for x in range(20):
+            q.put((x % 3, x))
+
+        items = q.get_items()
+        self.assertEqual(len(items), 20)
+        self.assertEqual(len(q), 20)
+
+        q2 = self.make_queue()
+        q2.set_items(items)
+        self.assertEqual([q2.get() for x in range(20)], [q.get() for x in range(20)])
+
+    def test_legacy_state(self):
+        # Older versions saved the queue as a sorted MyDeque
+        from common.common import MyDeque
+
+        q = self.make_queue()
+        q.set_items(MyDeque([(0, 'x'), (0, 'y'), (1, 'z')]))
+        self.assertEqual([q.get() for x in range(3)], [(0, 'x'), (0, 'y'), (1, 'z')])
+
+class TestHarvestManHostFrontier(TestHarvestManFrontier):
+    """ Unit test class for HarvestManHostFrontier class """
+
+    from frontier import HarvestManHostFrontier
+
+    def make_queue(self, maxsize=0, **kwargs):
+        # Items are (priority, host-name) or (priority, host-name, data)
+        return self.HarvestManHostFrontier(maxsize, hostfunc=lambda item: str(item[1])[0], **kwargs)
+
+    def test_unorderable_items(self):
+        class Item(object):
+            def __cmp__(self, other):
+                raise TypeError, 'cannot compare'
+            def __str__(self):
+                return 'a'
+
+        q = self.make_queue()
+        objs = [Item() for x in range(5)]
+        for obj in objs:
+            q.put((2, obj))
+        self.assertEqual([q.get()[1] for x in range(5)], objs)
+        
+    def test_politeness(self):
+        from Queue import Empty
+        
+        q = self.make_queue(delay=0.2)
+        for x in range(3):
+            q.put((0, 'a%d' % x))
+            q.put((1, 'b%d' % x))
+
+        # One item per host is ready immediately
+        self.assertEqual(q.get_nowait(), (0, 'a0'))
+        self.assertEqual(q.get_nowait(), (1, 'b0'))
+        self.assertRaises(Empty, q.get_nowait)
+        self.assertEqual(len(q), 4)
+        self.assert_(q.get_wait_time() > 0.1)
+        
+        # Blocking get waits for the host to become ready
+        t = time.time()
+        self.assertEqual(q.get(True, 1.0), (0, 'a1'))
+        self.assert_(time.time() - t >= 0.15)
+        self.assertEqual(q.get(True, 1.0), (1, 'b1'))
+        self.assertRaises(Empty, q.get, True, 0.05)
+
+    def test_host_delays(self):
+        from frontier import parse_host_delays
+        
+        d = parse_host_delays('www.foo.com=5, bar.org=0.5,junk, x=y')
+        self.assertEqual(d, {'www.foo.com' : 5.0, 'bar.org' : 0.5})
+
+        q = self.HarvestManHostFrontier(0, delay=1.0, hostdelays=d)
+        self.assertEqual(q.get_host_delay('www.foo.com'), 5.0)
+        self.assertEqual(q.get_host_delay('www.bar.org:8080'), 0.5)
+        self.assertEqual(q.get_host_delay('www.python.org'), 1.0)
+
+    def test_adaptive_delay(self):
+        q = self.make_queue(delay=0.5, adaptive=True, factor=2.0, maxdelay=3.0)
+        host = q.get_host('a')
+        self.assertEqual(q.get_delay(host), 0.5)
+        q.record_fetch('a', 1.0)
+        self.assertEqual(q.get_delay(host), 2.0)
+        q.record_fetch('a', 10.0)
+        self.assertEqual(q.get_delay(host), 3.0)
+        self.assert_(host.nextfetch > time.time())
+
+    def test_state(self):
+        q = self.make_queue()
+        for x in range(20):
+            q.put((x % 3, 'abc'[x % 3], x))
+
+        items = q.get_items()
+        self.assertEqual(len(items), 20)
+        self.assertEqual(items[0], (0, 'a', 0))
+
+        q2 = self.make_queue()
+        q2.set_items(items)
+        self.assertEqual(len(q2), 20)
+        self.assertEqual(sorted([q2.get() for x in range(20)]), sorted(items))
+        
+class TestHarvestManSpillingFrontier(TestHarvestManFrontier):
+    """ Unit test class for HarvestManFrontier class with
+    items spilled to disk """
+
+    def setUp(self):
+        import tempfile
+        self.spooldir = tempfile.mkdtemp()
+        
+    def make_queue(self, maxsize=0):
+        return self.HarvestManFrontier(maxsize, memory=4, spooldir=self.spooldir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.spooldir, True)
+        
+    def test_unorderable_items(self):
+        # Spilled items are pickled, so use picklable items
+        pass
+
+    def test_spill(self):
+        q = self.make_queue()
+        for x in range(50):
+            q.put((x % 5, x))
+
+        self.assertEqual(len(q), 50)
+        self.assertEqual(q._memsize(), 4)
+        self.assertEqual(len(q.spill), 46)
+        
+        # Priority order and FIFO for ties are kept across
+        # memory and disk
+        expected = sorted([(x % 5, x) for x in range(50)])
+        self.assertEqual(q.get_items(), expected)
+        
+        items = []
+        for x in range(25):
+            items.append(q.get())
+            self.assert_(q._memsize() <= 5)
+
+        # Items pushed while some are spilled
+        for x in range(50, 60):
+            q.put((x % 5, x))
+            
+        while len(q):
+            items.append(q.get())
+            
+        self.assertEqual(items[:25], expected[:25])
+        self.assertEqual(items[25:], sorted(expected[25:] + [(x % 5, x) for x in range(50, 60)]))
+        self.assertEqual(len(q.spill), 0)
+
+    def test_close(self):
+        q = self.make_queue()
+        for x in range(20):
+            q.put((0, x))
+
+        q.close()
+        self.assertEqual(len(q), 4)
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+    def test_records(self):
+        # Spilled items are written as compact records
+        objs = dict([(x, object()) for x in range(10)])
+        q = self.HarvestManFrontier(0, memory=2, spooldir=self.spooldir,
+                                    dumpfunc=lambda item: (item[0], item[1][0]),
+                                    loadfunc=lambda rec: (rec[0], (rec[1], objs[rec[1]])))
+        for x in range(10):
+            q.put((1, (x, objs[x])))
+
+        self.assertEqual([q.get()[1][1] for x in range(10)], [objs[x] for x in range(10)])
+        
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManFrontier),
+                            unittest.makeSuite(TestHarvestManHostFrontier),
+                            unittest.makeSuite(TestHarvestManSpillingFrontier)))
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,70 @@
+# -- coding: latin-1
+""" Unit test for hosts module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import md5
+
+test_base.setUp()
+
+class TestHarvestManHostTable(unittest.TestCase):
+    """ Unit test class for HarvestManHostTable class """
+
+    from hosts import HarvestManHostTable
+    from urlparser import HarvestManUrlParser
+    from urltypes import TYPE_ANY, TYPE_WEBPAGE
+
+    def test_host_ids(self):
+        table = self.HarvestManHostTable()
+        h1 = table.get_host('http://', 'www.foo.com', 80)
+        h2 = table.get_host('http://', 'www.bar.com', 80)
+        h3 = table.get_host('http://', 'www.foo.com', 8080)
+
+        self.assertEqual([h1.id, h2.id, h3.id], [0, 1, 2])
+        self.assert_(table.get_host('http://', 'www.foo.com', 80) is h1)
+        self.assert_(table.get_host_by_id(2) is h3)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(h1.name, 'www.foo.com')
+        self.assertEqual(h3.name, 'www.foo.com:8080')
+        self.assertEqual(h1.domainhash, md5.new('http://www.foo.com').hexdigest())
+
+    def test_url_hosts(self):
+        base = self.HarvestManUrlParser('http://www.foo.com/docs/index.html',
+                                        self.TYPE_WEBPAGE, 0, None, '/tmp/project')
+        u1 = self.HarvestManUrlParser('../about.html', self.TYPE_ANY, False, base)
+        u2 = self.HarvestManUrlParser('http://www.foo.com:8080/index.html', self.TYPE_ANY, False, base)
+
+        self.assertEqual(u1.get_host_id(), base.get_host_id())
+        self.assertNotEqual(u2.get_host_id(), base.get_host_id())
+        self.assertEqual(u1.get_domain_hash(), md5.new('http://www.foo.com').hexdigest())
+        self.assertEqual(u2.get_host().name, u2.get_domain_with_port())
+
+    def test_server_dictionary(self):
+        table = self.HarvestManHostTable()
+        h1 = table.get_host('http://', 'www.foo.com', 80)
+        h1.acceptranges = True
+        table.get_host('http://', 'www.bar.com', 80)
+
+        d = table.get_server_dictionary()
+        self.assertEqual(d, {'http://www.foo.com': {'accept-ranges': True}})
+
+        # Saved information is applied to hosts when they
+        # are added to the table
+        table = self.HarvestManHostTable()
+        table.set_server_dictionary(d)
+        self.assertEqual(table.get_server_dictionary(), d)
+        self.assertEqual(table.get_host('http://', 'www.bar.com', 80).acceptranges, 0)
+        self.assertEqual(table.get_host('http://', 'www.foo.com', 80).acceptranges, True)
+
+        table.reset()
+        self.assertEqual(table.get_server_dictionary(), {})
+
+if __name__=="__main__":
+    s = unittest.makeSuite(TestHarvestManHostTable)
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,246 @@
+# -- coding: latin-1
+""" Unit test for journal module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import tempfile
+import shutil
+import cPickle
+
+test_base.setUp()
+
+class TestHarvestManJournal(unittest.TestCase):
+    """ Unit test class for HarvestManJournal class """
+
+    import journal
+    import urlstore
+    from urlparser import HarvestManUrlParser
+    from urlcollections import HarvestManAutoUrlCollection
+
+    def setUp(self):
+        self.dirname = os.path.join(tempfile.mkdtemp(), 'journal')
+        self.urls = []
+        for x in range(10):
+            u = self.HarvestManUrlParser('http://www.foo.com/%d.html' % x)
+            u.set_index()
+            self.urls.append(u)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.dirname), True)
+
+    def make_journal(self, compactsize=50000):
+        j = self.journal.HarvestManJournal(self.dirname, 0, compactsize)
+        j.open()
+        j.log('config', {'maxtrackers' : 4})
+        return j
+
+    def log_crawl(self, j):
+        # Push all urls, fetch the first five and crawl
+        # the first two pages
+        urls = self.urls
+        j.log('base', urls[0].index)
+        for u in urls:
+            j.log_url(u)
+        for x, u in enumerate(urls):
+            j.log_push('url_q', (x % 3, u))
+            j.log('link', u.get_url_hash())
+        self.colls = []
+        for u in urls[:5]:
+            j.log('done', u.get_full_url(), u.index)
+            j.log('saved', u.index, u.get_full_url(), u.get_full_filename(), 1)
+            coll = self.HarvestManAutoUrlCollection(u)
+            j.log_push('data_q', (0, coll))
+            self.colls.append(coll)
+            j.log('pop', 'url_q', u.index)
+        for coll in self.colls[:2]:
+            j.log('pop', 'data_q', coll.getId())
+        j.log('failed', urls[5].index)
+
+    def check_state(self, jstate, pages=(2, 3, 4)):
+        urls = self.urls
+        state = self.journal.make_state(jstate)
+
+        tq = state['trackerqueue']
+        self.assertEqual(tq['_baseUrlObj'].get_full_url(), urls[0].get_full_url())
+        # Queued urls come in priority order, FIFO for ties
+        expected = sorted([(x % 3, x, urls[x].get_full_url()) for x in range(5, 10)])
+        self.assertEqual([(prio, u.get_full_url()) for prio, u in tq['url_q']],
+                         [(prio, url) for prio, x, url in expected])
+        self.assertEqual([coll.getSourceURL() for prio, coll in tq['data_q']],
+                         [urls[x].index for x in pages])
+        self.assertEqual(len(tq['threadinfo']), 4)
+
+        dm = state['datamanager']
+        self.assertEqual(len(dm['_urlstore']), 10)
+        dledger = dm['_ledger']
+        self.assert_(False not in [dledger.is_done(u.get_full_url()) for u in urls[:5]])
+        self.assertEqual(dledger.get_saved_files(), [u.get_full_filename() for u in urls[:5]])
+        self.assertEqual([u.index for u in dledger.get_failed_urls()], [urls[5].index])
+
+        self.assertEqual(len(state['ruleschecker']['_links']), 10)
+        self.assertEqual(state['configobj'], {'maxtrackers' : 4})
+
+    def test_replay(self):
+        j = self.make_journal()
+        self.log_crawl(j)
+        j.close()
+
+        self.check_state(self.journal.load_journal(self.dirname))
+
+    def test_compact(self):
+        j = self.make_journal(10)
+        self.log_crawl(j)
+        j.checkpoint()
+
+        # Sealed segments are folded into the snapshot
+        # and the archive
+        self.assert_(os.path.isfile(os.path.join(self.dirname, 'snapshot')))
+        self.assert_(os.path.isfile(os.path.join(self.dirname, 'archive')))
+        self.assertEqual(len(self.journal.get_segments(self.dirname)), 1)
+
+        # Records after compaction go to the new segment
+        j.log('pop', 'data_q', self.colls[2].getId())
+        j.log_push('data_q', (0, self.HarvestManAutoUrlCollection(self.urls[2])))
+        j.close()
+        self.check_state(self.journal.load_journal(self.dirname), (3, 4, 2))
+
+    def test_compact_crash(self):
+        # Segments which were folded into the snapshot, and
+        # records of the archive after its size in the snapshot,
+        # are skipped if a crash left them behind
+        j = self.make_journal(10)
+        self.log_crawl(j)
+        j.flush()
+        num, fname = self.journal.get_segments(self.dirname)[-1]
+        data = open(fname, 'rb').read()
+        j.checkpoint()
+        open(fname, 'wb').write(data)
+        open(os.path.join(self.dirname, 'archive'), 'ab').write(data)
+        j.close()
+        self.check_state(self.journal.load_journal(self.dirname))
+
+    def test_collections(self):
+        # Collections pushed for the same page are kept
+        # until each of them is popped
+        j = self.make_journal()
+        self.log_crawl(j)
+        coll = self.HarvestManAutoUrlCollection(self.urls[3])
+        j.log_push('data_q', (0, coll))
+        j.log('pop', 'data_q', self.colls[3].getId())
+        j.close()
+        self.check_state(self.journal.load_journal(self.dirname), (2, 4, 3))
+
+    def test_resume(self):
+        # A resumed crawl starts a new journal from the
+        # replayed state
+        j = self.make_journal()
+        self.log_crawl(j)
+        j.close()
+
+        jstate = self.journal.load_journal(self.dirname)
+        dirname = self.dirname + '2'
+        j = self.journal.HarvestManJournal(dirname, 0)
+        j.open(jstate)
+        j.close()
+        shutil.rmtree(self.dirname)
+        self.check_state(self.journal.load_journal(dirname))
+
+    def test_archive(self):
+        # Url objects are saved with the index of their
+        # base url object, and are paged in from the url
+        # store when a journal is replayed
+        projdir = os.path.dirname(self.dirname)
+        j = self.journal.HarvestManJournal(self.dirname, 0, 10)
+        j.open()
+        j.log('config', {'projdir' : projdir, 'urlmemory' : 4, 'seenmemory' : 1})
+
+        urls, sizes = [], []
+        base = None
+        for x in range(30):
+            if base is None:
+                u = self.HarvestManUrlParser('http://www.foo.com/d0/')
+            else:
+                u = self.HarvestManUrlParser('d%d/' % x, baseurl=base)
+            u.set_index()
+            urls.append(u)
+            sizes.append(len(cPickle.dumps(('url', u.index, self.urlstore.get_url_state(u)), 2)))
+            j.log_url(u)
+            j.log_push('url_q', (0, u))
+            base = u
+        j.checkpoint()
+        j.close()
+        self.assert_(max(sizes) - min(sizes) < 100)
+
+        # The snapshot has no url objects
+        snapshot = os.path.join(self.dirname, 'snapshot')
+        self.assert_(os.path.getsize(snapshot) < 2000)
+
+        state = self.journal.make_state(self.journal.load_journal(self.dirname))
+        self.assertEqual([u.get_full_url() for prio, u in state['trackerqueue']['url_q']],
+                         [u.get_full_url() for u in urls])
+        self.assertEqual(state['ruleschecker']['_links'].memory, 1)
+        state['datamanager']['_urlstore'].close()
+
+    def test_inflight(self):
+        # Urls whose downloads did not complete are queued
+        # again and are not done
+        j = self.make_journal()
+        self.log_crawl(j)
+        for u in self.urls[6:8]:
+            j.log('done', u.get_full_url(), u.index)
+        j.log('pop', 'url_q', self.urls[6].index)
+        j.close()
+
+        state = self.journal.make_state(self.journal.load_journal(self.dirname))
+        self.assertEqual([(prio, u.index) for prio, u in state['trackerqueue']['url_q']],
+                         [(0, self.urls[9].index), (0, self.urls[6].index), (1, self.urls[7].index),
+                          (2, self.urls[5].index), (2, self.urls[8].index)])
+        dledger = state['datamanager']['_ledger']
+        self.assert_(True not in [dledger.is_done(u.get_full_url()) for u in self.urls[6:]])
+
+    def test_urlindex(self):
+        # Url objects created after a resume get indices
+        # after those of the replayed url objects
+        import datamgr
+
+        j = self.make_journal()
+        self.log_crawl(j)
+        j.close()
+
+        state = self.journal.make_state(self.journal.load_journal(self.dirname))
+        self.assertEqual(state['datamanager']['_urlindex'], self.urls[-1].index)
+
+        self.HarvestManUrlParser.reset_IDX()
+        datamgr.HarvestManDataManager().set_state(state['datamanager'])
+        u = self.HarvestManUrlParser('http://www.foo.com/new.html')
+        u.set_index()
+        self.assert_(u.index > max([x.index for x in self.urls]))
+
+    def test_truncated(self):
+        j = self.make_journal()
+        self.log_crawl(j)
+        j.close()
+
+        # A partly written record at the end is skipped
+        num, fname = self.journal.get_segments(self.dirname)[-1]
+        data = open(fname, 'rb').read()
+        open(fname, 'ab').write(data[-20:-5])
+        self.check_state(self.journal.load_journal(self.dirname))
+
+    def test_remove(self):
+        j = self.make_journal()
+        self.log_crawl(j)
+        j.close(remove=True)
+        self.assert_(not os.path.exists(self.dirname))
+        # Records after close are ignored
+        j.log('pop', 'url_q', 0)
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManJournal),))
+    unittest.TextTestRunner(verbosity=2).run(s)
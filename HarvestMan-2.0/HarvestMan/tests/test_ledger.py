@@ -0,0 +1,116 @@
+# -- coding: latin-1
+""" Unit test for ledger module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import copy
+import cPickle
+
+test_base.setUp()
+
+class TestHarvestManDownloadLedger(unittest.TestCase):
+    """ Unit test class for HarvestManDownloadLedger class """
+
+    import ledger
+    from urlparser import HarvestManUrlParser
+    from urltypes import TYPE_ANY, TYPE_WEBPAGE
+
+    def setUp(self):
+        base = self.HarvestManUrlParser('http://www.foo.com/docs/index.html',
+                                        self.TYPE_WEBPAGE, 0, None, '/tmp/project')
+        self.urls = [self.HarvestManUrlParser('page%d.html' % x, self.TYPE_ANY, False, base)
+                     for x in range(10)]
+
+    def make_ledger(self):
+        # Urls 0-5 are saved, 6 is up to date in the repository,
+        # 7 failed, 8 is done and 9 queued.
+        dledger = self.ledger.HarvestManDownloadLedger()
+        for u in self.urls:
+            dledger.mark_queued(u.get_full_url())
+        for u in self.urls[:9]:
+            self.assertEqual(dledger.mark_done(u.get_full_url()), True)
+        for u in self.urls[:6]:
+            dledger.mark_saved(u.get_full_url(), u.get_full_filename(), 1)
+        dledger.mark_saved(self.urls[6].get_full_url(), self.urls[6].get_full_filename(), 3)
+        self.urls[7].status = 404
+        dledger.mark_failed(self.urls[7])
+        return dledger
+
+    def test_states(self):
+        dledger = self.make_ledger()
+        urls = self.urls
+        ledger = self.ledger
+
+        self.assertEqual(dledger.mark_done(urls[0].get_full_url()), False)
+        self.assertEqual(dledger.is_done(urls[8].get_full_url()), True)
+        self.assertEqual(dledger.is_done(urls[9].get_full_url()), False)
+        self.assertEqual(dledger.is_done('http://www.bar.com/'), False)
+        self.assertEqual(dledger.get_state(urls[0].get_full_url()), ledger.STATE_SAVED)
+        self.assertEqual(dledger.get_reason(urls[6].get_full_url()), ledger.REASON_UPTODATE)
+        self.assertEqual(dledger.get_state(urls[7].get_full_url()), ledger.STATE_FAILED)
+        self.assertEqual(dledger.get_reason(urls[7].get_full_url()), 404)
+        self.assertEqual(dledger.get_state(urls[9].get_full_url()), ledger.STATE_QUEUED)
+
+        self.assertEqual(dledger.get_counts(), {'queued' : 1, 'done' : 1, 'saved' : 7,
+                                                'failed' : 1, 'deleted' : 0, 'files' : 6,
+                                                'deletedfiles' : 0, 'filesinrepos' : 1,
+                                                'filesincache' : 0})
+
+    def test_keys(self):
+        # Urls are kept as plain integers from their hash,
+        # which is the same as the fingerprint of the seen set
+        import seenset
+        dledger = self.make_ledger()
+        self.assertEqual(len(dledger), 10)
+        for key in dledger._urls:
+            self.assertEqual(type(key), int)
+        u = self.urls[0]
+        self.assertEqual(self.ledger.url_key(u.get_full_url()) & seenset.FP_MASK,
+                         seenset.fingerprint(u.get_url_hash()))
+
+    def test_files(self):
+        dledger = self.make_ledger()
+        urls = self.urls
+        filenames = [u.get_full_filename() for u in urls[:6]]
+
+        self.assertEqual(dledger.get_saved_files(), filenames)
+        self.assertEqual(dledger.is_file_saved(filenames[2]), True)
+
+        self.assertEqual(dledger.mark_deleted(filenames[5], self.ledger.REASON_FILELIMIT), True)
+        self.assertEqual(dledger.mark_deleted(filenames[5]), False)
+        self.assertEqual(dledger.is_file_saved(filenames[5]), False)
+        self.assertEqual(dledger.get_deleted_files(), filenames[5:])
+        self.assertEqual(dledger.get_state(urls[5].get_full_url()), self.ledger.STATE_DELETED)
+        self.assertEqual(dledger.get_reason(urls[5].get_full_url()), self.ledger.REASON_FILELIMIT)
+
+        # A failed url which is saved on retry
+        self.assertEqual([u.get_full_url() for u in dledger.get_failed_urls()], [urls[7].get_full_url()])
+        self.assertEqual(dledger.mark_failed(urls[7]), False)
+        dledger.mark_saved(urls[7].get_full_url(), urls[7].get_full_filename(), 1)
+        self.assertEqual(dledger.num_failed(), 0)
+        self.assertEqual(dledger.num_saved(), 6)
+
+    def test_state(self):
+        dledger = self.make_ledger()
+        dledger.add_collection('collection')
+        dledger.mark_deleted(self.urls[0].get_full_filename())
+
+        for copied in (copy.deepcopy(dledger), cPickle.loads(cPickle.dumps(dledger, 2))):
+            self.assertEqual(copied.get_counts(), dledger.get_counts())
+            self.assertEqual(copied.get_saved_files(), dledger.get_saved_files())
+            self.assertEqual(copied.get_deleted_files(), dledger.get_deleted_files())
+            self.assertEqual(len(copied.get_failed_urls()), 1)
+            self.assertEqual(copied.get_collections(), ['collection'])
+            # Urls of saved files are kept
+            copied.mark_deleted(self.urls[1].get_full_filename())
+            self.assertEqual(copied.get_state(self.urls[1].get_full_url()), self.ledger.STATE_DELETED)
+
+if __name__=="__main__":
+    s = unittest.makeSuite(TestHarvestManDownloadLedger)
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,157 @@
+# -- coding: latin-1
+""" Unit test for pageparser module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import glob
+
+test_base.setUp()
+# The pageparser module needs the javascript parser
+# in common.jsparser
+test_base.setUpJSParser()
+
+import pageparser
+
+# Pages for comparing the parsers
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'htmlcorpus')
+
+def parse(klass, data, blocksize=0):
+    """ Parse the data with a parser of the given class, feeding
+    it in blocks of the given size, and return the results """
+
+    p = klass()
+    error = None
+    try:
+        if blocksize:
+            for x in range(0, len(data), blocksize):
+                p.feed(data[x:x+blocksize])
+        else:
+            p.feed(data)
+        p.close()
+    except pageparser.SGMLParseError, e:
+        error = str(e)
+
+    return { 'links' : p.links,
+             'images' : p.images,
+             'linkpos' : [p.linkpos[item] for item in p.links],
+             'base' : (p.base_url_defined(), p.get_base_url()),
+             'robots' : (p.can_index, p.can_follow),
+             'title' : p._pagetitle,
+             'scripts' : p.scripts,
+             'error' : error }
+
+class TestHarvestManFastParser(unittest.TestCase):
+    """ Unit test class for HarvestManFastParser class """
+
+    def setUp(self):
+        self.pages = {}
+        for fname in glob.glob(os.path.join(CORPUS, '*.html')):
+            self.pages[os.path.basename(fname)] = open(fname, 'rb').read()
+
+    def compare(self, blocksize=0):
+        for name, data in self.pages.items():
+            expected = parse(pageparser.HarvestManSimpleParser, data, blocksize)
+            result = parse(pageparser.HarvestManFastParser, data, blocksize)
+            for key in expected:
+                self.assertEqual(result[key], expected[key],
+                                 '%s differs for %s, block size %d' % (key, name, blocksize))
+
+    def test_corpus(self):
+        # Results are the same as for the sgmllib parser
+        self.assert_(len(self.pages) >= 10)
+        self.compare()
+
+    def test_blocks(self):
+        # Data fed in blocks as it is downloaded
+        for blocksize in (1, 7, 64, 1024):
+            self.compare(blocksize)
+
+    def test_links(self):
+        res = parse(pageparser.HarvestManFastParser, self.pages['baseurl.html'])
+        self.assertEqual(res['base'], (True, 'http://www.example.com/docs/'))
+        self.assertEqual([link for typ, link in res['links']],
+                         ['http://www.example.com/docs/', 'http://www.example.com/other/',
+                          'a.html', 'b.html', 'c.html', 'pics/z.gif'])
+        self.assertEqual([link for typ, link in res['images']], ['pics/x.jpg', 'pics/y.PNG'])
+
+        res = parse(pageparser.HarvestManFastParser, self.pages['robots.html'])
+        self.assertEqual(res['robots'], (False, False))
+
+        res = parse(pageparser.HarvestManFastParser, self.pages['indexof.html'])
+        self.assertEqual(res['title'], 'Index of /pub/files')
+        # Sorting links of the index page are skipped
+        self.assert_('?C=M;O=A' not in [link for typ, link in res['links']])
+
+    def test_scripts(self):
+        # Javascript source of <script> blocks is collected
+        # in the same pass as the links
+        data = self.pages['scripts.html']
+        res = parse(pageparser.HarvestManFastParser, data)
+        self.assertEqual(len(res['scripts']), 5)
+        self.assert_('window.location.replace' in res['scripts'][0])
+        self.assertEqual(res['scripts'][2], 'function f() { return "</b>"; }')
+        self.assertEqual(res['scripts'][-1], 'unterminated = 1;\n')
+        # Markup inside scripts is not parsed
+        self.assertEqual([link for typ, link in res['links']], ['/js/site.js', 'first.html', 'second.html'])
+
+        for blocksize in (1, 5, 100):
+            self.assertEqual(parse(pageparser.HarvestManFastParser, data, blocksize)['scripts'],
+                             res['scripts'])
+
+        js = pageparser.HarvestManJSParser()
+        js.feed_scripts(res['scripts'])
+        self.assertEqual(js.redirectedurl, 'http://www.example.com/moved.html')
+
+    def test_js_redirect(self):
+        # The <script> blocks collected by the html parsers give
+        # the same javascript redirection as the whole page
+        import parsepool
+        pages = [name for name, data in self.pages.items() if parsepool.location_re.search(data)]
+        self.assert_('jsredirect.html' in pages)
+
+        for name in pages:
+            data = self.pages[name]
+            js = pageparser.HarvestManJSParser()
+            js.feed(data)
+            for klass in (pageparser.HarvestManSimpleParser, pageparser.HarvestManFastParser):
+                wp = klass()
+                wp.feed(data)
+                wp.close()
+                self.assertEqual(parsepool.find_js_redirect(data, wp), js.redirectedurl,
+                                 'Redirection differs for %s with %s' % (name, klass.__name__))
+                # Only the blocks with a location token are
+                # processed, if they have all of them
+                count = len(parsepool.location_re.findall(data))
+                scripts = [s for s in wp.scripts if parsepool.location_re.search(s)]
+                if sum([len(parsepool.location_re.findall(s)) for s in scripts]) == count:
+                    scriptjs = pageparser.HarvestManJSParser()
+                    scriptjs.feed_scripts(scripts)
+                    self.assertEqual(scriptjs.redirectedurl, js.redirectedurl,
+                                     'Redirection differs for %s with %s' % (name, klass.__name__))
+
+        js = pageparser.HarvestManJSParser()
+        js.feed(self.pages['jsredirect.html'])
+        self.assertEqual(js.redirectedurl, 'http://www.example.com/new/index.html')
+
+    def test_make_html_parser(self):
+        from common.common import GetObject
+
+        cfg = GetObject('config')
+        htmlparser = cfg.htmlparser
+        try:
+            cfg.htmlparser = 2
+            self.assert_(isinstance(pageparser.make_html_parser(), pageparser.HarvestManFastParser))
+            cfg.htmlparser = 0
+            self.assertEqual(pageparser.make_html_parser().__class__, pageparser.HarvestManSimpleParser)
+        finally:
+            cfg.htmlparser = htmlparser
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManFastParser),))
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,229 @@
+# -- coding: latin-1
+""" Unit test for rules module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import re
+import random
+
+test_base.setUp()
+
+from common.common import GetObject
+
+class TestHarvestManPriorityMatcher(unittest.TestCase):
+    """ Unit test class for HarvestManPriorityMatcher class """
+
+    from rules import HarvestManPriorityMatcher
+
+    def test_url_priority(self):
+        m = self.HarvestManPriorityMatcher({'pdf' : 3, 'gif' : -2})
+        self.assertEqual(m.get_url_priority('doc.PDF'), 3)
+        self.assertEqual(m.get_url_priority('a.b.gif'), -2)
+        self.assertEqual(m.get_url_priority('index.html'), 0)
+        self.assertEqual(m.get_url_priority('README'), 0)
+        self.assertEqual(m.get_url_priority('.gif'), 0)
+        self.assertEqual(m.get_url_priority('..gif'), 0)
+
+        # Same extensions as os.path.splitext
+        for fname in ('a.gif', '.gif', 'x..gif', '...gif', 'gif.', 'a.pdf.gif', '.a.gif'):
+            extn = os.path.splitext(fname)[1][1:]
+            self.assertEqual(m.get_url_priority(fname), {'pdf' : 3, 'gif' : -2}.get(extn, 0))
+
+    def test_server_priority(self):
+        # This used to raise KeyError for partial matches
+        m = self.HarvestManPriorityMatcher({}, {'python.org' : 2, 'foo' : -1})
+        self.assertEqual(m.get_server_priority('www.python.org'), 2)
+        self.assertEqual(m.get_server_priority('foo.bar.com'), -1)
+        self.assertEqual(m.get_server_priority('www.yahoo.com'), 0)
+        self.assertEqual(m.get_priority('x.html', 'www.python.org'), 2)
+
+    def test_longest_match(self):
+        m = self.HarvestManPriorityMatcher({}, {'org' : 1, 'python.org' : 4,
+                                                'docs.python.org' : -3, 'thon' : 2})
+        self.assertEqual(m.match_server('www.python.org'), 'python.org')
+        self.assertEqual(m.match_server('docs.python.org'), 'docs.python.org')
+        self.assertEqual(m.match_server('jython.com'), 'thon')
+        self.assertEqual(m.match_server('gnu.org'), 'org')
+        self.assertEqual(m.match_server('gnu.net'), None)
+
+    def test_automaton(self):
+        # The automaton finds the same keys as a linear scan
+        random.seed(7)
+        keys = [''.join([random.choice('abc.') for x in range(random.randint(1, 5))]) for y in range(40)]
+        m = self.HarvestManPriorityMatcher({}, dict([(k, 1) for k in keys]))
+        for x in range(500):
+            domain = ''.join([random.choice('abc.') for x in range(random.randint(0, 12))])
+            matches = [k for k in keys if domain.find(k) != -1]
+            key = m.match_server(domain)
+            if matches:
+                self.assertEqual(len(key), max([len(k) for k in matches]))
+                self.assert_(key in matches)
+            else:
+                self.assertEqual(key, None)
+
+class TestHarvestManFilterMatcher(unittest.TestCase):
+    """ Unit test class for HarvestManFilterMatcher class """
+
+    from rules import HarvestManFilterMatcher, JunkFilter
+
+    def test_search(self):
+        rules = [r'/docs/', r'\.gif$', r'ads?|banners?', r'/*.*/cgi-bin/', r'[|]x']
+        m = self.HarvestManFilterMatcher(rules, re.IGNORECASE)
+        self.assertEqual(m.search('http://www.foo.com/DOCS/index.html'), 0)
+        self.assertEqual(m.search('http://www.foo.com/logo.gif'), 1)
+        self.assertEqual(m.search('http://www.foo.com/banner.html'), 2)
+        self.assertEqual(m.search('http://www.foo.com/x/cgi-bin/a.pl'), 3)
+        self.assertEqual(m.search('http://www.foo.com/a|x.html'), 4)
+        self.assertEqual(m.search('http://www.foo.com/index.html'), -1)
+        self.assertEqual(m.get_rule('http://www.foo.com/logo.gif'), r'\.gif$')
+        self.assertEqual(m.get_rule('http://www.foo.com/index.html'), None)
+        # Rules can be compiled regular expressions
+        m = self.HarvestManFilterMatcher([re.compile('foo'), re.compile('bar')])
+        self.assertEqual(m.get_rule('a/bar'), 'bar')
+
+    def test_alternation(self):
+        m = self.HarvestManFilterMatcher()
+        self.assertEqual(m._is_alternation('a|b'), True)
+        self.assertEqual(m._is_alternation('(a|b)c'), False)
+        self.assertEqual(m._is_alternation('[|]a'), False)
+        self.assertEqual(m._is_alternation('[]|]a'), False)
+        self.assertEqual(m._is_alternation('[^]|]a|b'), True)
+        self.assertEqual(m._is_alternation(r'\|a'), False)
+        self.assertEqual(m._is_alternation(r'(\)|a)|b'), True)
+
+    def test_groups(self):
+        # Rules with 300 groups in all take several regular
+        # expressions, each rule is still found
+        rules = ['/(p)(%d)/' % x for x in range(100)]
+        m = self.HarvestManFilterMatcher(rules)
+        self.assert_(len(m._regexes) > 1)
+        for x in range(100):
+            self.assertEqual(m.search('http://www.foo.com/p%d/' % x), x)
+
+    def test_order(self):
+        # The first rule matching is returned, not the one
+        # matching leftmost in the string
+        m = self.HarvestManFilterMatcher(['a.*z', 'b'])
+        self.assertEqual(m.search('xxbxxazz'), 0)
+        m = self.HarvestManFilterMatcher(['c', 'a.*z', 'b'])
+        self.assertEqual(m.search('xxbxxazz'), 1)
+        rules = ['/(p)(%d)/' % x for x in range(100)]
+        m = self.HarvestManFilterMatcher(rules)
+        self.assertEqual(m.search('http://www.foo.com/p60/p3/p70/'), 3)
+
+    def test_separate(self):
+        m = self.HarvestManFilterMatcher()
+        self.assertEqual(m.separatere.search(r'(a)(b)\2') is not None, True)
+        self.assertEqual(m.separatere.search(r'(?i)bar') is not None, True)
+        self.assertEqual(m.separatere.search(r'(a)?(?(1)b|c)') is not None, True)
+        self.assertEqual(m.separatere.search(r'a\\2(?:b)') is None, True)
+        self.assertEqual(m.separatere.search(r'\(?i)') is None, True)
+        # Inline flags apply to their own rule only
+        m = self.HarvestManFilterMatcher(['FOO', '(?i)bar'])
+        self.assertEqual(m.search('foo'), -1)
+        self.assertEqual(m.search('BAR'), 1)
+        # Backreferences refer to the groups of their rule
+        m = self.HarvestManFilterMatcher(['x(y)', '(a)(b)\\2', 'c'])
+        self.assertEqual(m.search('xabb'), 1)
+        self.assertEqual(m.search('cabb'), 1)
+        self.assertEqual(m.search('cab'), 2)
+        # Rules can have named groups of the same name
+        m = self.HarvestManFilterMatcher(['(?P<x>a)b', '(?P<x>c)d', 'e'])
+        self.assertEqual(m.search('cd'), 1)
+        self.assertEqual(m.search('eab'), 0)
+        self.assertEqual(m.search('e'), 2)
+
+    def test_junk_patterns(self):
+        # A url matches the junk patterns if any of them
+        # matches it, and the rule returned is the first
+        # of them matching it
+        patterns = self.JunkFilter.block_patterns
+        compiled = [(p, re.compile(p)) for p in patterns]
+        m = self.HarvestManFilterMatcher(patterns)
+        random.seed(3)
+        words = ['ads', 'ad', 'banner', 'counter.cgi', 'images', 'docs', 'x_ad.gif',
+                 'sponsors', 'index.html', 'logo.gif', 'promotions', 'werbung', 'a-ad1']
+        for x in range(1000):
+            url = 'http://www.foo.com/' + '/'.join([random.choice(words) for y in range(random.randint(1, 4))])
+            matches = [p for p, regex in compiled if regex.search(url)]
+            rule = m.get_rule(url)
+            if matches:
+                self.assertEqual(rule, matches[0])
+            else:
+                self.assertEqual(rule, None)
+
+class TestJunkFilter(unittest.TestCase):
+    """ Unit test class for JunkFilter class """
+
+    from rules import JunkFilter
+    from urlparser import HarvestManUrlParser
+
+    def check(self, url):
+        f = self.JunkFilter()
+        return (f.check(self.HarvestManUrlParser(url)), f.get_error_msg(), f.get_match())
+
+    def test_domains(self):
+        self.assertEqual(self.check('http://a.tribalfusion.com/index.html'),
+                         (False, '<Found domain match>', 'a.tribalfusion.com'))
+        self.assertEqual(self.check('http://m.doubleclick.net/index.html'),
+                         (False, '<Found base-domain match>', 'doubleclick.net'))
+        # Subdomains of blocked domains of more than two parts
+        self.assertEqual(self.check('http://x.a.tribalfusion.com/index.html'),
+                         (False, '<Found base-domain match>', 'a.tribalfusion.com'))
+        self.assertEqual(self.check('http://b.tribalfusion.com/index.html')[0], True)
+        # Blocked domains with a port
+        self.assertEqual(self.check('http://www.cybereps.com:8000/index.html'),
+                         (False, '<Found base-domain match>', 'cybereps.com:8000'))
+        self.assertEqual(self.check('http://www.cybereps.com/index.html')[0], True)
+        self.assertEqual(self.check('http://www.python.org/index.html'), (True, '<No Error>', ''))
+
+    def test_patterns(self):
+        self.assertEqual(self.check('http://www.foo.com/htmlad/1.html'),
+                         (False, '<Found pattern match>', '/htmlad/'))
+        self.assertEqual(self.check('http://www.foo.com/bar/siteads/1.ad')[0], False)
+        self.assertEqual(self.check('http://www.foo.com/doc/logo.gif')[0], True)
+
+class TestHarvestManRulesChecker(unittest.TestCase):
+    """ Unit test class for filters of HarvestManRulesChecker class """
+
+    from rules import HarvestManRulesChecker
+    from urlparser import HarvestManUrlParser
+
+    def setUp(self):
+        self.cfg = GetObject('config')
+        self.cfg.urlfilter = '+/docs/-*.gif'
+        self.cfg.serverfilter = '-*.foo.com+www.foo.com'
+        self.checker = self.HarvestManRulesChecker()
+        self.checker.make_filters()
+
+    def tearDown(self):
+        self.checker.clean_up()
+        self.cfg.urlfilter = self.cfg.serverfilter = ''
+        for name in ('inclfilter', 'exclfilter', 'allfilters', 'serverinclfilter',
+                     'serverexclfilter', 'allserverfilters'):
+            self.cfg[name] = []
+
+    def test_url_filter(self):
+        # The rule which comes first in the filter string
+        # decides when both kinds match
+        self.assertEqual(self.checker.apply_url_filter('http://www.bar.org/docs/a.gif'), 0)
+        self.assertEqual(self.checker.apply_url_filter('http://www.bar.org/docs/a.html'), 0)
+        self.assertEqual(self.checker.apply_url_filter('http://www.bar.org/x/a.gif'), 1)
+
+    def test_server_filter(self):
+        apply = lambda url: self.checker.apply_server_filter(self.HarvestManUrlParser(url))
+        self.assertEqual(apply('http://www.foo.com/a.html'), 1)
+        self.assertEqual(apply('http://ftp.foo.com/a.html'), 1)
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestHarvestManPriorityMatcher),
+                            unittest.makeSuite(TestHarvestManFilterMatcher),
+                            unittest.makeSuite(TestJunkFilter),
+                            unittest.makeSuite(TestHarvestManRulesChecker)))
+    unittest.TextTestRunner(verbosity=2).run(s)
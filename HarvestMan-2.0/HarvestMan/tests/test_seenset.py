@@ -0,0 +1,119 @@
+# -- coding: latin-1
+""" Unit test for seenset module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import md5
+import shutil
+import tempfile
+import threading
+import cPickle
+
+test_base.setUp()
+
+def make_hashes(start, end):
+    return [md5.new('http://www.foo.com/page%d.html' % x).hexdigest() for x in range(start, end)]
+
+class TestHarvestManSeenSet(unittest.TestCase):
+    """ Unit test class for HarvestManSeenSet class """
+
+    from seenset import HarvestManSeenSet
+
+    def setUp(self):
+        self.spooldir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spooldir, True)
+
+    def test_memory(self):
+        seen = self.HarvestManSeenSet(64, self.spooldir)
+        hashes = make_hashes(0, 20000)
+        self.assertEqual([seen.add(h) for h in hashes], [False]*20000)
+        self.assertEqual([seen.add(h) for h in hashes], [True]*20000)
+        self.assertEqual(len(seen), 20000)
+        self.assertEqual(False in [h in seen for h in hashes], False)
+        self.assertEqual(True in [h in seen for h in make_hashes(20000, 30000)], False)
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+    def test_disk(self):
+        # The table of a set without memory holds a few
+        # thousand urls, the rest go to disk
+        seen = self.HarvestManSeenSet(0, self.spooldir)
+        hashes = make_hashes(0, 20000)
+        for h in hashes:
+            seen.add(h)
+        self.assertEqual(len(seen), 20000)
+        self.assert_(seen._full)
+        self.assertEqual(len(os.listdir(self.spooldir)), 1)
+
+        self.assertEqual([seen.add(h) for h in hashes], [True]*20000)
+        self.assertEqual(True in [h in seen for h in make_hashes(20000, 30000)], False)
+
+        seen.close()
+        self.assertEqual(len(seen), 0)
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+    def test_buckets(self):
+        # Buckets are merged and sorted as they fill up,
+        # with small buckets for the test
+        import seenset
+        sizes = seenset.BUCKET_BUFFER, seenset.BUCKET_TAIL, seenset.BLOCK_SIZE
+        seenset.BUCKET_BUFFER, seenset.BUCKET_TAIL, seenset.BLOCK_SIZE = 4, 16, 8
+        try:
+            seen = self.HarvestManSeenSet(0, self.spooldir)
+            hashes = make_hashes(0, 40000)
+            for h in hashes:
+                seen.add(h)
+            self.assert_(max(seen._sorted) > 16)
+            self.assert_(max(seen._tails) > 0)
+            for bucket in range(seenset.NBUCKETS):
+                fps = seen._read_bucket(bucket, False)[:seen._sorted[bucket]].tolist()
+                self.assertEqual(fps, sorted(fps))
+
+            self.assertEqual(False in [h in seen for h in hashes], False)
+            self.assertEqual(True in [h in seen for h in make_hashes(40000, 50000)], False)
+            seen.close()
+        finally:
+            seenset.BUCKET_BUFFER, seenset.BUCKET_TAIL, seenset.BLOCK_SIZE = sizes
+
+    def test_state(self):
+        seen = self.HarvestManSeenSet(0, self.spooldir)
+        hashes = make_hashes(0, 10000)
+        for h in hashes:
+            seen.add(h)
+
+        copy = cPickle.loads(cPickle.dumps(seen, 2))
+        self.assertEqual(len(copy), 10000)
+        self.assertEqual(False in [h in copy for h in hashes], False)
+        self.assertEqual(True in [h in copy for h in make_hashes(10000, 15000)], False)
+        copy.close()
+        seen.close()
+
+    def test_threads(self):
+        seen = self.HarvestManSeenSet(0, self.spooldir)
+        hashes = make_hashes(0, 8000)
+        added = []
+
+        def add():
+            added.append(len([h for h in hashes if not seen.add(h)]))
+
+        threads = [threading.Thread(target=add) for x in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Each url is added by exactly one thread
+        self.assertEqual(sum(added), 8000)
+        self.assertEqual(len(seen), 8000)
+        seen.close()
+
+if __name__=="__main__":
+    s = unittest.makeSuite(TestHarvestManSeenSet)
+    unittest.TextTestRunner(verbosity=2).run(s)
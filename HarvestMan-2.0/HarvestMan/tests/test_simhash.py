@@ -0,0 +1,101 @@
+# -- coding: latin-1
+""" Unit test for simhash module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import random
+import pickle
+
+test_base.setUp()
+
+def make_page(seed, timestamp='Mon Jul 2 10:00:00 2007'):
+    random.seed(seed)
+    words = ['python', 'crawler', 'harvest', 'web', 'page', 'link', 'mirror', 'site',
+             'download', 'file', 'thread', 'queue', 'parser', 'robots', 'proxy', 'cache']
+    text = ' '.join([random.choice(words) for x in range(1000)])
+    return '<html><head><title>Page</title><script>var x = "%s";</script></head>' \
+           '<body><p>%s</p><p>Generated on %s</p></body></html>' % (seed, text, timestamp)
+
+class TestSimHash(unittest.TestCase):
+    """ Unit test class for the SimHash functions """
+
+    import simhash
+
+    def test_fingerprint(self):
+        fp = self.simhash.fingerprint(make_page(1))
+        self.assert_(0 <= fp < 2**64)
+        self.assertEqual(fp, self.simhash.fingerprint(make_page(1)))
+        # Markup is not part of the text
+        self.assertEqual(self.simhash.get_words('<a href="x.html">Foo</a> <b>bar</b>&amp;'), ['foo', 'bar'])
+        # Too short
+        self.assertEqual(self.simhash.fingerprint('<html><frameset></frameset></html>'), None)
+
+    def test_near_duplicates(self):
+        fp1 = self.simhash.fingerprint(make_page(1))
+        fp2 = self.simhash.fingerprint(make_page(1, 'Tue Jul 3 11:30:00 2007'))
+        fp3 = self.simhash.fingerprint(make_page(2))
+        # Pages differing in a timestamp are a few bits apart,
+        # different pages about half of the bits
+        self.assert_(self.simhash.distance(fp1, fp2) <= 3)
+        self.assert_(self.simhash.distance(fp1, fp3) > 16)
+
+class TestHarvestManSimHashIndex(unittest.TestCase):
+    """ Unit test class for HarvestManSimHashIndex class """
+
+    from simhash import HarvestManSimHashIndex
+    from simhash import distance as _distance
+    distance = staticmethod(_distance)
+
+    def test_bands(self):
+        # The index finds the same fingerprints as
+        # comparing against all of them
+        random.seed(3)
+        for k in (0, 1, 3, 7):
+            index = self.HarvestManSimHashIndex(k)
+            fps = [random.getrandbits(64) for x in range(200)]
+            for fp in fps:
+                index.add(fp)
+            for x in range(300):
+                fp = random.choice(fps)
+                for bit in random.sample(range(64), random.randint(0, k+2)):
+                    fp ^= (1L << bit)
+                found = index.find(fp)
+                near = [f for f in fps if self.distance(f, fp) <= k]
+                if near:
+                    self.assert_(found in near)
+                else:
+                    self.assertEqual(found, None)
+
+    def test_check(self):
+        index = self.HarvestManSimHashIndex(3)
+        self.assertEqual(index.check(0xffff0000L, 'foo.com'), False)
+        self.assertEqual(index.check(0xffff0007L, 'foo.com'), True)
+        self.assertEqual(index.check(0xffff000fL, 'foo.com'), False)
+        # Different key
+        self.assertEqual(index.check(0xffff0000L, 'bar.com'), False)
+        self.assertEqual(len(index), 3)
+
+    def test_size(self):
+        index = self.HarvestManSimHashIndex(2, 10)
+        fps = [(2**64 - 1)/(x + 3) for x in range(25)]
+        for fp in fps:
+            index.add(fp)
+        self.assertEqual(len(index), 10)
+        # Oldest fingerprints are dropped
+        self.assertEqual(index.find(fps[0]), None)
+        self.assertEqual(index.find(fps[-1]), fps[-1])
+        self.assertEqual(sum([len(bucket) for bucket in index._tables[0].values()]), 10)
+
+        index = pickle.loads(pickle.dumps(index))
+        self.assertEqual(index.check(fps[-1]), True)
+
+if __name__=="__main__":
+    s = unittest.TestSuite((unittest.makeSuite(TestSimHash),
+                            unittest.makeSuite(TestHarvestManSimHashIndex)))
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -9,6 +9,7 @@ Copyright (C) 2007, Anand B Pillai.
 import test_base
 import unittest
 import sys, os
+import random
 
 test_base.setUp()
 
@@ -196,7 +197,84 @@ class TestHarvestManUrlParser(unittest.TestCase):
         assert(self.l[18].get_anchor()=='')
         assert(self.l[19].get_anchor()=='')
         assert(self.l[20].get_anchor()=='')                
+
+    def test_join_url(self):
+        from urlparser import join_url
+
+        base = self.HarvestManUrlParser('http://www.foo.com:8080/bar/index.html')
+        jb = base.get_join_base()
+        assert(join_url(jb, 'python/test.htm')=='http://www.foo.com:8080/bar/python/test.htm')
+        assert(join_url(jb, '/test.css')=='http://www.foo.com:8080/test.css')
+        assert(join_url(jb, 'http://www.python.org:80/doc/')=='http://www.python.org/doc')
+        assert(join_url(jb, 'https://www.python.org')=='https://www.python.org/')
+        # These need a url object
+        for url in ('../up.png', '#anchor', 'a.html#x', 'www.fnorb.org/index.html', '//images.foo.com/a.png',
+                    'mailto:foo@bar.com', 'a.php?x=1&amp;y=2', 'macosx-10.4.ars', 'my photo.gif', '/'):
+            assert(join_url(jb, url)==None)
         
+        # The urls are the same as those of the url objects
+        random.seed(11)
+        atoms = ['a', 'b.html', 'c.', '.d', '..', '.', '/', '//', 'x.php?y=1', '#f', '&amp;', ' ', 'http://',
+                 'https://', 'www.', ':', ':81', 'HTTP://', 'q.ars', 'ftp://', '\\', 'e.f.g']
+        for baseurl in ('http://www.foo.com/', 'http://www.foo.com:8080/x/y/', 'https://s.org/p/q', 'ftp://f.net/pub/'):
+            base = self.HarvestManUrlParser(baseurl)
+            jb = base.get_join_base()
+            for x in range(1000):
+                url = ''.join([random.choice(atoms) for y in range(random.randint(1, 5))])
+                fullurl = join_url(jb, url)
+                if fullurl is not None:
+                    self.assertEqual(fullurl, self.HarvestManUrlParser(url, 'generic', 0, base).get_full_url())
+
+    def test_derived_values(self):
+
+        base = self.HarvestManUrlParser('http://www.foo.com/bar/index.html', 'webpage', 0, None, '/tmp/foo')
+        urlobj = self.HarvestManUrlParser('python/test', 'webpage', 0, base)
+        assert(urlobj.get_full_url()=='http://www.foo.com/bar/python/test')
+        hash1 = urlobj.get_url_hash()
+        dhash = urlobj.get_domain_hash()
+        # Values are recomputed when the paths change
+        urlobj.set_directory_url()
+        assert(urlobj.get_full_url()=='http://www.foo.com/bar/python/test/')
+        assert(urlobj.get_full_filename()=='/tmp/foo/www.foo.com/bar/python/test/index.html')
+        assert(urlobj.get_url_hash() != hash1)
+        assert(urlobj.get_domain_hash()==dhash)
+        urlobj.url = 'http://www.python.org/doc/tut.html'
+        urlobj.wrapper_resolveurl()
+        assert(urlobj.get_full_url()=='http://www.python.org/doc/tut.html')
+        assert(urlobj.get_full_filename()=='/tmp/foo/www.python.org/doc/tut.html')
+        assert(urlobj.get_domain_hash() != dhash)
+
+    def test_entities(self):
+
+        urlobj = self.HarvestManUrlParser('http://www.foo.com/a.php?x=1&amp;y=&lt;2&gt;&amp;lt;&bogus;  ')
+        assert(urlobj.get_full_url()=='http://www.foo.com/a.php?x=1&y=<2>&lt;&bogus;')
+        urlobj = self.HarvestManUrlParser('http://www.foo.com/caf&eacute;/&euro;.html')
+        assert(urlobj.get_full_url()=='http://www.foo.com/caf\xc3\xa9/\xe2\x82\xac.html')
+        urlobj = self.HarvestManUrlParser(u'http://www.foo.com/caf&eacute;/&euro;.html')
+        assert(urlobj.get_full_url()==u'http://www.foo.com/caf\xe9/\u20ac.html')
+
+    def test_resolution_cache(self):
+
+        cache = self.HarvestManUrlParser.resolutioncache
+        hits, misses = cache.hits, cache.misses
+        base1 = self.HarvestManUrlParser('http://www.foo.com/bar/one.html', 'webpage', 0, None, '/tmp/foo')
+        base2 = self.HarvestManUrlParser('http://www.foo.com/bar/two.html', 'webpage', 0, None, '/tmp/bar')
+        base3 = self.HarvestManUrlParser('http://www.foo.com/baz/bar/index.html', 'webpage', 0, None, '/tmp/foo')
+        url1 = self.HarvestManUrlParser('../python/test.html#x', 'anchor', 0, base1)
+        url2 = self.HarvestManUrlParser('../python/test.html#x', 'anchor', 0, base1)
+        url3 = self.HarvestManUrlParser('../python/test.html#x', 'anchor', 0, base2)
+        url4 = self.HarvestManUrlParser('../python/test.html#x', 'anchor', 0, base3)
+        self.assertEqual(cache.hits - hits, 1)
+        self.assertEqual(cache.misses - misses, 6)
+        assert(url2.get_full_url()=='http://www.foo.com/python/test.html')
+        assert(url2.get_anchor()=='#x')
+        assert(url3.get_full_filename()=='/tmp/bar/www.foo.com/python/test.html')
+        assert(url4.get_full_url()=='http://www.foo.com/baz/python/test.html')
+        # Same href of another type
+        url5 = self.HarvestManUrlParser('../python/test.html#x', 'webpage', 0, base2)
+        assert(url5.get_full_url()=='http://www.foo.com/python/test.html#x')
+        assert(url5.get_anchor()=='')
+                    
 if __name__=="__main__":
     s = unittest.makeSuite(TestHarvestManUrlParser)
     unittest.TextTestRunner(verbosity=2).run(s)
@@ -0,0 +1,138 @@
+# -- coding: latin-1
+""" Unit test for urlstore module
+
+Created: Anand B Pillai <abpillai@gmail.com>
+
+Copyright (C) 2007, Anand B Pillai.
+"""
+
+import test_base
+import unittest
+import sys, os
+import gc
+import copy
+import cPickle
+import shutil
+import tempfile
+
+test_base.setUp()
+
+class TestHarvestManUrlStore(unittest.TestCase):
+    """ Unit test class for HarvestManUrlStore class """
+
+    from urlstore import HarvestManUrlStore
+    from urlparser import HarvestManUrlParser
+    from urltypes import TYPE_ANY, TYPE_WEBPAGE
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'urls.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname, True)
+
+    def make_store(self, memory):
+        # Two pages with ten links each, the url objects
+        # are referred to only by the store
+        store = self.HarvestManUrlStore()
+        store.open(self.filename, memory)
+        urls = {}
+        for x in range(2):
+            page = self.HarvestManUrlParser('http://www.foo.com/docs/page%d.html' % x,
+                                            self.TYPE_WEBPAGE, 0, None, '/tmp/project')
+            page.set_index()
+            store.add(page)
+            urls[page.index] = page.get_full_url()
+            for y in range(10):
+                urlobj = self.HarvestManUrlParser('item%d-%d.html' % (x, y), self.TYPE_ANY, False, page)
+                urlobj.set_index()
+                store.add(urlobj)
+                urls[urlobj.index] = urlobj.get_full_url()
+
+        return store, urls
+
+    def test_unbounded(self):
+        store, urls = self.make_store(0)
+        self.assertEqual(len(store), 22)
+        for index, url in urls.items():
+            self.assertEqual(store.get(index).get_full_url(), url)
+        self.assertEqual(os.path.exists(self.filename), False)
+        self.assertRaises(KeyError, store.get, max(urls) + 1)
+
+    def test_eviction(self):
+        store, urls = self.make_store(5)
+        gc.collect()
+        self.assertEqual(len(store), 22)
+        self.assertEqual(len(store._urls), 5)
+        self.assert_(os.path.getsize(self.filename) > 0)
+
+        indices = urls.keys()
+        indices.sort()
+        for index in indices:
+            urlobj = store.get(index)
+            self.assertEqual(urlobj.index, index)
+            self.assertEqual(urlobj.get_full_url(), urls[index])
+        self.assertEqual(list(store.iterkeys()), indices)
+        self.assertEqual(len(store.values()), 22)
+
+        # Links of a page share the base url object
+        links = [store.get(index) for index in indices[1:11]]
+        self.assert_(False not in [link.baseurl is links[0].baseurl for link in links])
+        self.assertEqual(links[0].baseurl.index, indices[0])
+
+        store.close()
+        self.assertEqual(os.path.exists(self.filename), False)
+
+    def test_base(self):
+        # The base url object is saved as its index whenever
+        # the store has it, also if the base url object of the
+        # link is not the one in the store
+        store = self.HarvestManUrlStore()
+        store.open(self.filename, 1)
+        page = self.HarvestManUrlParser('http://www.foo.com/docs/index.html',
+                                        self.TYPE_WEBPAGE, 0, None, '/tmp/project')
+        page.set_index()
+        store.add(page)
+        base = copy.copy(page)
+        link = self.HarvestManUrlParser('item.html', self.TYPE_ANY, False, base)
+        link.set_index()
+        store.add(link)
+        other = self.HarvestManUrlParser('http://www.bar.com/')
+        other.set_index()
+        store.add(other)
+        index = link.index
+        del page, base, link, other
+        gc.collect()
+
+        store._file.seek(store._offsets[index])
+        state = cPickle.loads(store._file.read(store._sizes[index]))
+        self.assertEqual(state['baseurl'], index - 1)
+        link = store.get(index)
+        self.assert_(link.baseurl is store.get(index - 1))
+        self.assertEqual(link.get_full_url(), 'http://www.foo.com/docs/item.html')
+        store.close()
+
+    def test_update(self):
+        store, urls = self.make_store(3)
+        indices = urls.keys()
+        indices.sort()
+
+        # A change is kept if the url object is added again
+        urlobj = store.get(indices[1])
+        urlobj.status = 404
+        store.add(urlobj)
+        del urlobj
+        for index in indices[2:]:
+            store.get(index)
+        gc.collect()
+        self.assertEqual(store.get(indices[1]).status, 404)
+
+        d = store.get_dict()
+        self.assertEqual(len(d), 22)
+        copy = self.HarvestManUrlStore()
+        copy.update(d)
+        self.assertEqual(copy.get(indices[1]).get_full_url(), urls[indices[1]])
+
+if __name__=="__main__":
+    s = unittest.makeSuite(TestHarvestManUrlStore)
+    unittest.TextTestRunner(verbosity=2).run(s)
@@ -147,6 +147,11 @@ class HarvestManUrlCollection(object):
             self._sourcetyp = urltypes.TYPE_NONE
             
         self._collections = {}
+        # Links for which no url objects were created
+        self._skipped = []
+        # Id of the collection in the journal of the
+        # crawl, which is set when it is queued
+        self._id = None
 
     def _getContext(self, urlobj):
         """ Return the context at which the URL urlobj is to
@@ -185,6 +190,31 @@ class HarvestManUrlCollection(object):
         else:
             raise HarvestManUrlCollectionException, 'Error: mismatch in context and bag URL types!'
 
+    def addSkippedURL(self, typ, url, cgi=False):
+        """ Add a link of the given type for which no url object
+        was created. Such links are resolved against the source url
+        only when needed, for example for localising them """
+
+        self._skipped.append((typ, url, cgi))
+
+    def getSkippedURLs(self):
+        """ Return the list of (type, url, cgi) of links for
+        which no url objects were created """
+
+        # Collections saved by older versions do not have this
+        return getattr(self, '_skipped', [])
+    
+    def getId(self):
+        """ Return the journal id of this collection """
+
+        # Collections saved by older versions do not have this
+        return getattr(self, '_id', None)
+
+    def setId(self, id):
+        """ Set the journal id of this collection """
+
+        self._id = id
+        
     def getSourceURL(self):
         """ Return the source URL object """
 
@@ -42,10 +42,87 @@ import mimetypes
 import copy
 import urlproc
 import md5
+import threading
+import hosts
 
 from common.common import *
+from common.lrucache import LRU
 from urltypes import *
 
+def _intern(s):
+    """ Return the interned copy of s, if it
+    is a plain string """
+
+    if type(s) is str:
+        return intern(s)
+    return s
+
+class HarvestManResolutionCache(object):
+    """ Bounded LRU cache of the results of resolving urls
+    against the directories of their base urls. Sites repeat
+    the same navigation links on every page, so the same urls
+    are resolved against the same directories many times.
+    A cache of size zero is disabled """
+
+    def __init__(self, size=10000):
+        self.size = size
+        self._cache = LRU(size)
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+    
+    def get(self, key):
+        """ Return the resolution result for the key,
+        or None if it is not in the cache """
+
+        if not self.size:
+            return None
+        
+        self._lock.acquire()
+        try:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+        finally:
+            self._lock.release()
+
+    def put(self, key, value):
+        """ Add the resolution result for the key """
+
+        if not self.size:
+            return
+        
+        self._lock.acquire()
+        try:
+            self._cache[key] = value
+        finally:
+            self._lock.release()
+
+    def hit_rate(self):
+        """ Return the percentage of lookups which
+        found their key in the cache """
+
+        total = self.hits + self.misses
+        if total:
+            return 100.0*self.hits/total
+        return 0.0
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._cache = LRU(self.size)
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self._lock.release()
+            
 class HarvestManUrlParserError(Exception):
 
     def __init__(self, value):
@@ -131,6 +208,34 @@ class HarvestManUrlParser(object):
     # Special string replacements
     special_strings_repl = (' ','~','+','"','<','>','#','%','{','}','|','\\','^','[',']','`')
 
+    # Millions of url objects can be alive in a crawl, so
+    # they keep their attributes in slots instead of a dict.
+    # Directory paths are tuples, domain and path strings are
+    # interned, and the archive of the paths before the url
+    # was re-resolved is created only when that happens.
+    # Url objects are weakly referenced by the url store of
+    # the data manager once they are written to disk.
+    __slots__ = ('url', 'origurl', 'typ', 'cgi', 'anchor', 'index', 'filename',
+                 'validfilename', 'lastpath', 'protocol', 'defproto', 'filelike',
+                 'status', 'fatal', 'starturl', 'hasextn', 'isrel', 'isrels',
+                 'port', 'domain', 'rpath', 'rdepth', 'rindex', 'contentdict',
+                 'generation', 'priority', 'violatesrules', 'rulescheckdone',
+                 'range', 'trymultipart', 'mindex', 'clength', 'dirpath',
+                 'reresolved', 'baseurl', 'pagehash', 'useoldfilename',
+                 'rootdir', '_old', '_fullurl', '_urlhash', '_host',
+                 '_localdir', '__weakref__')
+
+    # Values derived from the paths, computed when they
+    # are first asked for and cleared when the paths change
+    _derived = ('_fullurl', '_urlhash', '_host', '_localdir')
+
+    # Cache of resolution results shared by all url objects
+    resolutioncache = HarvestManResolutionCache()
+    
+    # Archive of the paths of a re-resolved url, as
+    # (dirpath, rpath, filename, validfilename, domain)
+    _noold = ((), (), 'index.html', 'index.html', '')
+    
     def reset_IDX(cls):
         HarvestManUrlParser.IDX = 0
 
@@ -143,11 +248,10 @@ class HarvestManUrlParser(object):
         else:
             self.url = url
 
-        # Process URL
-        self.url = urlproc.modify_url(self.url)
         # For saving original url
         # since self.url can get
-        # modified
+        # modified. This is set
+        # by resolve.
         self.origurl = self.url
         self.typ = urltype
         self.cgi = cgi
@@ -181,10 +285,12 @@ class HarvestManUrlParser(object):
         self.port = 80
         self.domain = ''
         self.rpath = []
+        self.rindex = 0
         # Recursion depth
         self.rdepth = 0
-        # Content information for updating urls
-        self.contentdict = {}
+        # Content information for updating urls,
+        # created when it is set
+        self.contentdict = None
         # Url generation
         self.generation = 0
         # Url priority
@@ -205,15 +311,8 @@ class HarvestManUrlParser(object):
         # content.
         self.clength = 0
         self.dirpath = []
-        # Archive for self.dirpath
-        self.dirpathold = []
-        # Archive for self.filename
-        self.filenameold = 'index.html'
-        self.validfilenameold = 'index.html'
-        # Archive for self.rpath
-        self.rpathold = []
-        # Archive for self.domain
-        self.domainold = ''
+        # Archive of the paths, see _noold
+        self._old = None
         # Re-computation flag
         self.reresolved = False
         self.baseurl = None
@@ -233,13 +332,64 @@ class HarvestManUrlParser(object):
             if self.baseurl and self.baseurl.rootdir:
                 self.rootdir = self.baseurl.rootdir
             else:
-                self.rootdir = os.getcwd()
+                self.rootdir = _intern(os.getcwd())
         else:
-            self.rootdir = rootdir
-            
-        self.anchorcheck()
-        self.resolveurl()
+            self.rootdir = _intern(rootdir)
+
+        self.clear_derived()
+        self.resolve()
 
+    def __getstate__(self):
+        state = {}
+        for attr in self.__slots__:
+            if attr in self._derived or attr == '__weakref__':
+                continue
+            try:
+                state[attr] = getattr(self, attr)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        self.clear_derived()
+        old = list(self._noold)
+        for attr, value in state.items():
+            # Url objects pickled before slots were used
+            # keep the archived paths as attributes
+            if attr in ('dirpathold', 'rpathold', 'filenameold', 'validfilenameold', 'domainold'):
+                old[('dirpathold', 'rpathold', 'filenameold', 'validfilenameold', 'domainold').index(attr)] = value
+                continue
+            if attr in ('dirpath', 'rpath'):
+                value = tuple(value)
+            setattr(self, attr, value)
+
+        if not hasattr(self, '_old'):
+            self._old = None
+            if state.get('reresolved'):
+                self._old = (tuple(old[0]), tuple(old[1]), old[2], old[3], old[4])
+        if not self.contentdict:
+            self.contentdict = None
+
+    def clear_derived(self):
+        """ Clear the cached values derived from the paths
+        of this url, to be called when the paths change """
+
+        self._fullurl = None
+        self._urlhash = None
+        self._host = None
+        self._localdir = None
+        
+    def _get_old(self, index):
+        if self._old is None:
+            return self._noold[index]
+        return self._old[index]
+
+    dirpathold = property(lambda self: self._get_old(0), doc='Archive for dirpath')
+    rpathold = property(lambda self: self._get_old(1), doc='Archive for rpath')
+    filenameold = property(lambda self: self._get_old(2), doc='Archive for filename')
+    validfilenameold = property(lambda self: self._get_old(3), doc='Archive for validfilename')
+    domainold = property(lambda self: self._get_old(4), doc='Archive for domain')
+    
     def re_init(self):
         """ Reinitialize some of the attributes """
 
@@ -259,23 +409,22 @@ class HarvestManUrlParser(object):
         self.port = 80
         self.domain = ''
         self.rpath = []
+        self.rindex = 0
         # Recursion depth
         self.rdepth = 0
         self.dirpath = []
         self.rpath = []
         self.filename = 'index.html'
         self.validfilename = 'index.html'
+        self.clear_derived()
         
     def wrapper_resolveurl(self):
         """ Called forcefully to re-resolve a URL """
 
         extrainfo("Re-resolving URL: Current is %s..." % self.get_full_url())
         # Make archives of everything
-        self.dirpathold = self.dirpath[:]
-        self.rpathold = self.rpath[:]
-        self.filenameold = self.filename[:]
-        self.validfilenameold = self.validfilename[:]
-        self.domainold = self.domain[:]
+        self._old = (self.dirpath, self.rpath, self.filename,
+                     self.validfilename, self.domain)
         self.re_init()
         
         self.anchorcheck()
@@ -360,6 +509,73 @@ class HarvestManUrlParser(object):
         
             return False
         
+    def get_resolution_key(self):
+        """ Return the key of this url in the resolution cache.
+        Absolute urls resolve the same against any base url,
+        relative ones depend on the directory of the base url,
+        and anchor urls on the full url of the base url. Unicode
+        urls, which would match the keys of byte string urls,
+        are not cached and have no key """
+
+        url = self.url
+        if type(url) is not str:
+            return None
+        
+        # Entities are replaced before the protocol
+        # is looked for, see resolve
+        if '&' not in url:
+            url2 = url.lower()
+            for proto in self.protocol_map:
+                if proto in url2:
+                    return (url, None)
+
+        base = self.baseurl
+        if not base:
+            return (url, )
+        elif self.typ == 'anchor':
+            return (url, base.protocol, base.domain, base.port, base.dirpath, base.get_full_url())
+        else:
+            return (url, base.protocol, base.domain, base.port, base.dirpath)
+        
+    def resolve(self):
+        """ Resolve the url, copying the result from the
+        resolution cache if the same url has been resolved
+        against the same base directory before """
+
+        key = self.get_resolution_key()
+        cache = self.resolutioncache
+        values = None
+        if key is not None:
+            values = cache.get(key)
+            
+        if values is None:
+            # Process URL
+            self.url = urlproc.modify_url(self.url)
+            self.origurl = self.url
+            self.anchorcheck()
+            self.resolveurl()
+            if key is not None:
+                cache.put(key, self.get_resolution())
+        else:
+            self.set_resolution(values)
+
+    def get_resolution(self):
+        """ Return the attributes set by resolving the url """
+        
+        return (self.url, self.origurl, self.anchor, self.protocol, self.port,
+                self.defproto, self.isrel, self.isrels, self.rpath, self.rindex,
+                self.dirpath, self.lastpath, self.hasextn, self.filelike,
+                self.filename, self.validfilename, self.domain)
+
+    def set_resolution(self, values):
+        """ Set the attributes of the url from the result
+        of an earlier resolution """
+        
+        (self.url, self.origurl, self.anchor, self.protocol, self.port,
+         self.defproto, self.isrel, self.isrels, self.rpath, self.rindex,
+         self.dirpath, self.lastpath, self.hasextn, self.filelike,
+         self.filename, self.validfilename, self.domain) = values
+            
     def resolveurl(self):
         """ Resolves the url finding out protocol, port, domain etc
         . Also resolves relative paths and builds a local file name
@@ -459,6 +675,14 @@ class HarvestManUrlParser(object):
         self.compute_dirpaths(paths)
         self.compute_domain_and_port()
 
+        # Keep the paths as tuples of interned strings, since
+        # they are shared by many urls of the same site
+        self.dirpath = tuple([_intern(item) for item in self.dirpath])
+        self.rpath = tuple(self.rpath)
+        self.domain = _intern(self.domain)
+        self.protocol = _intern(self.protocol)
+        self.clear_derived()
+        
         # For some file extensions, automatically set as directory URL.
         if self.validfilename:
             extn = ((os.path.splitext(self.validfilename))[1]).lower()
@@ -542,13 +766,13 @@ class HarvestManUrlParser(object):
             self.rpath.reverse()
             if len(self.rpath) == 0 :
                 if not self.rindex:
-                    self.dirpath = self.baseurl.dirpath + self.dirpath
+                    self.dirpath = list(self.baseurl.dirpath) + self.dirpath
             else:
-                pathstack = self.baseurl.dirpath[0:]
+                pathstack = list(self.baseurl.dirpath)
                 
                 for ritem in self.rpath:
                     if ritem == self.DOT:
-                        pathstack = self.baseurl.dirpath[0:]
+                        pathstack = list(self.baseurl.dirpath)
                     elif ritem == self.DOTDOT:
                         if len(pathstack) !=0:
                             pathstack.pop()
@@ -771,7 +995,7 @@ class HarvestManUrlParser(object):
     def get_url_content_info(self):
         """ Get the url content information """
         
-        return self.contentdict
+        return self.contentdict or {}
     
     def get_anchor(self):
         """ Return the anchor tag of this url """
@@ -861,6 +1085,13 @@ class HarvestManUrlParser(object):
         """ Return the full url path of this url object after
         resolving relative paths, filenames etc """
 
+        if self._fullurl is None:
+            self._fullurl = self.make_full_url()
+        return self._fullurl
+
+    def make_full_url(self):
+        """ Build the full url path of this url object """
+        
         rval = self.get_full_domain_with_port()
         if self.dirpath:
             newpath = "".join([ x+self.URLSEP for x in self.dirpath if x and not x[-1] ==self.URLSEP])
@@ -874,6 +1105,18 @@ class HarvestManUrlParser(object):
             
         return self.make_valid_url(rval)
 
+    def get_join_base(self):
+        """ Return the (protocol, full domain with port, directory
+        path) strings against which relative urls are resolved with
+        this url as base, for use with join_url. Returns None if
+        urls cannot be resolved on strings against this url """
+
+        if self.protocol not in ('http://', 'https://', 'ftp://'):
+            return None
+
+        dirpath = "".join([ x+self.URLSEP for x in self.dirpath if x and not x[-1] ==self.URLSEP])
+        return (self.protocol, self.get_full_domain_with_port(), self.URLSEP + dirpath)
+    
     def get_full_url_sans_port(self):
         """ Return absolute url without the port number """
 
@@ -952,16 +1195,27 @@ class HarvestManUrlParser(object):
     def get_url_hash(self):
         """ Return a hash value for the URL """
 
-        m = md5.new()
-        m.update(self.get_full_url())
-        return str(m.hexdigest())
+        if self._urlhash is None:
+            self._urlhash = md5.new(self.get_full_url()).hexdigest()
+        return self._urlhash
     
     def get_domain_hash(self):
         """ Return the hask value for the domain """
 
-        m = md5.new()
-        m.update(self.get_full_domain())
-        return str(m.hexdigest())
+        return self.get_host().domainhash
+
+    def get_host(self):
+        """ Return the record of the host (protocol, domain
+        and port) of this url in the host table """
+
+        if self._host is None:
+            self._host = hosts.get_host(self.protocol, self.domain, self.port)
+        return self._host
+
+    def get_host_id(self):
+        """ Return the id of the host of this url """
+        
+        return self.get_host().id
 
     def get_data_hash(self):
         """ Return the hash value for the URL data """
@@ -1230,6 +1484,9 @@ class HarvestManUrlParser(object):
     def get_local_directory(self):
         """ Return the local directory path of this url w.r.t
         the directory on the disk where we save the files of this url """
+
+        if self._localdir is not None:
+            return self._localdir
         
         # Gives Local Direcory path equivalent to URL Path in server
         rval = os.path.join(self.rootdir, self.domain)
@@ -1238,7 +1495,8 @@ class HarvestManUrlParser(object):
             if not diry: continue
             rval = os.path.abspath( os.path.join(rval, self.make_valid_filename(diry)))
 
-        return os.path.normpath(rval)
+        self._localdir = os.path.normpath(rval)
+        return self._localdir
 
     def get_local_directory_old(self):
         """ Return the old local directory path of this url w.r.t
@@ -1267,8 +1525,9 @@ class HarvestManUrlParser(object):
         self.filelike = False
         if not self.dirpath or \
                (self.dirpath and self.dirpath[-1] != self.lastpath):
-            self.dirpath.append(self.lastpath)
+            self.dirpath = self.dirpath + (self.lastpath,)
         self.validfilename = 'index.html'
+        self.clear_derived()
         
     def set_url_content_info(self, headers):
         """ This function sets the url content information of this
@@ -1306,18 +1565,20 @@ class HarvestManUrlParser(object):
             # Anything can be done on this only if this
             # is a HarvestManUrlParser object
             if isinstance(parent, HarvestManUrlParser):
-                parent.dirpath.append(parent.filename)
+                parent.dirpath = parent.dirpath + (parent.filename,)
                 parent.filename = 'index.html'
                 parent.validfilename = 'index.html'
+                parent.clear_derived()
 
         # Case 2 - trying to save as file when the
         # path is an existing directory.
         # Solution - Save as index.html in the directory
         filename = self.get_full_filename()
         if os.path.isdir(filename):
-            self.dirpath.append(self.filename)
+            self.dirpath = self.dirpath + (self.filename,)
             self.filename = 'index.html'
             self.validfilename = 'index.html'
+            self.clear_derived()
         
     def manage_content_type(self, content_type):
         """ This function gets called from connector modules
@@ -1360,6 +1621,91 @@ class HarvestManUrlParser(object):
     # ============ End - Set Methods =========== #
 
 
+# Characters in urls which need the full parsing
+# of a url object for resolving them
+_unsafe_re = re.compile(r'[\s&#\\]')
+_wwwre = re.compile(r'^www(\d?)\.', re.IGNORECASE)
+
+def join_url(base, url):
+    """ Resolve the url string against the base returned by
+    get_join_base of a url object, and return the full url which
+    a url object created for the url with that base would have.
+    This works on the strings alone, so it is much cheaper than
+    creating the url object. Returns None if the url is not a
+    plain relative or absolute url which can be resolved this way,
+    such as urls with anchors, entities or dot paths. """
+
+    if base is None or _unsafe_re.search(url):
+        return None
+    
+    # A trailing / is dropped by the url object
+    if url[-1:] == '/':
+        url = url[:-1]
+    if not url:
+        return None
+
+    klass = HarvestManUrlParser
+    
+    if url.find('://') != -1:
+        # Absolute url
+        for proto in base[0], 'http://', 'https://', 'ftp://':
+            if url.startswith(proto):
+                break
+        else:
+            return None
+
+        items = url[len(proto):].split(klass.URLSEP)
+        domain, paths = items[0], items[1:]
+        if domain.find('://') != -1 or url.find('://', len(proto)) != -1:
+            return None
+        
+        port = klass.protocol_map[proto]
+        index = domain.find(klass.PORTSEP)
+        if index != -1:
+            if not domain[index+1:].isdigit():
+                return None
+            domain, port = domain[:index], int(domain[index+1:])
+        if not domain:
+            return None
+
+        site = proto + domain
+        if port != klass.protocol_map[proto]:
+            site = site + klass.PORTSEP + str(port)
+        
+        if not paths:
+            return site + klass.URLSEP
+        prefix = klass.URLSEP
+    else:
+        # Relative url
+        if url.find(klass.PORTSEP) != -1 or _wwwre.match(url):
+            return None
+
+        site = base[1]
+        if url[0] == klass.URLSEP:
+            if url[1:2] == klass.URLSEP:
+                return None
+            paths = url[1:].split(klass.URLSEP)
+            prefix = klass.URLSEP
+        else:
+            paths = url.split(klass.URLSEP)
+            prefix = base[2]
+
+    for item in paths:
+        if item in ('', klass.DOT, klass.DOTDOT):
+            return None
+
+    # The last path should be a file name
+    lastpath = paths[-1]
+    dotindex = lastpath.find(klass.DOT)
+    if dotindex == 0 or dotindex == len(lastpath) - 1:
+        return None
+    lastpath = lastpath.lower()
+    for extn in klass.default_directory_extns:
+        if lastpath.find(extn) != -1:
+            return None
+        
+    return "".join((site, prefix, klass.URLSEP.join(paths)))
+
 if __name__=="__main__":
     import config
     import logger
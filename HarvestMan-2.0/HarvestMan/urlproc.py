@@ -23,6 +23,7 @@
 __version__ = '2.0 b1'
 __author__ = 'Anand B Pillai'
 
+import re
 import unicodedata
 
 char_names = ['LESS-THAN SIGN',
@@ -176,7 +177,22 @@ ampersand_strings = ('&lt;','&gt;','&amp;','&quot;',
                      '&uml;','&ordf;','&not;','&trade;',
                      '&macr;','&acute;','&cedil;','&ordm;','&times;',
                      '&divide;')
-                         
+
+# Characters of the entities, for unicode urls
+# and encoded in utf-8 for byte string urls
+entity_chars = dict(zip(ampersand_strings,
+                        [unicodedata.lookup(name) for name in char_names]))
+entity_bytes = dict([(entity, char.encode('utf-8')) for entity, char in entity_chars.items()])
+
+entity_re = re.compile(r'&[a-zA-Z0-9]+;')
+
+def replace_entity(match):
+    entity = match.group()
+    return entity_bytes.get(entity, entity)
+
+def replace_entity_unicode(match):
+    entity = match.group()
+    return entity_chars.get(entity, entity)
                          
 def modify_url(url):
     """ Replace entity characters in URLs with the original
@@ -184,14 +200,16 @@ def modify_url(url):
     
     # Remove trailing wspace chars.
     url = url.rstrip()
-    
-    for ampersand_string, ucode_name in zip(ampersand_strings, char_names):
-        if url.find(ampersand_string) != -1:
-            ucode_char = unicodedata.lookup(ucode_name)
-            url = url.encode('utf-8')
-            url = url.replace(ampersand_string, ucode_char)
 
-    return url
+    if '&' not in url:
+        return url
+
+    # Entities are replaced in a single pass, so an
+    # entity such as '&amp;lt;' is replaced by '&lt;'
+    if type(url) is unicode:
+        return entity_re.sub(replace_entity_unicode, url)
+    else:
+        return entity_re.sub(replace_entity, url)
 
 def main():
     # Test code
@@ -19,11 +19,11 @@
 __version__ = '2.0 b1'
 __author__ = 'Anand B Pillai'
 
-import bisect
 from Queue import *
 import time
 
 import crawler
+import frontier
 
 import threading
 import sys, os
@@ -32,34 +32,6 @@ import urltypes
 
 from common.common import *
 
-class PriorityQueue(Queue):
-    """ Priority queue based on bisect module (courtesy: Effbot) """
-
-    def __init__(self, maxsize=0):
-        Queue.__init__(self, maxsize)
-
-    def _init(self, maxsize):
-        self.maxsize = maxsize
-        self.queue = MyDeque()
-        
-    def _put(self, item):
-        bisect.insort(self.queue, item)
-
-    def __len__(self):
-        return len(self.queue)
-    
-    def _qsize(self):
-        return len(self.queue)
-
-    def _empty(self):
-        return not self.queue
-
-    def _full(self):
-        return self.maxsize>0 and len(self.queue) == self.maxsize
-
-    def _get(self):
-        return self.queue.pop(0)    
-    
 class HarvestManCrawlerQueue(object):
     """ This class functions as the thread safe queue
     for storing url data for tracker threads """
@@ -87,22 +59,74 @@ class HarvestManCrawlerQueue(object):
         # before stopping the project with a timeout.
         self._waittime = GetObject('config').projtimeout
         self._configobj = GetObject('config')
-        if self._configobj.fastmode:
-            self.url_q = PriorityQueue(4*self._configobj.maxtrackers)
-            self.data_q = PriorityQueue(4*self._configobj.maxtrackers)
-        else:
-            self.url_q = PriorityQueue(0)
-            self.data_q = PriorityQueue(0)
-            
-        # Local buffer - new in 1.4.5
-        self.buffer = []
+        self._make_queues()
+
         # Condition object for exit condition checking
         # loop - to halt exit condition check, acquire this lock
         self._cond = threading.Condition(threading.Lock())
         # Event object
         self._evt = threading.Event()
         self._evt.set()
+        # Number of items pushed to the queues which are
+        # not yet fully processed by the tracker threads
+        self._outstanding = 0
+        # Condition object which is notified when the
+        # outstanding work drops to zero
+        self._workcond = threading.Condition(threading.Lock())
+        # Interval at which the main loop wakes up to
+        # check for timeouts & hanging threads
+        self._checkinterval = 5.0
+        # Time of the last check of the balance of
+        # crawler & fetcher threads
+        self._lastbalancetime = time.time()
         
+    def _make_queues(self):
+        """ Create the url & data queues from the settings
+        of the configuration """
+
+        cfg = self._configobj
+        
+        # Fetchers block when the data queue is full. The url
+        # queue is not bounded, since crawlers blocking on it
+        # while fetchers block on the data queue can deadlock.
+        # If frontier memory is set, the queues keep only
+        # that many items in memory and spill the rest to
+        # disk, so they need not be bounded.
+        if cfg.fastmode and not cfg.frontiermemory:
+            qsize = 4*cfg.maxtrackers
+        else:
+            qsize = 0
+
+        # The url queue takes care of politeness by handing
+        # out urls of a server only after its time gap expires.
+        # Servers are keyed on their domain name, so that urls
+        # of other protocols or ports of the same server share
+        # its time gap.
+        # Spilled urls are written as url indices, the objects
+        # are looked up in the data manager when paged in.
+        self.url_q = frontier.HarvestManHostFrontier(0,
+                                                     delay=cfg.sleeptime,
+                                                     randomize=cfg.randomsleep,
+                                                     adaptive=cfg.adaptivedelay,
+                                                     factor=cfg.delayfactor,
+                                                     maxdelay=cfg.maxdelay,
+                                                     hostdelays=frontier.parse_host_delays(cfg.hostdelay),
+                                                     hostfunc=lambda item: item[1].get_domain(),
+                                                     memory=cfg.frontiermemory,
+                                                     spooldir=GetMyTempDir(),
+                                                     dumpfunc=self._dump_url,
+                                                     loadfunc=self._load_url)
+        self.data_q = frontier.HarvestManFrontier(qsize,
+                                                  memory=cfg.frontiermemory,
+                                                  spooldir=GetMyTempDir())
+
+    def _dump_url(self, item):
+        # Compact record for a spilled url queue item
+        return (item[0], item[1].index)
+
+    def _load_url(self, rec):
+        return (rec[0], GetObject('datamanager').get_url(rec[1]))
+    
     def get_state(self):
 
         # Set flag
@@ -118,14 +142,13 @@ class HarvestManCrawlerQueue(object):
         d['_lasttimestamp'] = self._lasttimestamp
         d['_requests'] = self._requests
         d['_lastblockedtime'] = self._lastblockedtime
-        d['buffer'] = self.buffer
         d['_baseUrlObj'] = self._baseUrlObj
         
-        # For the queues, get their contents
-        q1 = self.url_q.queue
+        # For the queues, get their contents in pop order
+        q1 = self.url_q.get_items()
         # This is an index of priorities and url indices
         d['url_q'] = q1
-        q2 = self.data_q.queue
+        q2 = self.data_q.get_items()
         d['data_q'] = q2
 
         # Thread dictionary
@@ -139,7 +162,6 @@ class HarvestManCrawlerQueue(object):
             
             d2['_url'] = t._url
             d2['_urlobject'] = t._urlobject
-            d2['buffer'] = t.buffer
             d2['role'] = t.get_role()
             if t.get_role() == 'crawler':
                 d2['links'] = t.links
@@ -171,20 +193,39 @@ class HarvestManCrawlerQueue(object):
         self._lasttimestamp = state.get('_lasttimestamp', time.time())
         self._requests = state.get('_requests', 0)
         self._lastblockedtime = state.get('_lastblockedtime', 0)
-        self.buffer = state.get('buffer', [])
 
-        # Set state for queues
-        self.url_q.queue = state.get('url_q', MyDeque())
+        # The queues are created again, since the
+        # configuration of the saved crawl, which sets
+        # their delays and memory, is restored by now.
+        self._configobj = GetObject('config')
+        self._waittime = self._configobj.projtimeout
+        self._make_queues()
         
-        self.data_q.queue = state.get('data_q', MyDeque())
+        # Set state for queues
+        urls = state.get('url_q', [])
+        data = state.get('data_q', [])
+
+        # Older versions kept items which could not be
+        # pushed in local buffers of threads, put them
+        # back in the queues.
+        for tdict in state.get('threadinfo', {}).values():
+            buf = tdict.get('buffer')
+            if not buf: continue
+            
+            if tdict.get('role') == 'crawler':
+                urls = list(urls) + [(obj.priority, obj) for obj in buf]
+            elif tdict.get('role') == 'fetcher':
+                data = list(data) + list(buf)
+            
+        self.url_q.set_items(urls)
+        self.data_q.set_items(data)
 
         # If both queues are empty, we don't have anything to do
-        if len(self.url_q.queue)==0 and len(self.data_q.queue)==0:
+        if len(self.url_q)==0 and len(self.data_q)==0:
             moreinfo('Size of data/url queues are zero, nothing to re-run')
             return -1
         
-        cfg = GetObject('config')
-        self._configobj = cfg
+        cfg = self._configobj
         
         if cfg.fastmode:
             # Create threads and set their state
@@ -193,7 +234,7 @@ class HarvestManCrawlerQueue(object):
                 t = None
                 
                 if role == 'fetcher':
-                    t = crawler.HarvestManUrlFetcher(idx, None)
+                    t = self.make_fetcher(idx, None)
                     self._numfetchers += 1
                 elif role == 'crawler':
                     t = crawler.HarvestManUrlCrawler(idx, None)
@@ -205,7 +246,6 @@ class HarvestManCrawlerQueue(object):
                     t._loops = tdict.get('_loops')
                     t._url = tdict.get('_url')
                     t._urlobject = tdict.get('_urlobject')
-                    t.buffer = tdict.get('buffer')
                     if t._urlobject: t._resuming = True
                     
                     self.add_tracker(t)
@@ -214,9 +254,24 @@ class HarvestManCrawlerQueue(object):
             # Set base tracker
             self._basetracker = self._trackers[0]
 
+        # Queued items and the items of resuming threads are
+        # the outstanding work
+        self._outstanding = len(self.url_q) + len(self.data_q)
+        for t in self._trackers:
+            if t._urlobject: self._outstanding += 1
+
     def increment_lock_instance(self, val=1):
         self._lockedinst += val
 
+    def make_fetcher(self, index, url_obj=None):
+        """ Return a new fetcher thread, which uses the
+        asynchronous fetch engine if it is enabled """
+
+        if self._configobj.useasyncore:
+            return crawler.HarvestManAsyncUrlFetcher(index, url_obj)
+        else:
+            return crawler.HarvestManUrlFetcher(index, url_obj)
+        
     def get_locked_instances(self):
         return self._lockedinst
 
@@ -244,7 +299,7 @@ class HarvestManCrawlerQueue(object):
         self._baseUrlObj.starturl = True
         
         if self._configobj.fastmode:
-            self._basetracker = crawler.HarvestManUrlFetcher( 0, self._baseUrlObj, True )
+            self._basetracker = self.make_fetcher(0, self._baseUrlObj)
         else:
             # Disable usethreads
             self._configobj.usethreads = False
@@ -257,23 +312,65 @@ class HarvestManCrawlerQueue(object):
 
     def mainloop(self):
         """ The loop where this object spends
-        most of its time. However it is not
-        an idle loop """
+        most of its time. It sleeps till all the
+        outstanding work is done, waking up at
+        intervals to check for timeouts and hanging
+        threads """
+
+        cfg = self._configobj
+        interval = self._checkinterval
+        if cfg.balancetrackers:
+            interval = min(interval, cfg.balanceinterval)
+            
+        while not self._flag:
+            self._workcond.acquire()
+            try:
+                idle = (self._outstanding <= 0)
+                if not idle:
+                    self._workcond.wait(interval)
+            finally:
+                self._workcond.release()
+            
+            if self._flag or self.is_exit_condition():
+                break
 
-        # New in 1.4.5, moving code from
-        # the crawl method.
-        count=0
+            if cfg.balancetrackers and not idle:
+                self.balance_trackers()
 
-        numstops = 3
+            if idle:
+                # Waiting for download threads
+                time.sleep(1.0)
+
+    def _add_work(self, count):
+        """ Add count to the number of outstanding
+        work items """
+
+        self._workcond.acquire()
+        try:
+            self._outstanding += count
+            if self._outstanding <= 0:
+                self._workcond.notifyAll()
+        finally:
+            self._workcond.release()
         
-        while 1:
-            if self.is_exit_condition():
-                count += 1
+    def work_done(self, obj=None, role=None):
+        """ Called by tracker threads when an item they got
+        from the queues is fully processed, i.e after any items
+        generated from it are pushed """
 
-            if count==numstops:
-                break
-            
-            time.sleep(1.0)
+        journal = GetObject('journal')
+        if journal and obj:
+            if role == 'fetcher':
+                journal.log('pop', 'url_q', obj[1].index)
+            elif role == 'crawler':
+                journal.log('pop', 'data_q', obj[1].getId())
+                
+        self._add_work(-1)
+
+    def get_outstanding_work(self):
+        """ Return the number of outstanding work items """
+
+        return self._outstanding
 
     def restart(self):
         """ Alternate method to start from a previous restored state """
@@ -295,7 +392,6 @@ class HarvestManCrawlerQueue(object):
                 logconsole(e)
                 pass
 
-        time.sleep(2.0)
         self.mainloop()        
         # Set flag to 1 to denote that downloading is finished.
         self._flag = 1
@@ -313,6 +409,9 @@ class HarvestManCrawlerQueue(object):
         # Set start time on config object
         self._configobj.starttime = t1
 
+        journal = GetObject('journal')
+        if journal: journal.log('base', self._baseUrlObj.index)
+        
         self.push(self._baseUrlObj, 'crawler')
 
         if self._configobj.fastmode:
@@ -338,7 +437,7 @@ class HarvestManCrawlerQueue(object):
 
                 # Back to equality among threads
                 if x % 2==0:
-                    t = crawler.HarvestManUrlFetcher(x, None)
+                    t = self.make_fetcher(x, None)
                 else:
                     t = crawler.HarvestManUrlCrawler(x, None)
 
@@ -353,10 +452,6 @@ class HarvestManCrawlerQueue(object):
                 elif t.get_role() == 'crawler':
                     self._numcrawlers += 1
 
-            # bug: give the threads some time to start,
-            # otherwise we exit immediately sometimes.
-            time.sleep(2.0)
-
             self.mainloop()
             
             # Set flag to 1 to denote that downloading is finished.
@@ -375,45 +470,140 @@ class HarvestManCrawlerQueue(object):
 
         return self._baseUrlObj
     
-    def get_url_data(self, role):
-        """ Pop url data from the queue """
+    def get_url_data(self, role, block=True, timeout=None):
+        """ Pop url data from the queue. This waits till data
+        is available and returns None if the queue is shut down.
+        If block is False, this returns None at once if there is
+        no data, except that it waits for the host of the next
+        url to become ready, for at most timeout seconds if a
+        timeout is given """
 
         if self._flag: return None
         self._evt.wait()
         
         obj = None
-
-        blk = self._configobj.blocking
+        t = threading.currentThread()
         
-        if role == 'crawler':
-            if blk:
-                obj=self.data_q.get()
-            else:
-                for i in xrange(5):
-                    try:
-                        obj=self.data_q.get_nowait()
-                        break
-                    except Empty:
-                        time.sleep(0.3)
-                        continue
-                
-        elif role == 'fetcher' or role=='tracker':
-            if blk:
-                obj = self.url_q.get()
-            else:
-                for i in xrange(5):
-                    try:
-                        obj = self.url_q.get_nowait()
-                        break
-                    except Empty:
-                        time.sleep(0.3)
-                        continue
+        while obj is None:
+            try:
+                if role == 'crawler':
+                    obj = self.data_q.get(block)
+                elif role == 'fetcher' or role=='tracker':
+                    if block:
+                        obj = self.url_q.get()
+                    else:
+                        if timeout is None:
+                            timeout = self.url_q.get_wait_time()
+                        obj = self.url_q.get(True, timeout)
+                else:
+                    break
+            except Empty:
+                # Getters are woken up without data when the
+                # queue is shut down, or when a thread is retired
+                # by the balancer, so wait again otherwise.
+                if not block or self._flag or self.url_q.closed or self.data_q.closed:
+                    break
+                if isinstance(t, crawler.HarvestManBaseUrlCrawler) and t.is_retired():
+                    break
             
         self._lasttimestamp = time.time()        
 
         self._requests += 1
         return obj
 
+    def record_fetch(self, urlobj, fetchtime):
+        """ Record the response time of a fetch so that the
+        time gap for its host can be adapted """
+
+        host = urlobj.get_host()
+        host.fetches += 1
+        host.fetchtime += fetchtime
+        self.url_q.record_fetch(urlobj.get_domain(), fetchtime)
+        
+    def balance_trackers(self):
+        """ Balance the number of crawler & fetcher threads
+        against the depths of the url & data queues. If urls are
+        piling up while crawlers are idle, an idle crawler is
+        retired and a fetcher started in its place, and the other
+        way round if pages are piling up while fetchers are idle.
+        If there are fewer than the maximum number of trackers, a
+        thread is started for the queue which is piling up. At
+        most one thread is started in each balance interval and
+        there is always at least one thread of each role """
+
+        cfg = self._configobj
+        
+        currtime = time.time()
+        if currtime - self._lastbalancetime < cfg.balanceinterval:
+            return
+        self._lastbalancetime = currtime
+        
+        # Url objects waiting for fetchers and
+        # page data waiting for crawlers
+        nurls, ndata = len(self.url_q), len(self.data_q)
+        
+        self._cond.acquire()
+        try:
+            idle = {'crawler': [], 'fetcher': []}
+            for t in self._trackers:
+                role = t.get_role()
+                if role in idle and t is not self._basetracker and not t.has_work():
+                    idle[role].append(t)
+
+            nidlecrawlers, nidlefetchers = len(idle['crawler']), len(idle['fetcher'])
+            debug('Balance=>', nurls, ndata, nidlecrawlers, nidlefetchers)
+
+            # A queue is piling up if it has more items than
+            # its threads can take up
+            urlspiling = (nurls > self._numfetchers and nidlefetchers == 0)
+            datapiling = (ndata > self._numcrawlers and nidlecrawlers == 0)
+            
+            old = None
+            if len(self._trackers) < cfg.maxtrackers and (urlspiling or datapiling):
+                if urlspiling and (not datapiling or nurls >= ndata):
+                    newrole = 'fetcher'
+                else:
+                    newrole = 'crawler'
+                extrainfo('Starting tracker in %s role (url queue: %d, data queue: %d, crawlers: %d, fetchers: %d)' % \
+                          (newrole, nurls, ndata, self._numcrawlers, self._numfetchers))
+            else:
+                # Switch if one queue is piling up while the
+                # threads of the other role have nothing to do.
+                if urlspiling and ndata == 0 and nidlecrawlers and self._numcrawlers > 1:
+                    old, newrole = idle['crawler'][0], 'fetcher'
+                elif datapiling and nurls == 0 and nidlefetchers and self._numfetchers > 1:
+                    old, newrole = idle['fetcher'][0], 'crawler'
+                else:
+                    return
+
+                extrainfo('Switching tracker %s to %s role (url queue: %d, data queue: %d, crawlers: %d, fetchers: %d)' % \
+                          (old, newrole, nurls, ndata, self._numcrawlers, self._numfetchers))
+            
+                # Retire the idle thread and wake it up
+                old.retire()
+                self._trackers.remove(old)
+                if newrole == 'fetcher':
+                    self._numcrawlers -= 1
+                    self.data_q.interrupt()
+                else:
+                    self._numfetchers -= 1
+                    self.url_q.interrupt()
+
+            # Start a thread of the other role
+            index = self._trackerindex + 1
+            if newrole == 'fetcher':
+                t = self.make_fetcher(index, None)
+                self._numfetchers += 1
+            else:
+                t = crawler.HarvestManUrlCrawler(index, None)
+                self._numcrawlers += 1
+
+            self.add_tracker(t)
+            t.setDaemon(True)
+            t.start()
+        finally:
+            self._cond.release()
+            
     def get_num_alive_threads(self):
 
         live = 0
@@ -528,6 +718,8 @@ class HarvestManCrawlerQueue(object):
         # fetcher responded and stop the downloads if it
         # exceeds a certain time.
         if not is_blocked:
+            # Update blocked thread counts
+            self.get_num_blocked_threads()
             if self.are_crawlers_blocked() and (not self.are_fetchers_blocked()):
                 # extrainfo("Managing fetchers...")
                 # See if fetchers are blocked at download
@@ -591,13 +783,13 @@ class HarvestManCrawlerQueue(object):
         return blocked
         
     def is_blocked(self):
-        """ The queue is considered blocked if all threads
-        are waiting for data, and no data is coming """
+        """ The queue is considered blocked if there is no
+        outstanding work, i.e all threads are waiting for data,
+        and no data is coming """
 
-        blocked = self.get_num_blocked_threads()
-        debug('Blocked=>',blocked)
-        debug('Trackers=>',len(self._trackers))
-        if blocked == len(self._trackers):
+        blocked = (self._outstanding <= 0)
+        debug('Outstanding=>',self._outstanding)
+        if blocked or not self._trackers:
             if self._lastblockedtime==0: self._lastblockedtime = time.time()
             return True
         else:
@@ -618,7 +810,7 @@ class HarvestManCrawlerQueue(object):
             new_t = None
 
             if role == 'fetcher':
-                new_t = crawler.HarvestManUrlFetcher(t.get_index(), None)
+                new_t = self.make_fetcher(t.get_index(), None)
             elif role == 'crawler':
                 new_t = crawler.HarvestManUrlCrawler(t.get_index(), None)
 
@@ -626,7 +818,6 @@ class HarvestManCrawlerQueue(object):
             if new_t:
                 new_t._url = t._url
                 new_t._urlobject = t._urlobject
-                new_t.buffer = copy.deepcopy(t.buffer)
                 # If this is a crawler get links also
                 if role == 'crawler':
                     new_t.links = t.links[:]
@@ -655,42 +846,74 @@ class HarvestManCrawlerQueue(object):
             self._cond.release()
                 
     def push(self, obj, role):
-        """ Push trackers to the queue """
+        """ Push trackers to the queue. This waits while the
+        queue is full and returns 0 if the queue is shut down """
 
-        if self._flag: return
+        if self._flag: return 0
         self._evt.wait()
         
-        ntries, status = 0, 0
+        status = 0
 
-        if role == 'crawler' or role=='tracker' or role =='downloader':
-            debug('Pushing stuff to buffer',threading.currentThread())
-            while ntries < 5:
-                try:
-                    ntries += 1
-                    self.url_q.put_nowait((obj.priority, obj))
-                    debug('Pushed stuff to buffer',threading.currentThread())
-                    status = 1
-                    break
-                except Full:
-                    time.sleep(0.5)
-                    
-        elif role == 'fetcher':
-            debug('Pushing stuff to buffer',threading.currentThread())
-            # stuff = (obj[0].priority, (obj[0].index, obj[1]))
-            while ntries < 5:
-                try:
-                    ntries += 1
-                    self.data_q.put_nowait(obj)
-                    debug('Pushed stuff to buffer',threading.currentThread())
-                    status = 1
-                    break
-                except Full:
-                    time.sleep(0.5)
+        # Count the item as outstanding before it becomes
+        # visible to other threads
+        self._add_work(1)
+        journal = GetObject('journal')
+        
+        try:
+            if role == 'crawler' or role=='tracker' or role =='downloader':
+                debug('Pushing stuff to queue',threading.currentThread())
+                if journal: journal.log_push('url_q', (obj.priority, obj))
+                self.url_q.put((obj.priority, obj))
+                status = 1
+            elif role == 'fetcher':
+                debug('Pushing stuff to queue',threading.currentThread())
+                if journal: journal.log_push('data_q', obj)
+                self.data_q.put(obj)
+                status = 1
+        except Full:
+            pass
                     
+        if not status:
+            self._add_work(-1)
+            
         self._pushes += 1
         self._lasttimestamp = time.time()
 
         return status
+
+    def push_many(self, objs, role):
+        """ Push a list of objects to the queue in one step.
+        Returns the number of objects pushed, which is less
+        than the number of objects if the queue is shut down """
+
+        if self._flag: return 0
+        self._evt.wait()
+
+        if not objs: return 0
+        
+        count = 0
+        self._add_work(len(objs))
+        journal = GetObject('journal')
+        
+        if role == 'crawler' or role=='tracker' or role =='downloader':
+            debug('Pushing %d items to queue' % len(objs),threading.currentThread())
+            items = [(obj.priority, obj) for obj in objs]
+            if journal:
+                for item in items: journal.log_push('url_q', item)
+            count = self.url_q.push_many(items)
+        elif role == 'fetcher':
+            debug('Pushing %d items to queue' % len(objs),threading.currentThread())
+            if journal:
+                for item in objs: journal.log_push('data_q', item)
+            count = self.data_q.push_many(objs)
+
+        if count < len(objs):
+            self._add_work(count - len(objs))
+            
+        self._pushes += count
+        self._lasttimestamp = time.time()
+
+        return count
     
     def stop_threads(self, noexit=False):
         """ Stop all running threads and clean
@@ -700,6 +923,10 @@ class HarvestManCrawlerQueue(object):
         if self._configobj.project:
             moreinfo("Ending Project", self._configobj.project,'...')
 
+        # Wake up threads waiting on the queues
+        self.url_q.shutdown()
+        self.data_q.shutdown()
+        
         for t in self._trackers:
             try:
                 t.terminate()
@@ -716,6 +943,10 @@ class HarvestManCrawlerQueue(object):
         # Stop controller
         self._controller.stop()
 
+        # Remove any spilled queue data
+        self.url_q.close()
+        self.data_q.close()
+        
         # Reset the thread list
         self.empty_list()
         
@@ -741,6 +972,10 @@ class HarvestManCrawlerQueue(object):
  
         # Kill tracker threads
         self._kill_tracker_threads()
+
+        # Remove any spilled queue data
+        self.url_q.close()
+        self.data_q.close()
     
     def _kill_tracker_threads(self):
         """ This function kills running tracker threads """
@@ -748,6 +983,14 @@ class HarvestManCrawlerQueue(object):
         moreinfo('Terminating project ',self._configobj.project,'...')
         self._flag=1
 
+        # Wake up the main loop and threads
+        # waiting on the queues
+        self._workcond.acquire()
+        self._workcond.notifyAll()
+        self._workcond.release()
+        self.url_q.shutdown()
+        self.data_q.shutdown()
+
         count =0
 
         debug('Waiting for threads to clean up ')
@@ -0,0 +1,268 @@
+# -- coding: latin-1
+""" urlstore.py - Module providing the store of url objects of
+    the data manager, keyed on their index. This is part of the
+    HarvestMan program.
+
+    The store keeps a bounded number of url objects in memory.
+    When it is full, the least recently used url object is
+    pickled to the url database file and looked up from there
+    again when it is asked for. Records are appended to the file
+    and their offsets kept in an array indexed by the url index,
+    since url indices are consecutive numbers.
+
+    The base url object of a url is saved as its index if the
+    store has a url object of that index, so that url objects of
+    the same page share their base url object when they are paged
+    in, and records do not hold a copy of their base url objects.
+
+    Author: Anand B Pillai <anand at harvestmanontheweb.com>
+
+   Copyright (C) 2007 Anand B Pillai.
+
+"""
+
+__version__ = '2.0 b1'
+__author__ = 'Anand B Pillai'
+
+import os
+import array
+import weakref
+import threading
+import cPickle, pickle
+
+from urlparser import HarvestManUrlParser
+from common.lrucache import LRU
+
+def get_url_state(urlobj):
+    """ Return the state of the url object for pickling,
+    with its base url object replaced by its index """
+
+    state = urlobj.__getstate__()
+    base = state.get('baseurl')
+    if base is not None:
+        state['baseurl'] = base.index
+    return state
+
+def make_url(state, store):
+    """ Return a url object from a state returned by
+    get_url_state, taking its base url object from the
+    given store """
+
+    urlobj = HarvestManUrlParser.__new__(HarvestManUrlParser)
+    urlobj.__setstate__(state)
+    if type(urlobj.baseurl) is int:
+        try:
+            urlobj.baseurl = store.get(urlobj.baseurl)
+        except KeyError:
+            urlobj.baseurl = None
+
+    return urlobj
+
+class HarvestManUrlStore(object):
+    """ Store of url objects keyed on their index """
+
+    def __init__(self, memory=0):
+        # Maximum number of url objects kept in memory,
+        # zero means no limit
+        self.memory = 0
+        # Url objects in memory
+        self._urls = {}
+        # Url objects which were written to disk, and are
+        # still referred to outside the store
+        self._evicted = weakref.WeakValueDictionary()
+        # Indices of url objects in memory which are the
+        # same as their record on disk
+        self._clean = set()
+        # Offset and size of the record of each url on
+        # disk, an offset of zero means no record
+        self._offsets = array.array('l')
+        self._sizes = array.array('l')
+        # Number of urls in the store
+        self._count = 0
+        self._lock = threading.RLock()
+        # Url database file
+        self.filename = ''
+        self._file = None
+        self.set_memory(memory)
+
+    def set_memory(self, memory):
+        """ Set the maximum number of url objects kept in memory """
+
+        self._lock.acquire()
+        try:
+            if memory and not self.memory:
+                urls = LRU(max(memory, len(self._urls)), self._urls.items())
+                urls.count = memory
+            elif memory:
+                urls = self._urls
+                urls.count = memory
+            else:
+                urls = dict(self._urls.items())
+            # Url objects beyond the new limit are evicted
+            # when the next url is added
+            self.memory = memory
+            self._urls = urls
+        finally:
+            self._lock.release()
+
+    def open(self, filename, memory=0):
+        """ Open the store on the given url database file,
+        keeping at most memory url objects in memory """
+
+        self._lock.acquire()
+        try:
+            if filename != self.filename:
+                self.close()
+                self.filename = filename
+            self.set_memory(memory)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """ Close the url database file and remove it. Url
+        objects on disk are no longer in the store """
+
+        self._lock.acquire()
+        try:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                try:
+                    os.remove(self.filename)
+                except OSError:
+                    pass
+            self._count = len(self._urls)
+            self._offsets = array.array('l')
+            self._sizes = array.array('l')
+            self._evicted = weakref.WeakValueDictionary()
+            self._clean.clear()
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, index):
+        return index in self._urls or self._get_offset(index) != 0
+
+    def _get_offset(self, index):
+        if index < len(self._offsets):
+            return self._offsets[index]
+        return 0
+
+    def add(self, urlobj):
+        """ Add the url object to the store. A url object which
+        is changed after it was added should be added again so
+        that the change is saved if it is evicted """
+
+        index = urlobj.index
+        self._lock.acquire()
+        try:
+            if index not in self._urls and self._get_offset(index) == 0:
+                self._count += 1
+            self._clean.discard(index)
+            self._put(index, urlobj)
+        finally:
+            self._lock.release()
+
+    def get(self, index):
+        """ Return the url object with the given index. Raises
+        KeyError if there is no such url object """
+
+        self._lock.acquire()
+        try:
+            urlobj = self._urls.get(index)
+            if urlobj is None:
+                urlobj = self._evicted.get(index)
+                if urlobj is None:
+                    urlobj = self._load(index)
+                    self._clean.add(index)
+                self._put(index, urlobj)
+            return urlobj
+        finally:
+            self._lock.release()
+
+    def _put(self, index, urlobj):
+        urls = self._urls
+        if self.memory:
+            while len(urls) >= self.memory and index not in urls:
+                oldindex, oldobj = urls.first.me
+                del urls[oldindex]
+                self._evict(oldindex, oldobj)
+        urls[index] = urlobj
+
+    def _evict(self, index, urlobj):
+        if index in self._clean:
+            self._clean.discard(index)
+        else:
+            self._save(index, urlobj)
+        self._evicted[index] = urlobj
+
+    def _save(self, index, urlobj):
+        state = urlobj.__getstate__()
+        base = state.get('baseurl')
+        if base is not None and base.index in self:
+            state['baseurl'] = base.index
+        data = cPickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+
+        if self._file is None:
+            self._file = open(self.filename, 'w+b')
+            # No record starts at offset zero
+            self._file.write('\0')
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        self._file.write(data)
+
+        if index >= len(self._offsets):
+            grow = index + 1 - len(self._offsets)
+            self._offsets.extend([0]*grow)
+            self._sizes.extend([0]*grow)
+        self._offsets[index] = offset
+        self._sizes[index] = len(data)
+
+    def _load(self, index):
+        offset = self._get_offset(index)
+        if offset == 0:
+            raise KeyError, index
+
+        self._file.seek(offset)
+        state = cPickle.loads(self._file.read(self._sizes[index]))
+        # The base url object is paged in as well
+        return make_url(state, self)
+
+    def iterkeys(self):
+        """ Return an iterator on the indices of the url objects """
+
+        self._lock.acquire()
+        try:
+            keys = set(self._urls.keys())
+            keys.update([index for index, offset in enumerate(self._offsets) if offset])
+        finally:
+            self._lock.release()
+
+        keys = list(keys)
+        keys.sort()
+        return iter(keys)
+
+    def itervalues(self):
+        """ Return an iterator on the url objects, url objects
+        on disk are paged in as they are reached """
+
+        for index in self.iterkeys():
+            yield self.get(index)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def get_dict(self):
+        """ Return a dictionary of index => url object of all
+        url objects, as saved in the state of the data manager """
+
+        return dict([(str(urlobj.index), urlobj) for urlobj in self.itervalues()])
+
+    def update(self, d):
+        """ Add the url objects of a dictionary returned by
+        get_dict to the store """
+
+        for urlobj in d.itervalues():
+            self.add(urlobj)